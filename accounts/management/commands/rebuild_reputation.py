@@ -0,0 +1,21 @@
+from django.core.management import BaseCommand
+
+from accounts.models import ReputationStats
+
+
+class Command(BaseCommand):
+    help = "Recompute every user's review counts, averages and trust score from the reviews."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=1000,
+            help="Users recomputed per GROUP BY pass.",
+        )
+
+    def handle(self, *args, **options):
+        done = 0
+        for done in ReputationStats.rebuild_all(chunk_size=options["chunk_size"]):
+            self.stdout.write(f"  {done} users")
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt reputation stats for {done} users."))
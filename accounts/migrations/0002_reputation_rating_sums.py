@@ -0,0 +1,42 @@
+# Generated by Django 6.0.1 on 2026-10-17 07:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("accounts", "0001_initial"),
+        ("commerce", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="reputationstats",
+            name="buyer_rating_sum",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="reputationstats",
+            name="seller_rating_sum",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunSQL(
+            """
+            UPDATE accounts_reputationstats AS stats
+            SET seller_rating_sum = totals.seller_rating_sum,
+                buyer_rating_sum = totals.buyer_rating_sum
+            FROM (
+                SELECT
+                    target_id,
+                    coalesce(sum(rating) FILTER (WHERE role = 'buyer_to_seller'), 0)
+                        AS seller_rating_sum,
+                    coalesce(sum(rating) FILTER (WHERE role = 'seller_to_buyer'), 0)
+                        AS buyer_rating_sum
+                FROM commerce_review
+                GROUP BY target_id
+            ) AS totals
+            WHERE totals.target_id = stats.user_id
+            """,
+            migrations.RunSQL.noop,
+        ),
+    ]
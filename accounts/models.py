@@ -1,12 +1,14 @@
-from decimal import Decimal
+from decimal import ROUND_HALF_UP, Decimal
 
 from django.conf import settings
 from django.contrib.auth.base_user import BaseUserManager
 from django.contrib.auth.models import AbstractUser
-from django.db import models
-from django.db.models import Avg
+from django.db import models, transaction
+from django.db.models import Case, Count, F, OuterRef, Q, Subquery, Sum, Value, When
+from django.db.models.functions import Cast
 from django.db.models.signals import post_save
 from django.dispatch import receiver
+from django.utils import timezone
 
 
 class EmailUserManager(BaseUserManager):
@@ -67,6 +69,32 @@ class Address(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
 
 
+REVIEW_STAT_FIELDS = (
+    "seller_rating_sum",
+    "seller_rating_avg",
+    "seller_rating_count",
+    "items_sold_count",
+    "buyer_rating_sum",
+    "buyer_rating_avg",
+    "buyer_rating_count",
+    "items_bought_count",
+)
+
+
+def _average(total, count):
+    if not count:
+        return Decimal("0.00")
+    return (Decimal(total) / count).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
+
+
+def _trust_score_expression():
+    # the seller average when there is one, else the buyer average
+    return Case(
+        When(seller_rating_avg__gt=0, then=F("seller_rating_avg")),
+        default=F("buyer_rating_avg"),
+    )
+
+
 class ReputationStats(models.Model):
     user = models.OneToOneField(
         settings.AUTH_USER_MODEL,
@@ -74,10 +102,13 @@ class ReputationStats(models.Model):
         related_name="reputation",
     )
 
+    # running sums of the ratings, so averages update without rescans
+    seller_rating_sum = models.PositiveIntegerField(default=0)
     seller_rating_avg = models.DecimalField(max_digits=3, decimal_places=2, default=0)
     seller_rating_count = models.PositiveIntegerField(default=0)
     items_sold_count = models.PositiveIntegerField(default=0)
 
+    buyer_rating_sum = models.PositiveIntegerField(default=0)
     buyer_rating_avg = models.DecimalField(max_digits=3, decimal_places=2, default=0)
     buyer_rating_count = models.PositiveIntegerField(default=0)
     items_bought_count = models.PositiveIntegerField(default=0)
@@ -93,41 +124,141 @@ class ReputationStats(models.Model):
         stats, _ = cls.objects.get_or_create(user=user)
         return stats
 
-    def rebuild_from_reviews(self):
+    @classmethod
+    def _review_aggregates(cls):
         from commerce.models import Review
 
-        seller_reviews = Review.objects.filter(
-            target=self.user, role=Review.Role.BUYER_TO_SELLER
-        )
-        buyer_reviews = Review.objects.filter(
-            target=self.user, role=Review.Role.SELLER_TO_BUYER
+        seller_role = Q(role=Review.Role.BUYER_TO_SELLER)
+        buyer_role = Q(role=Review.Role.SELLER_TO_BUYER)
+        return {
+            "seller_rating_sum": Sum("rating", filter=seller_role, default=0),
+            "seller_rating_count": Count("id", filter=seller_role),
+            "buyer_rating_sum": Sum("rating", filter=buyer_role, default=0),
+            "buyer_rating_count": Count("id", filter=buyer_role),
+        }
+
+    @classmethod
+    def _from_totals(cls, user_id, totals):
+        return cls(
+            user_id=user_id,
+            seller_rating_sum=totals["seller_rating_sum"],
+            seller_rating_avg=_average(
+                totals["seller_rating_sum"], totals["seller_rating_count"]
+            ),
+            seller_rating_count=totals["seller_rating_count"],
+            items_sold_count=totals["seller_rating_count"],
+            buyer_rating_sum=totals["buyer_rating_sum"],
+            buyer_rating_avg=_average(totals["buyer_rating_sum"], totals["buyer_rating_count"]),
+            buyer_rating_count=totals["buyer_rating_count"],
+            items_bought_count=totals["buyer_rating_count"],
         )
 
-        def avg_from_queryset(qs):
-            data = qs.aggregate(avg=Avg("rating"))
-            return Decimal(data["avg"] or 0)
-
-        self.seller_rating_count = seller_reviews.count()
-        self.seller_rating_avg = avg_from_queryset(seller_reviews)
-        self.items_sold_count = seller_reviews.count()
-        self.buyer_rating_count = buyer_reviews.count()
-        self.buyer_rating_avg = avg_from_queryset(buyer_reviews)
-        self.items_bought_count = buyer_reviews.count()
-        self.save(
-            update_fields=[
-                "seller_rating_avg",
-                "seller_rating_count",
-                "items_sold_count",
-                "buyer_rating_avg",
-                "buyer_rating_count",
-                "items_bought_count",
-                "updated_at",
-            ]
+    @classmethod
+    def from_reviews(cls, user):
+        """Unsaved stats for ``user`` computed live, in a single query."""
+        from commerce.models import Review
+
+        totals = Review.objects.filter(target=user).aggregate(**cls._review_aggregates())
+        stats = cls._from_totals(user.pk, totals)
+        stats.user = user
+        return stats
+
+    @classmethod
+    def apply_review(cls, user_id, role, rating_delta, count_delta):
+        """Add one review's rating (or take it back) in a single UPDATE.
+
+        The sum, count and average move together through F() expressions,
+        so concurrent reviews of the same user cannot overwrite each other
+        and the cost does not grow with the number of reviews.
+        """
+        from commerce.models import Review
+
+        prefix = "seller" if role == Review.Role.BUYER_TO_SELLER else "buyer"
+        items_field = "items_sold_count" if prefix == "seller" else "items_bought_count"
+        total = F(f"{prefix}_rating_sum") + rating_delta
+        count = F(f"{prefix}_rating_count") + count_delta
+        changes = {
+            f"{prefix}_rating_sum": total,
+            f"{prefix}_rating_count": count,
+            items_field: count,
+            # SET sees the old row, so the new average is built from the
+            # same expressions rather than from the updated columns
+            f"{prefix}_rating_avg": Case(
+                When(
+                    **{f"{prefix}_rating_count__gt": -count_delta},
+                    then=Cast(total, models.DecimalField(max_digits=12, decimal_places=4))
+                    / count,
+                ),
+                default=Value(Decimal("0.00")),
+                output_field=models.DecimalField(max_digits=3, decimal_places=2),
+            ),
+            "updated_at": timezone.now(),
+        }
+        stats = cls.objects.filter(user_id=user_id)
+        if not stats.update(**changes):
+            cls.objects.get_or_create(user_id=user_id)
+            stats.update(**changes)
+        User.objects.filter(pk=user_id).update(
+            trust_score=Subquery(
+                stats.annotate(score=_trust_score_expression()).values("score")[:1]
+            )
         )
+
+    def rebuild_from_reviews(self):
+        live = ReputationStats.from_reviews(self.user)
+        for field in REVIEW_STAT_FIELDS:
+            setattr(self, field, getattr(live, field))
+        self.save(update_fields=[*REVIEW_STAT_FIELDS, "updated_at"])
         preferred_score = self.seller_rating_avg or self.buyer_rating_avg
         self.user.trust_score = preferred_score
         self.user.save(update_fields=["trust_score"])
 
+    @classmethod
+    def rebuild_all(cls, chunk_size=1000):
+        """Recompute every user's review stats, ``chunk_size`` users at a time.
+
+        Each chunk is one GROUP BY over the reviews of its users, one upsert
+        of their stats rows and one UPDATE of their trust scores. Yields the
+        number of users done after each chunk.
+        """
+        from commerce.models import Review
+
+        last_pk = None
+        done = 0
+        while True:
+            users = User.objects.order_by("pk")
+            if last_pk is not None:
+                users = users.filter(pk__gt=last_pk)
+            user_ids = list(users.values_list("pk", flat=True)[:chunk_size])
+            if not user_ids:
+                return
+            totals = {
+                row["target_id"]: row
+                for row in Review.objects.filter(target_id__in=user_ids)
+                .values("target_id")
+                .annotate(**cls._review_aggregates())
+                .order_by()
+            }
+            empty = dict.fromkeys(cls._review_aggregates(), 0)
+            rows = [cls._from_totals(pk, totals.get(pk, empty)) for pk in user_ids]
+            with transaction.atomic():
+                cls.objects.bulk_create(
+                    rows,
+                    update_conflicts=True,
+                    unique_fields=["user"],
+                    update_fields=[*REVIEW_STAT_FIELDS, "updated_at"],
+                )
+                User.objects.filter(pk__in=user_ids).update(
+                    trust_score=Subquery(
+                        cls.objects.filter(user=OuterRef("pk"))
+                        .annotate(score=_trust_score_expression())
+                        .values("score")[:1]
+                    )
+                )
+            last_pk = user_ids[-1]
+            done += len(user_ids)
+            yield done
+
 
 @receiver(post_save, sender=User)
 def ensure_reputation_stats(sender, instance, created, **kwargs):
@@ -1,3 +1,116 @@
-from django.test import TestCase
+from decimal import Decimal
+from io import StringIO
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from commerce.models import Order, Review
+from listings.models import Listing
+
+from .models import REVIEW_STAT_FIELDS, ReputationStats
+
+LOCMEM_CACHES = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class SellerStatsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        cls.seller = User.objects.create_user(email="seller@example.com", password="password123")
+        cls.buyer = User.objects.create_user(email="buyer@example.com", password="password123")
+        cls.listing = Listing.objects.create(
+            seller=cls.seller,
+            title="Chaise",
+            status=Listing.Status.PUBLISHED,
+            currency="EUR",
+        )
+        cls.url = reverse("listing_detail", kwargs={"slug": cls.listing.slug, "uuid": cls.listing.id})
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+
+    def review(self, rating, role=Review.Role.BUYER_TO_SELLER):
+        order = Order.objects.create(
+            listing=self.listing,
+            buyer=self.buyer,
+            seller=self.seller,
+            fulfillment=Order.Fulfillment.IN_PERSON,
+            status=Order.Status.COMPLETED,
+            item_price_cents=1_000,
+        )
+        author, target = (
+            (self.buyer, self.seller)
+            if role == Review.Role.BUYER_TO_SELLER
+            else (self.seller, self.buyer)
+        )
+        return Review.objects.create(
+            order=order, author=author, target=target, role=role, rating=rating
+        )
+
+    def test_reputation_stats_follow_reviews(self):
+        first = self.review(5)
+        self.review(4)
+        self.review(2, role=Review.Role.SELLER_TO_BUYER)
+        stats = ReputationStats.objects.get(user=self.seller)
+        self.assertEqual((stats.seller_rating_count, stats.seller_rating_avg), (2, Decimal("4.50")))
+        self.assertEqual(ReputationStats.objects.get(user=self.buyer).buyer_rating_count, 1)
+
+        first.rating = 1
+        first.save()
+        self.assertEqual(ReputationStats.objects.get(user=self.seller).seller_rating_avg, Decimal("2.50"))
+        first.delete()
+        self.seller.refresh_from_db()
+        self.assertEqual(self.seller.trust_score, Decimal("4.00"))
+
+    def test_incremental_stats_match_a_full_rebuild(self):
+        reviews = [self.review(rating) for rating in (5, 3, 4)]
+        self.review(2, role=Review.Role.SELLER_TO_BUYER)
+        # order and review inserts, then one UPDATE each for the stats row
+        # and the trust score, however many reviews there are
+        with self.assertNumQueries(4):
+            self.review(1)
+        reviews[0].rating = 2
+        reviews[0].save()
+        reviews[1].role = Review.Role.SELLER_TO_BUYER
+        reviews[1].target, reviews[1].author = self.buyer, self.seller
+        reviews[1].save()
+        reviews[2].delete()
+
+        def snapshot():
+            stats = ReputationStats.objects.filter(user__in=[self.seller, self.buyer])
+            scores = get_user_model().objects.filter(pk__in=[self.seller.pk, self.buyer.pk])
+            return (
+                sorted(stats.values_list("user_id", *REVIEW_STAT_FIELDS)),
+                sorted(scores.values_list("pk", "trust_score")),
+            )
+
+        incremental = snapshot()
+        ReputationStats.objects.update(seller_rating_sum=0, seller_rating_avg=0)
+        call_command("rebuild_reputation", chunk_size=1, stdout=StringIO())
+        self.assertEqual(snapshot(), incremental)
+        seller_stats = ReputationStats.objects.get(user=self.seller)
+        self.assertEqual(seller_stats.seller_rating_count, 2)
+        self.assertEqual(seller_stats.seller_rating_avg, Decimal("1.50"))
+
+    def test_detail_page_reads_seller_stats_in_the_listing_query(self):
+        self.review(5)
+        self.review(4)
+        # validators; listing with category, seller and reputation; images;
+        # reservations; similar listings
+        with self.assertNumQueries(5):
+            response = self.client.get(self.url)
+        self.assertContains(response, "(4.5)")
+        self.assertContains(response, "2 avis")
+
+    def test_seller_without_stats_row_costs_one_aggregate_query(self):
+        self.review(5)
+        ReputationStats.objects.filter(user=self.seller).delete()
+        with self.assertNumQueries(6):
+            response = self.client.get(self.url)
+        self.assertContains(response, "(5.0)")
+        self.assertFalse(ReputationStats.objects.filter(user=self.seller).exists())
@@ -1,9 +1,12 @@
 from django.contrib import messages
 from django.contrib.auth import login
-from django.shortcuts import get_object_or_404
+from django.shortcuts import get_object_or_404, render
 from django.urls import reverse_lazy
 from django.views.generic import DetailView, FormView, TemplateView
 
+from listings.services.favorites import mark_favorites
+from listings.services.storefront import storefront_page, storefront_summary
+
 from .forms import SignUpForm
 
 from .models import ReputationStats, User
@@ -32,16 +35,32 @@ class PublicProfileView(DetailView):
     model = User
     template_name = "accounts/public_profile.html"
 
+    def _is_next_page(self):
+        # later storefront pages are appended by the infinite scroll
+        return bool(self.request.headers.get("HX-Request") and self.request.GET.get("cursor"))
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         user = self.object
+        listings, next_cursor = storefront_page(user, self.request.GET.get("cursor", ""))
+        mark_favorites(listings, self.request.user)
+        context["listings"] = listings
+        context["next_page_url"] = f"?cursor={next_cursor}" if next_cursor else None
+        if self._is_next_page():
+            return context
         stats = getattr(user, "reputation", None)
         if not stats:
             stats = ReputationStats.for_user(user)
         context["reputation_stats"] = stats
         context["reviews_received"] = user.reviews_received.select_related("order__listing").order_by("-created_at")[:5]
+        context["storefront"] = storefront_summary(user)
         return context
 
+    def render_to_response(self, context, **response_kwargs):
+        if self._is_next_page():
+            return render(self.request, "fragments/listings/feed_page.html", context)
+        return super().render_to_response(context, **response_kwargs)
+
 
 class SignUpView(FormView):
     template_name = "registration/register.html"
@@ -2,7 +2,9 @@ import uuid
 from django.conf import settings
 from django.core.validators import MaxValueValidator, MinValueValidator
 from django.db import models
-from accounts.models import Address
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from accounts.models import Address, ReputationStats
 from listings.models import Listing
 
 
@@ -154,3 +156,30 @@ class Review(models.Model):
     class Meta:
         unique_together = [("order", "role")]
         indexes = [models.Index(fields=["target", "role", "created_at"])]
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # what ReputationStats counts for this review once it is saved
+        self._initial_rating_key = (self.target_id, self.role, self.rating)
+
+
+# ReputationStats is what profile and listing pages read; each review
+# change is applied to it as a delta, see ReputationStats.apply_review().
+@receiver(post_save, sender=Review)
+def apply_review_to_reputation(sender, instance, created, **kwargs):
+    previous = None if created else instance._initial_rating_key
+    current = (instance.target_id, instance.role, instance.rating)
+    if previous != current:
+        if previous and previous[:2] == current[:2]:
+            ReputationStats.apply_review(*current[:2], instance.rating - previous[2], 0)
+        else:
+            if previous:
+                ReputationStats.apply_review(*previous[:2], -previous[2], -1)
+            ReputationStats.apply_review(*current, 1)
+    instance._initial_rating_key = current
+
+
+@receiver(post_delete, sender=Review)
+def remove_review_from_reputation(sender, instance, **kwargs):
+    target_id, role, rating = instance._initial_rating_key
+    ReputationStats.apply_review(target_id, role, -rating, -1)
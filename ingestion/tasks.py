@@ -5,8 +5,31 @@ from celery import shared_task
 from django.db import transaction
 
 from mediahub.models import BatchUpload
+from mediahub.services.perceptual import hash_asset, near_duplicates
 from .models import DetectedItem
 
+NEAR_DUPLICATE_FLAG_LIMIT = 20
+
+
+def _ensure_perceptual_hash(image_asset):
+    # the queued derivatives task has not run yet: only the hash is taken
+    # here, the sizes are still left to it
+    if image_asset.perceptual_hash is not None:
+        return
+    try:
+        image_asset.perceptual_hash = hash_asset(image_asset)
+    except OSError:
+        return
+    image_asset.save(update_fields=["perceptual_hash"])
+
+
+def _count_near_duplicates(image_asset):
+    """Other images that look like this one, capped at NEAR_DUPLICATE_FLAG_LIMIT."""
+    if image_asset.perceptual_hash is None:
+        return 0
+    matches = near_duplicates(image_asset.perceptual_hash).exclude(pk=image_asset.pk)
+    return len(matches.values_list("pk", flat=True)[:NEAR_DUPLICATE_FLAG_LIMIT])
+
 
 @shared_task(bind=True, name="ingestion.analyze_batch", max_retries=1)
 def analyze_batch(self, batch_id):
@@ -30,7 +53,11 @@ def analyze_batch(self, batch_id):
 
     suggestions = []
     try:
+        # all of the batch first, so its photos also match each other
+        for asset in assets:
+            _ensure_perceptual_hash(asset.image_asset)
         for asset in assets:
+            near_duplicate_count = _count_near_duplicates(asset.image_asset)
             price = Decimal("25.00")
             low = price
             high = price + Decimal("15.00")
@@ -54,6 +81,7 @@ def analyze_batch(self, batch_id):
                         "asset_id": str(asset.id),
                         "media_type": asset.media_type,
                         "confidence": confidence,
+                        "near_duplicates": near_duplicate_count,
                     },
                 )
             )
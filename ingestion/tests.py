@@ -1,15 +1,18 @@
 import shutil
 import tempfile
 from decimal import Decimal
+from io import BytesIO
 
 from django.contrib.auth import get_user_model
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.test import TestCase, override_settings
 from django.urls import reverse
+from PIL import Image
 
 from mediahub.models import BatchUpload, ImageAsset, MediaAsset
 
 from .models import DetectedItem
+from .tasks import analyze_batch
 from .services.publishing import publish_detected_item
 
 
@@ -100,3 +103,26 @@ class IngestionTests(TestCase):
         self.assertEqual(response.status_code, 200)
         self.detected_item.refresh_from_db()
         self.assertEqual(self.detected_item.status, DetectedItem.Status.ADMIN_REJECTED)
+
+    def test_analysis_hashes_photos_and_leaves_sizes_to_the_task(self):
+        scene = Image.linear_gradient("L").resize((800, 600)).convert("RGB")
+        batch = BatchUpload.objects.create(owner=self.user, media_count=2)
+        for name, size, fmt in (("original.png", (800, 600), "PNG"), ("copie.jpg", (400, 300), "JPEG")):
+            photo = BytesIO()
+            scene.resize(size).save(photo, fmt)
+            MediaAsset.objects.create(
+                batch=batch,
+                image_asset=ImageAsset.objects.create(
+                    user=self.user, image=SimpleUploadedFile(name, photo.getvalue())
+                ),
+            )
+
+        analyze_batch(batch.id)
+
+        for asset in ImageAsset.objects.filter(media_asset__batch=batch):
+            self.assertIsNotNone(asset.perceptual_hash)
+            self.assertEqual(asset.derivatives, {})
+        self.assertEqual(
+            [item.metadata_json["near_duplicates"] for item in DetectedItem.objects.filter(batch=batch)],
+            [1, 1],
+        )
@@ -1,10 +1,14 @@
+from functools import partial
+
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
 from django.db import transaction
 from django.shortcuts import get_object_or_404, redirect, render
 from django.views import View
 from django.views.generic import FormView, TemplateView
 
-from mediahub.models import BatchUpload, ImageAsset, MediaAsset
+from mediahub.models import BatchUpload, MediaAsset
+from mediahub.services.content_store import stored_images
+from mediahub.uploadhandlers import StreamingImageUploadMixin
 
 from .forms import BatchUploadForm
 from .models import DetectedItem
@@ -36,24 +40,22 @@ class BatchOwnerMixin(LoginRequiredMixin):
         )
 
 
-class BatchUploadCreateView(LoginRequiredMixin, FormView):
+class BatchUploadCreateView(StreamingImageUploadMixin, LoginRequiredMixin, FormView):
     template_name = "ingestion/upload.html"
     form_class = BatchUploadForm
 
     def form_valid(self, form):
         files = form.cleaned_data["media_files"]
-        batch = BatchUpload.objects.create(
-            owner=self.request.user,
-            media_count=len(files),
-        )
-        for upload in files:
-            image_asset = ImageAsset.objects.create(
-                user=self.request.user,
-                image=upload,
-                source="upload",
+        with stored_images(self.request.user, files) as image_assets:
+            batch = BatchUpload.objects.create(
+                owner=self.request.user,
+                media_count=len(files),
+            )
+            MediaAsset.objects.bulk_create(
+                MediaAsset(batch=batch, image_asset=image_asset, file_hash=image_asset.file_hash)
+                for image_asset in image_assets
             )
-            MediaAsset.objects.create(batch=batch, image_asset=image_asset)
-        analyze_batch.delay(str(batch.id))
+            transaction.on_commit(partial(analyze_batch.delay, str(batch.id)))
         return redirect("ingestion:batch_processing", batch_id=batch.id)
 
 
@@ -2,25 +2,41 @@ from django.contrib import admin
 from django.utils import timezone
 from django.utils.html import format_html
 
-from .models import Listing, ListingImage
+from mediahub.services.derivatives import derivative_url
+
+from .models import CityStat, Listing, ListingImage
+from .services.facets import tracking_published_rollups
+from .services.feed_cache import invalidate_shared_feed
+from .services.storefront import tracking_seller_rollup
 
 
 @admin.action(description="Approve selected listings")
 def approve_listings(modeladmin, request, queryset):
-    queryset.update(
-        status=Listing.Status.PUBLISHED,
-        moderated_by=request.user,
-        moderated_at=timezone.now(),
-    )
+    # listings already published keep their place in the similar listings
+    queryset = queryset.exclude(status=Listing.Status.PUBLISHED)
+    now = timezone.now()
+    with tracking_published_rollups(queryset), tracking_seller_rollup(queryset):
+        queryset.update(
+            status=Listing.Status.PUBLISHED,
+            moderated_by=request.user,
+            moderated_at=now,
+            # update() skips auto_now
+            updated_at=now,
+            # queued for the similar listings refresh, as Listing.save() does
+            similar_refreshed_at=None,
+        )
+    invalidate_shared_feed()
 
 
 @admin.action(description="Reject selected listings")
 def reject_listings(modeladmin, request, queryset):
-    queryset.update(
-        status=Listing.Status.REJECTED,
-        moderated_by=request.user,
-        moderated_at=timezone.now(),
-    )
+    with tracking_published_rollups(queryset), tracking_seller_rollup(queryset):
+        queryset.update(
+            status=Listing.Status.REJECTED,
+            moderated_by=request.user,
+            moderated_at=timezone.now(),
+        )
+    invalidate_shared_feed()
 
 
 @admin.register(Listing)
@@ -31,6 +47,13 @@ class ListingAdmin(admin.ModelAdmin):
     actions = (approve_listings, reject_listings)
 
 
+@admin.register(CityStat)
+class CityStatAdmin(admin.ModelAdmin):
+    list_display = ("name", "key", "published_count")
+    search_fields = ("name", "key")
+    ordering = ("-published_count",)
+
+
 class ListingImageInline(admin.TabularInline):
     model = ListingImage
     extra = 0
@@ -41,7 +64,7 @@ class ListingImageInline(admin.TabularInline):
         if obj.image_asset and obj.image_asset.image:
             return format_html(
                 '<img src="{}" style="height:60px;width:auto;border-radius:6px;" />',
-                obj.image_asset.image.url,
+                derivative_url(obj.image_asset.derivatives, 320) or obj.image_asset.image.url,
             )
         return "-"
 
@@ -45,6 +45,7 @@ class MultiFileField(forms.Field):
         "required": "Veuillez ajouter au moins une photo.",
         "min_count": "Ajoutez au moins {min} fichiers.",
         "max_count": "Ajoutez au plus {max} fichiers.",
+        "invalid_image": "« {name} » {error}.",
     }
 
     def __init__(self, *args, min_count=None, max_count=None, **kwargs):
@@ -66,6 +67,13 @@ class MultiFileField(forms.Field):
             raise ValidationError(
                 self.error_messages["max_count"].format(max=self.max_count)
             )
+        for upload in files:
+            # set by mediahub.uploadhandlers.StreamingImageUploadHandler
+            error = getattr(upload, "image_error", "")
+            if error:
+                raise ValidationError(
+                    self.error_messages["invalid_image"].format(name=upload.name, error=error)
+                )
         return files
 
 
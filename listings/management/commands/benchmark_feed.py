@@ -0,0 +1,321 @@
+import random
+import statistics
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Count, Q
+from django.utils.text import slugify
+
+from catalog.models import Category
+from listings.models import Listing, PostalCode
+from listings.services.cities import matching_city_keys, normalize_city, rebuild_city_stats
+from listings.services.facets import (
+    FACET_DIMENSIONS,
+    facet_counts,
+    price_bucket_expression,
+    rebuild_facet_rollup,
+)
+from listings.services.geo import (
+    distance_expression,
+    grid_cell,
+    locate_postal_code,
+    within_radius,
+)
+from listings.services.pagination import estimate_count
+from listings.services.search import refresh_search_vectors, search_listings
+
+BENCH_SELLER_EMAIL = "bench-seller@example.com"
+PAGE_SIZE = 24
+
+CATEGORIES = ["Mobilier", "Décoration", "Électroménager", "Vélos", "Puériculture", "Vêtements"]
+OBJECTS = [
+    "Chaise", "Table basse", "Lampe", "Canapé", "Vélo", "Étagère", "Commode",
+    "Miroir", "Poussette", "Manteau", "Bureau", "Fauteuil", "Cafetière", "Tapis",
+]
+QUALIFIERS = [
+    "vintage", "en chêne", "scandinave", "industriel", "en cuir", "pliable",
+    "rétro", "en rotin", "design", "à restaurer", "enfant", "électrique",
+]
+CITIES = [
+    ("Paris", "75011", 48.8589, 2.3799),
+    ("Lyon", "69003", 45.7597, 4.8422),
+    ("Marseille", "13006", 43.2874, 5.3805),
+    ("Toulouse", "31000", 43.6045, 1.4442),
+    ("Nantes", "44000", 47.2184, -1.5536),
+    ("Bordeaux", "33000", 44.8378, -0.5792),
+    ("Lille", "59000", 50.6292, 3.0573),
+    ("Strasbourg", "67000", 48.5734, 7.7521),
+    ("Montpellier", "34000", 43.6108, 3.8767),
+    ("Rennes", "35000", 48.1173, -1.6778),
+    ("Grenoble", "38000", 45.1885, 5.7245),
+    ("Saint-Étienne", "42000", 45.4397, 4.3872),
+]
+POSTAL_CODES_PER_CITY = 200
+CITY_SPREAD_DEGREES = 1.0
+SEARCH_TERMS = ["chaise", "etagere chene", "velo electrique", "canape cuir", "fauteuil rotin"]
+CITY_TERMS = ["Lyon", "saint etienne", "Montpelier", "bordeau"]
+# (label, filters, ordering) as HomeFeedView builds them
+PRICE_QUERIES = [
+    ("10-50 EUR, recent first", {"price_cents__gte": 1_000, "price_cents__lte": 5_000}, ("-created_at",)),
+    ("price ascending", {"price_cents__isnull": False}, ("price_cents", "-created_at")),
+    ("price descending", {"price_cents__isnull": False}, ("-price_cents", "-created_at")),
+    ("condition=like_new, recent first", {"condition": "like_new"}, ("-created_at",)),
+    (
+        "condition=like_new, price ascending",
+        {"condition": "like_new", "price_cents__isnull": False},
+        ("price_cents", "-created_at"),
+    ),
+    (
+        "100-150 EUR, price descending",
+        {"price_cents__gte": 10_000, "price_cents__lte": 15_000},
+        ("-price_cents", "-created_at"),
+    ),
+]
+
+
+class Command(BaseCommand):
+    help = "Seed a synthetic catalogue and time home feed query paths against it."
+
+    def add_arguments(self, parser):
+        parser.add_argument("scenario", choices=["search", "city", "facets", "radius", "price"])
+        parser.add_argument(
+            "--listings",
+            type=int,
+            default=1_000_000,
+            help="Size of the synthetic catalogue (defaults to 1M listings).",
+        )
+        parser.add_argument("--repeat", type=int, default=10, help="Timed runs per query.")
+        parser.add_argument("--batch-size", type=int, default=10_000)
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument(
+            "--keep",
+            action="store_true",
+            help="Keep the seeded catalogue for later runs instead of rolling it back.",
+        )
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options["seed"])
+        with transaction.atomic():
+            self.seed_catalogue(options["listings"], options["batch_size"])
+            getattr(self, f"bench_{options['scenario']}")(options["repeat"])
+            if not options["keep"]:
+                transaction.set_rollback(True)
+
+    def seed_catalogue(self, total, batch_size):
+        User = get_user_model()
+        seller, _ = User.objects.get_or_create(email=BENCH_SELLER_EMAIL)
+        self.seed_postal_codes()
+        existing = Listing.objects.filter(seller=seller).count()
+        if existing >= total:
+            self.stdout.write(f"Reusing {existing} seeded listings.")
+            return
+        categories = [
+            Category.objects.get_or_create(slug=f"bench-{slugify(name)}", defaults={"name": name})[0]
+            for name in CATEGORIES
+        ]
+        started = time.perf_counter()
+        remaining = total - existing
+        while remaining > 0:
+            size = min(batch_size, remaining)
+            Listing.objects.bulk_create(
+                [self.build_listing(seller, categories) for _ in range(size)]
+            )
+            remaining -= size
+        bench_listings = Listing.objects.filter(seller=seller)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "UPDATE listings_listing "
+                "SET created_at = created_at - random() * interval '365 days' "
+                "WHERE seller_id = %s",
+                [seller.pk],
+            )
+        refresh_search_vectors(bench_listings)
+        rebuild_city_stats()
+        rebuild_facet_rollup()
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE listings_listing")
+        self.stdout.write(
+            f"Seeded {total - existing} listings in {time.perf_counter() - started:.1f}s."
+        )
+
+    def seed_postal_codes(self):
+        # Each city gets its real centroid plus synthetic postal codes
+        # scattered around it, so radius queries select a realistic share.
+        rng = random.Random(0)
+        postal_codes = [
+            PostalCode(
+                country_code="FR",
+                postal_code=postal_code,
+                place_name=city,
+                latitude=latitude,
+                longitude=longitude,
+            )
+            for city, postal_code, latitude, longitude in CITIES
+        ]
+        self.city_postal_codes = {}
+        for city, postal_code, latitude, longitude in CITIES:
+            self.city_postal_codes[city] = [
+                (
+                    f"{postal_code}-{index}",
+                    latitude + rng.uniform(-CITY_SPREAD_DEGREES, CITY_SPREAD_DEGREES),
+                    longitude + rng.uniform(-CITY_SPREAD_DEGREES, CITY_SPREAD_DEGREES),
+                )
+                for index in range(POSTAL_CODES_PER_CITY)
+            ]
+            postal_codes += [
+                PostalCode(
+                    country_code="FR",
+                    postal_code=code,
+                    place_name=city,
+                    latitude=code_latitude,
+                    longitude=code_longitude,
+                )
+                for code, code_latitude, code_longitude in self.city_postal_codes[city]
+            ]
+        PostalCode.objects.bulk_create(
+            postal_codes,
+            update_conflicts=True,
+            unique_fields=["country_code", "postal_code"],
+            update_fields=["place_name", "latitude", "longitude"],
+        )
+
+    def build_listing(self, seller, categories):
+        rng = self.rng
+        title = f"{rng.choice(OBJECTS)} {rng.choice(QUALIFIERS)}"
+        city, _, _, _ = rng.choice(CITIES)
+        postal_code, latitude, longitude = rng.choice(self.city_postal_codes[city])
+        return Listing(
+            seller=seller,
+            category=rng.choice(categories),
+            title=title,
+            slug=slugify(title),
+            description=(
+                f"{title}, {rng.choice(QUALIFIERS)}. Vendu car déménagement, "
+                f"à récupérer sur {city} ou envoi possible."
+            ),
+            condition=rng.choice(Listing.Condition.values),
+            price_cents=rng.randrange(100, 200_000, 50),
+            status=(
+                Listing.Status.PUBLISHED
+                if rng.random() < 0.9
+                else rng.choice(Listing.Status.values)
+            ),
+            city=city,
+            city_key=normalize_city(city),
+            postal_code=postal_code,
+            latitude=latitude,
+            longitude=longitude,
+            geo_cell=grid_cell(latitude, longitude),
+        )
+
+    def time_query(self, label, run, repeat):
+        run()  # warm-up, also primes the plan cache
+        samples = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            run()
+            samples.append((time.perf_counter() - started) * 1000)
+        self.stdout.write(
+            f"  {label:<36} median {statistics.median(samples):9.2f} ms"
+            f"   min {min(samples):9.2f} ms   max {max(samples):9.2f} ms"
+        )
+
+    def render_page(self, queryset):
+        # What the paginated feed does per request: COUNT(*) then one page.
+        return lambda: (queryset.count(), list(queryset[:PAGE_SIZE]))
+
+    def render_estimated_page(self, queryset):
+        # The feed as it runs since keyset pagination: planner estimate + one page.
+        return lambda: (estimate_count(queryset), list(queryset[:PAGE_SIZE]))
+
+    def bench_search(self, repeat):
+        published = Listing.objects.filter(status=Listing.Status.PUBLISHED)
+        for term in SEARCH_TERMS:
+            self.stdout.write(f'q="{term}"')
+            legacy = published.filter(
+                Q(title__icontains=term) | Q(description__icontains=term)
+            ).order_by("-created_at")
+            ranked = search_listings(published, term).order_by("-search_rank", "-created_at")
+            self.time_query("icontains scan", self.render_page(legacy), repeat)
+            self.time_query("full-text (GIN, ranked)", self.render_page(ranked), repeat)
+
+    def bench_city(self, repeat):
+        published = Listing.objects.filter(status=Listing.Status.PUBLISHED).order_by(
+            "-created_at"
+        )
+        for term in CITY_TERMS:
+            self.stdout.write(f'city="{term}" -> {matching_city_keys(term)}')
+            legacy = published.filter(city__icontains=term)
+            self.time_query("icontains scan", self.render_page(legacy), repeat)
+            self.time_query(
+                "trigram CityStat + city_key index",
+                # resolving the keys is part of every request
+                lambda: self.render_page(
+                    published.filter(city_key__in=matching_city_keys(term))
+                )(),
+                repeat,
+            )
+
+    def bench_facets(self, repeat):
+        published = Listing.objects.filter(status=Listing.Status.PUBLISHED).annotate(
+            price_bucket=price_bucket_expression()
+        )
+        lyon = matching_city_keys("Lyon")
+        filter_sets = [
+            ("no filter", {}, {}),
+            ("city=Lyon", {"city_keys": lyon}, {"city_key__in": lyon}),
+            (
+                "category+condition",
+                {"category": "bench-mobilier", "condition": "good"},
+                {"category__slug": "bench-mobilier", "condition": "good"},
+            ),
+        ]
+        for label, selected, lookups in filter_sets:
+            self.stdout.write(f"facets, {label}")
+
+            def group_by_listings():
+                # one GROUP BY per dimension, each without its own filter
+                for dimension in FACET_DIMENSIONS:
+                    others = {
+                        lookup: value
+                        for lookup, value in lookups.items()
+                        if not lookup.startswith(dimension.removesuffix("_id"))
+                    }
+                    list(
+                        published.filter(**others)
+                        .values(dimension)
+                        .annotate(total=Count("id"))
+                        .order_by()
+                    )
+
+            self.time_query("GROUP BY over listings", group_by_listings, repeat)
+            self.time_query("FacetRollup sums", lambda: facet_counts(selected), repeat)
+
+    def bench_radius(self, repeat):
+        published = Listing.objects.filter(status=Listing.Status.PUBLISHED)
+        latitude, longitude = locate_postal_code("69003")
+        for radius_km, sort in [(20, "recent"), (60, "recent"), (60, "distance")]:
+            self.stdout.write(f"near=69003 radius={radius_km} km sort={sort}")
+            ordering = ("distance_km", "-created_at") if sort == "distance" else ("-created_at",)
+            scan = (
+                published.annotate(distance_km=distance_expression(latitude, longitude))
+                .filter(distance_km__lte=radius_km)
+                .order_by(*ordering)
+            )
+            gridded = within_radius(published, latitude, longitude, radius_km).order_by(
+                *ordering
+            )
+            self.time_query(
+                "haversine over every listing", self.render_estimated_page(scan), repeat
+            )
+            self.time_query(
+                "grid cells + distance", self.render_estimated_page(gridded), repeat
+            )
+
+    def bench_price(self, repeat):
+        published = Listing.objects.filter(status=Listing.Status.PUBLISHED)
+        for label, lookups, ordering in PRICE_QUERIES:
+            queryset = published.filter(**lookups).order_by(*ordering)
+            self.time_query(label, self.render_estimated_page(queryset), repeat)
@@ -0,0 +1,116 @@
+import os
+import shutil
+import statistics
+import tempfile
+import time
+from io import BytesIO
+
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import BaseCommand
+from django.db import connection, transaction
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from PIL import Image
+
+from listings.models import Listing, ListingImage
+from listings.services.photos import add_listing_photos
+from mediahub.models import BatchUpload, MediaAsset
+from mediahub.services.content_store import store_image, store_images
+from mediahub.uploadhandlers import receive_file
+
+BENCH_USER_EMAIL = "bench-uploader@example.com"
+
+
+def _one_by_one_listing(listing, user, uploads):
+    # the ListingStartView loop this replaced
+    for upload in uploads:
+        asset = store_image(user, upload)
+        ListingImage.objects.create(listing=listing, image_asset=asset, sort_order=0)
+    for index, image in enumerate(listing.images.all()):
+        image.sort_order = index
+        image.is_primary = index == 0
+        image.save(update_fields=["sort_order", "is_primary"])
+
+
+def _bulk_listing(listing, user, uploads):
+    add_listing_photos(listing, user, uploads, primary_index=0)
+
+
+def _one_by_one_batch(batch, user, uploads):
+    for upload in uploads:
+        MediaAsset.objects.create(batch=batch, image_asset=store_image(user, upload))
+
+
+def _bulk_batch(batch, user, uploads):
+    MediaAsset.objects.bulk_create(
+        MediaAsset(batch=batch, image_asset=asset, file_hash=asset.file_hash)
+        for asset in store_images(user, uploads)
+    )
+
+
+class Command(BaseCommand):
+    help = (
+        "Time storing an N-photo listing and batch upload one file at a time against "
+        "the bulk upload path. Runs in a rolled back transaction and a temporary MEDIA_ROOT."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--files", type=int, default=30)
+        parser.add_argument("--width", type=int, default=3000, help="Photo width, height is 3/4 of it.")
+        parser.add_argument("--rounds", type=int, default=3)
+
+    def handle(self, *args, **options):
+        photo = BytesIO()
+        width = options["width"]
+        Image.effect_noise((width, width * 3 // 4), 40).convert("RGB").save(photo, "JPEG", quality=90)
+        self.photo = photo.getvalue()
+        self.stdout.write(
+            f"{options['files']} photos of {width}x{width * 3 // 4}, "
+            f"{len(self.photo) / 1e6:.1f} MB each, {options['rounds']} rounds"
+        )
+        media_root = tempfile.mkdtemp()
+        try:
+            with override_settings(MEDIA_ROOT=media_root), transaction.atomic():
+                self.user, _ = get_user_model().objects.get_or_create(email=BENCH_USER_EMAIL)
+                for label, run, target in (
+                    ("listing, one by one", _one_by_one_listing, self._listing),
+                    ("listing, bulk", _bulk_listing, self._listing),
+                    ("batch, one by one", _one_by_one_batch, self._batch),
+                    ("batch, bulk", _bulk_batch, self._batch),
+                ):
+                    self._time(label, run, target, options)
+                transaction.set_rollback(True)
+        finally:
+            shutil.rmtree(media_root, ignore_errors=True)
+
+    def _listing(self):
+        return Listing.objects.create(seller=self.user, status=Listing.Status.DRAFT, currency="EUR")
+
+    def _batch(self):
+        return BatchUpload.objects.create(owner=self.user)
+
+    def _uploads(self, count):
+        """Spooled, hashed uploads as the upload handler hands them to views."""
+        # distinct bytes every time, or the content store would share them
+        return [
+            receive_file(SimpleUploadedFile(f"photo{index}.jpg", self.photo + os.urandom(16)))
+            for index in range(count)
+        ]
+
+    def _time(self, label, run, target, options):
+        timings, query_counts = [], []
+        for _ in range(options["rounds"]):
+            uploads = self._uploads(options["files"])
+            parent = target()
+            with CaptureQueriesContext(connection) as queries:
+                started = time.perf_counter()
+                run(parent, self.user, uploads)
+                timings.append((time.perf_counter() - started) * 1000)
+            query_counts.append(len(queries))
+            for upload in uploads:
+                upload.close()
+        self.stdout.write(
+            f"  {label:<22} {statistics.median(timings):8.1f} ms median, "
+            f"{max(query_counts)} queries"
+        )
@@ -0,0 +1,55 @@
+import csv
+from collections import defaultdict
+
+from django.core.management import BaseCommand, CommandError
+from django.db import transaction
+
+from listings.models import Listing, PostalCode
+from listings.services.geo import refresh_listing_locations
+
+
+class Command(BaseCommand):
+    help = (
+        "Load postal code centroids from a GeoNames postal code dump "
+        "(tab separated, e.g. FR.txt from download.geonames.org/export/zip/)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Path to the GeoNames .txt file.")
+        parser.add_argument("--batch-size", type=int, default=5_000)
+
+    def handle(self, *args, **options):
+        # several places can share a postal code; keep the mean of their centroids
+        places = defaultdict(list)
+        try:
+            with open(options["path"], newline="", encoding="utf-8") as handle:
+                for row in csv.reader(handle, delimiter="\t"):
+                    if len(row) < 11 or not row[9] or not row[10]:
+                        continue
+                    key = (row[0].strip().upper(), row[1].strip().upper())
+                    places[key].append((row[2].strip(), float(row[9]), float(row[10])))
+        except OSError as exc:
+            raise CommandError(f"Cannot read {options['path']}: {exc}") from exc
+
+        postal_codes = [
+            PostalCode(
+                country_code=country_code,
+                postal_code=postal_code,
+                place_name=rows[0][0][:180],
+                latitude=sum(row[1] for row in rows) / len(rows),
+                longitude=sum(row[2] for row in rows) / len(rows),
+            )
+            for (country_code, postal_code), rows in places.items()
+        ]
+        with transaction.atomic():
+            PostalCode.objects.bulk_create(
+                postal_codes,
+                batch_size=options["batch_size"],
+                update_conflicts=True,
+                unique_fields=["country_code", "postal_code"],
+                update_fields=["place_name", "latitude", "longitude"],
+            )
+            refresh_listing_locations(Listing.objects.all())
+        self.stdout.write(
+            self.style.SUCCESS(f"Loaded {len(postal_codes)} postal code centroids.")
+        )
@@ -30,3 +30,6 @@ class Command(BaseCommand):
         for fixture in fixtures:
             self.stdout.write(f"Loading {fixture.name}...")
             call_command("loaddata", str(fixture))
+        # loaddata bypasses Listing.save(), so derive the coordinates, search
+        # vectors and rollups afterwards
+        call_command("rebuild_listing_rollups")
@@ -0,0 +1,30 @@
+from django.core.management import BaseCommand
+
+from listings.models import CityStat, FacetRollup, Listing, SellerRollup
+from listings.services.cities import rebuild_city_stats, refresh_city_keys
+from listings.services.facets import rebuild_facet_rollup
+from listings.services.geo import refresh_listing_locations
+from listings.services.search import refresh_search_vectors
+from listings.services.storefront import rebuild_seller_rollup
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute listing coordinates, search vectors and city keys, per-city "
+        "counts, the feed facet rollup and the seller storefront rollup."
+    )
+
+    def handle(self, *args, **options):
+        refresh_listing_locations(Listing.objects.all())
+        refresh_search_vectors(Listing.objects.all())
+        refresh_city_keys(Listing.objects.all())
+        rebuild_city_stats()
+        rebuild_facet_rollup()
+        rebuild_seller_rollup()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Rebuilt {CityStat.objects.count()} city stats, "
+                f"{FacetRollup.objects.count()} facet rows and "
+                f"{SellerRollup.objects.count()} seller rows."
+            )
+        )
@@ -0,0 +1,29 @@
+import time
+
+from django.core.management import BaseCommand
+
+from listings.models import SimilarListing
+from listings.services.similar import rebuild_similar_listings
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute the similar listings table from title/description TF-IDF, "
+        "by category and within the proximity radius."
+    )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        total = 0
+        for category_id, listings in rebuild_similar_listings():
+            total += listings
+            self.stdout.write(
+                f"  category {category_id}: {listings} listings "
+                f"({time.perf_counter() - started:.1f} s)"
+            )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Computed {SimilarListing.objects.count()} neighbors for {total} "
+                f"listings in {time.perf_counter() - started:.1f} s."
+            )
+        )
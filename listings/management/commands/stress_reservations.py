@@ -0,0 +1,109 @@
+import multiprocessing
+import statistics
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management import BaseCommand, CommandError
+from django.db import connection
+
+from listings.models import Listing, Reservation
+from listings.services.reservations import reserve_listing
+
+STRESS_EMAIL_DOMAIN = "stress.example.com"
+
+
+class Command(BaseCommand):
+    help = (
+        "Fire concurrent reserve attempts at one listing at a time and check "
+        "that exactly one buyer wins each round."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--buyers", type=int, default=300, help="Attempts per round.")
+        parser.add_argument("--workers", type=int, default=32, help="Parallel connections.")
+        parser.add_argument("--rounds", type=int, default=5)
+
+    def handle(self, *args, **options):
+        User = get_user_model()
+        seller, _ = User.objects.get_or_create(email=f"seller@{STRESS_EMAIL_DOMAIN}")
+        buyers = [
+            User.objects.get_or_create(email=f"buyer-{index}@{STRESS_EMAIL_DOMAIN}")[0]
+            for index in range(options["buyers"])
+        ]
+        listings = []
+        try:
+            throughputs = []
+            for round_number in range(1, options["rounds"] + 1):
+                listing = Listing.objects.create(
+                    seller=seller,
+                    title=f"Stress {round_number}",
+                    status=Listing.Status.PUBLISHED,
+                    currency="EUR",
+                )
+                listings.append(listing)
+                wins, elapsed = self.run_round(listing, buyers, options["workers"])
+                open_holds = Reservation.objects.filter(
+                    listing=listing, cancelled_at__isnull=True
+                ).count()
+                throughput = len(buyers) / elapsed
+                throughputs.append(throughput)
+                self.stdout.write(
+                    f"  round {round_number}: {len(buyers)} attempts, {wins} won, "
+                    f"{open_holds} open reservation(s), {elapsed * 1000:8.1f} ms, "
+                    f"{throughput:8.0f} attempts/s"
+                )
+                if wins != 1 or open_holds != 1:
+                    raise CommandError(
+                        f"Round {round_number}: expected exactly one winner, got {wins} "
+                        f"({open_holds} open reservations)."
+                    )
+            self.stdout.write(
+                f"Median throughput {statistics.median(throughputs):.0f} attempts/s "
+                f"with {options['workers']} workers."
+            )
+        finally:
+            Listing.objects.filter(pk__in=[listing.pk for listing in listings]).delete()
+            User.objects.filter(email__endswith=f"@{STRESS_EMAIL_DOMAIN}").delete()
+
+    def run_round(self, listing, buyers, workers):
+        # Separate processes, like web workers: threads would mostly measure
+        # the GIL around ORM query building.
+        context = multiprocessing.get_context("fork")
+        workers = min(workers, len(buyers))
+        pending = context.Queue()
+        for buyer in buyers:
+            pending.put(buyer.pk)
+        for _ in range(workers):
+            pending.put(None)
+        results = context.Queue()
+        start = context.Barrier(workers + 1)
+        connection.close()  # children must not share the parent's socket
+        processes = [
+            context.Process(target=_attempt_reservations, args=(listing.pk, pending, results, start))
+            for _ in range(workers)
+        ]
+        for process in processes:
+            process.start()
+        start.wait()
+        started = time.perf_counter()
+        wins = sum(results.get() for _ in processes)
+        elapsed = time.perf_counter() - started
+        for process in processes:
+            process.join()
+        return wins, elapsed
+
+
+def _attempt_reservations(listing_id, pending, results, start):
+    User = get_user_model()
+    wins = 0
+    try:
+        # connect before the race so only reservations are timed
+        connection.ensure_connection()
+        start.wait()
+        while (buyer_id := pending.get()) is not None:
+            listing = Listing.objects.get(pk=listing_id)
+            if reserve_listing(listing, User(pk=buyer_id)):
+                wins += 1
+    finally:
+        connection.close()
+        results.put(wins)
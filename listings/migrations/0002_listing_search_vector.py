@@ -0,0 +1,52 @@
+# Generated by Django 6.0.1 on 2026-10-17 06:00
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.contrib.postgres.operations import UnaccentExtension
+from django.db import migrations
+
+CREATE_SEARCH_CONFIG = [
+    "CREATE TEXT SEARCH CONFIGURATION french_unaccent (COPY = french);",
+    "ALTER TEXT SEARCH CONFIGURATION french_unaccent "
+    "ALTER MAPPING FOR hword, hword_part, word WITH unaccent, french_stem;",
+]
+
+DROP_SEARCH_CONFIG = "DROP TEXT SEARCH CONFIGURATION IF EXISTS french_unaccent;"
+
+BACKFILL_SEARCH_VECTOR = """
+UPDATE listings_listing AS listing
+SET search_vector =
+    setweight(to_tsvector('french_unaccent', coalesce(listing.title, '')), 'A')
+    || setweight(to_tsvector('french_unaccent', coalesce(category.name, '')), 'B')
+    || setweight(to_tsvector('french_unaccent', coalesce(listing.city, '')), 'C')
+    || setweight(to_tsvector('french_unaccent', coalesce(listing.description, '')), 'D')
+FROM listings_listing AS source
+LEFT JOIN catalog_category AS category ON category.id = source.category_id
+WHERE source.id = listing.id;
+"""
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("catalog", "0001_initial"),
+        ("listings", "0001_initial"),
+    ]
+
+    operations = [
+        UnaccentExtension(),
+        migrations.RunSQL(CREATE_SEARCH_CONFIG, reverse_sql=DROP_SEARCH_CONFIG),
+        migrations.AddField(
+            model_name="listing",
+            name="search_vector",
+            field=django.contrib.postgres.search.SearchVectorField(
+                blank=True, editable=False, null=True
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="listing",
+            index=django.contrib.postgres.indexes.GinIndex(
+                fields=["search_vector"], name="listings_li_search__219da8_gin"
+            ),
+        ),
+        migrations.RunSQL(BACKFILL_SEARCH_VECTOR, reverse_sql=migrations.RunSQL.noop),
+    ]
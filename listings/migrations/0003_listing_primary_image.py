@@ -0,0 +1,70 @@
+# Generated by Django 6.0.1 on 2026-10-17 06:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def backfill_primary_images(apps, schema_editor):
+    Listing = apps.get_model("listings", "Listing")
+    ListingImage = apps.get_model("listings", "ListingImage")
+    listing_ids = (
+        ListingImage.objects.values_list("listing_id", flat=True).distinct().iterator()
+    )
+    for listing_id in listing_ids:
+        primary = (
+            ListingImage.objects.filter(listing_id=listing_id)
+            .select_related("image_asset")
+            .order_by("-is_primary", "sort_order")
+            .first()
+        )
+        asset = primary.image_asset
+        try:
+            width, height = asset.image.width, asset.image.height
+        except (OSError, ValueError):
+            width, height = None, None
+        Listing.objects.filter(pk=listing_id).update(
+            primary_image=asset,
+            primary_image_url=asset.image.url if asset.image else "",
+            primary_image_width=width,
+            primary_image_height=height,
+        )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("listings", "0002_listing_search_vector"),
+        (
+            "mediahub",
+            "0003_rename_mediahub_ba_owner_status_c_2258a1_idx_mediahub_ba_owner_i_cf00dd_idx_and_more",
+        ),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="listing",
+            name="primary_image",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="primary_for_listings",
+                to="mediahub.imageasset",
+            ),
+        ),
+        migrations.AddField(
+            model_name="listing",
+            name="primary_image_height",
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="listing",
+            name="primary_image_url",
+            field=models.CharField(blank=True, max_length=500),
+        ),
+        migrations.AddField(
+            model_name="listing",
+            name="primary_image_width",
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.RunPython(backfill_primary_images, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,91 @@
+# Generated by Django 6.0.1 on 2026-10-17 06:27
+
+from collections import Counter, defaultdict
+
+import django.contrib.postgres.indexes
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations, models
+
+from listings.services.cities import refresh_city_keys
+
+
+def backfill_city_stats(apps, schema_editor):
+    Listing = apps.get_model("listings", "Listing")
+    CityStat = apps.get_model("listings", "CityStat")
+    refresh_city_keys(Listing.objects.all())
+
+    spellings = defaultdict(Counter)
+    published = (
+        Listing.objects.filter(status="published")
+        .exclude(city_key="")
+        .values("city_key", "city")
+        .annotate(total=models.Count("id"))
+    )
+    for row in published:
+        spellings[row["city_key"]][row["city"].strip()] += row["total"]
+    CityStat.objects.bulk_create(
+        CityStat(
+            key=key,
+            name=counts.most_common(1)[0][0],
+            published_count=sum(counts.values()),
+        )
+        for key, counts in spellings.items()
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("listings", "0003_listing_primary_image"),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.CreateModel(
+            name="CityStat",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("key", models.CharField(max_length=80, unique=True)),
+                ("name", models.CharField(max_length=80)),
+                ("published_count", models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.AddField(
+            model_name="listing",
+            name="city_key",
+            field=models.CharField(blank=True, editable=False, max_length=80),
+        ),
+        migrations.RunPython(backfill_city_stats, migrations.RunPython.noop),
+        migrations.RemoveIndex(
+            model_name="listing",
+            name="listings_li_city_9bf6a5_idx",
+        ),
+        migrations.AddIndex(
+            model_name="listing",
+            index=models.Index(
+                fields=["city_key", "status", "created_at"],
+                name="listings_li_city_ke_61dde4_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="citystat",
+            index=django.contrib.postgres.indexes.GinIndex(
+                fields=["key"],
+                name="listings_citystat_key_trgm",
+                opclasses=["gin_trgm_ops"],
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="citystat",
+            index=models.Index(
+                fields=["-published_count"], name="listings_ci_publish_54e73e_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,79 @@
+# Generated by Django 6.0.1 on 2026-10-17 06:36
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+from listings.services.facets import FACET_DIMENSIONS, price_bucket_expression
+
+
+def backfill_facet_rollup(apps, schema_editor):
+    Listing = apps.get_model("listings", "Listing")
+    FacetRollup = apps.get_model("listings", "FacetRollup")
+    published = (
+        Listing.objects.filter(status="published")
+        .annotate(price_bucket=price_bucket_expression())
+        .values(*FACET_DIMENSIONS)
+        .annotate(total=models.Count("id"))
+        .order_by()
+    )
+    FacetRollup.objects.bulk_create(
+        (
+            FacetRollup(
+                **{dimension: row[dimension] for dimension in FACET_DIMENSIONS},
+                published_count=row["total"],
+            )
+            for row in published.iterator()
+        ),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("catalog", "0001_initial"),
+        ("listings", "0004_city_stats"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="FacetRollup",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("condition", models.CharField(blank=True, max_length=16)),
+                ("city_key", models.CharField(blank=True, max_length=80)),
+                (
+                    "price_bucket",
+                    models.PositiveSmallIntegerField(blank=True, null=True),
+                ),
+                ("published_count", models.IntegerField(default=0)),
+                (
+                    "category",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to="catalog.category",
+                    ),
+                ),
+            ],
+            options={
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("category", "condition", "city_key", "price_bucket"),
+                        name="listings_facetrollup_unique_dimensions",
+                        nulls_distinct=False,
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(backfill_facet_rollup, migrations.RunPython.noop),
+    ]
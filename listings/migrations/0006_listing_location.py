@@ -0,0 +1,62 @@
+# Generated by Django 6.0.1 on 2026-10-17 06:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("listings", "0005_facet_rollup"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PostalCode",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("country_code", models.CharField(max_length=2)),
+                ("postal_code", models.CharField(max_length=20)),
+                ("place_name", models.CharField(blank=True, max_length=180)),
+                ("latitude", models.FloatField()),
+                ("longitude", models.FloatField()),
+            ],
+        ),
+        migrations.AddField(
+            model_name="listing",
+            name="geo_cell",
+            field=models.IntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name="listing",
+            name="latitude",
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name="listing",
+            name="longitude",
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name="listing",
+            index=models.Index(
+                condition=models.Q(("status", "published")),
+                fields=["geo_cell", "created_at"],
+                include=("latitude", "longitude"),
+                name="listings_published_geo_idx",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="postalcode",
+            constraint=models.UniqueConstraint(
+                fields=("country_code", "postal_code"),
+                name="listings_postalcode_unique_code",
+            ),
+        ),
+    ]
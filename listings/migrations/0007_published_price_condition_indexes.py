@@ -0,0 +1,57 @@
+# Generated by Django 6.0.1 on 2026-10-17 07:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("listings", "0006_listing_location"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="listing",
+            name="condition",
+            field=models.CharField(
+                blank=True,
+                choices=[
+                    ("new", "New"),
+                    ("like_new", "Like New"),
+                    ("good", "Good"),
+                    ("fair", "Fair"),
+                    ("for_parts", "For Parts"),
+                ],
+                default="good",
+                max_length=16,
+            ),
+        ),
+        migrations.AlterField(
+            model_name="listing",
+            name="price_cents",
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name="listing",
+            index=models.Index(
+                condition=models.Q(("status", "published")),
+                fields=["price_cents", "created_at"],
+                name="listings_published_price_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="listing",
+            index=models.Index(
+                condition=models.Q(("status", "published")),
+                fields=["condition", "created_at"],
+                name="listings_published_cond_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="listing",
+            index=models.Index(
+                condition=models.Q(("status", "published")),
+                fields=["condition", "price_cents"],
+                name="listings_pub_cond_price_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 6.0.1 on 2026-10-17 07:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("listings", "0007_published_price_condition_indexes"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="reservation",
+            index=models.Index(
+                condition=models.Q(("cancelled_at__isnull", True)),
+                fields=["expires_at"],
+                name="listings_open_resa_expiry_idx",
+            ),
+        ),
+    ]
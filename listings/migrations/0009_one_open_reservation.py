@@ -0,0 +1,38 @@
+# Generated by Django 6.0.1 on 2026-10-17 07:35
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+from django.utils import timezone
+
+
+def cancel_duplicate_open_reservations(apps, schema_editor):
+    # keep the newest open reservation of each listing
+    Reservation = apps.get_model("listings", "Reservation")
+    newest = (
+        Reservation.objects.filter(listing=OuterRef("listing"), cancelled_at__isnull=True)
+        .order_by("-reserved_at", "-pk")
+        .values("pk")[:1]
+    )
+    Reservation.objects.filter(cancelled_at__isnull=True).exclude(
+        pk=Subquery(newest)
+    ).update(cancelled_at=timezone.now())
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("listings", "0008_reservation_expiry_index"),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            cancel_duplicate_open_reservations, migrations.RunPython.noop
+        ),
+        migrations.AddConstraint(
+            model_name="reservation",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("cancelled_at__isnull", True)),
+                fields=("listing",),
+                name="listings_one_open_reservation",
+            ),
+        ),
+    ]
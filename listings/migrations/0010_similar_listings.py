@@ -0,0 +1,69 @@
+# Generated by Django 6.0.1 on 2026-10-17 07:53
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("listings", "0009_one_open_reservation"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SimilarListing",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("rank", models.PositiveSmallIntegerField()),
+                ("score", models.FloatField()),
+            ],
+        ),
+        migrations.AddField(
+            model_name="listing",
+            name="similar_refreshed_at",
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name="listing",
+            index=models.Index(
+                condition=models.Q(
+                    ("similar_refreshed_at__isnull", True), ("status", "published")
+                ),
+                fields=["created_at"],
+                name="listings_similar_pending_idx",
+            ),
+        ),
+        migrations.AddField(
+            model_name="similarlisting",
+            name="listing",
+            field=models.ForeignKey(
+                db_index=False,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="similar_listings",
+                to="listings.listing",
+            ),
+        ),
+        migrations.AddField(
+            model_name="similarlisting",
+            name="similar",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="similar_to",
+                to="listings.listing",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="similarlisting",
+            constraint=models.UniqueConstraint(
+                fields=("listing", "rank"), name="listings_similar_rank_uniq"
+            ),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 6.0.1 on 2026-10-17 08:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("listings", "0010_similar_listings"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="listing",
+            name="popularity",
+            field=models.FloatField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="listing",
+            name="unique_viewers",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="listing",
+            name="view_count",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name="listing",
+            index=models.Index(
+                condition=models.Q(("status", "published")),
+                fields=["popularity", "created_at"],
+                name="listings_published_trend_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 6.0.1 on 2026-10-17 08:35
+
+from django.db import migrations, models
+from django.db.models import Count, Exists, OuterRef, Subquery
+
+
+def backfill_favorite_counts(apps, schema_editor):
+    Listing = apps.get_model("listings", "Listing")
+    Favorite = apps.get_model("listings", "Favorite")
+    favorites = Favorite.objects.filter(listing=OuterRef("pk"))
+    Listing.objects.filter(Exists(favorites)).update(
+        favorite_count=Subquery(
+            favorites.order_by()
+            .values("listing")
+            .annotate(count=Count("pk"))
+            .values("count")
+        )
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("listings", "0011_listing_view_counts"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="listing",
+            name="favorite_count",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name="favorite",
+            index=models.Index(
+                fields=["user", "created_at", "id"], name="listings_fav_user_recent_idx"
+            ),
+        ),
+        migrations.RunPython(backfill_favorite_counts, migrations.RunPython.noop),
+    ]
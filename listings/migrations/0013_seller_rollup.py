@@ -0,0 +1,105 @@
+# Generated by Django 6.0.1 on 2026-10-17 08:47
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_seller_rollup(apps, schema_editor):
+    Listing = apps.get_model("listings", "Listing")
+    SellerRollup = apps.get_model("listings", "SellerRollup")
+    groups = (
+        Listing.objects.values("seller_id", "category_id", "status")
+        .annotate(total=models.Count("id"))
+        .order_by()
+    )
+    SellerRollup.objects.bulk_create(
+        (
+            SellerRollup(
+                seller_id=row["seller_id"],
+                category_id=row["category_id"],
+                status=row["status"],
+                listing_count=row["total"],
+            )
+            for row in groups.iterator()
+        ),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("catalog", "0001_initial"),
+        ("listings", "0012_favorite_count"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SellerRollup",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("draft", "Draft"),
+                            ("pending_review", "Pending Review"),
+                            ("published", "Published"),
+                            ("rejected", "Rejected"),
+                            ("reserved", "Reserved"),
+                            ("sold", "Sold"),
+                            ("archived", "Archived"),
+                        ],
+                        max_length=20,
+                    ),
+                ),
+                ("listing_count", models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name="listing",
+            index=models.Index(
+                fields=["seller", "status", "created_at"],
+                name="listings_li_seller__61061a_idx",
+            ),
+        ),
+        migrations.AddField(
+            model_name="sellerrollup",
+            name="category",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="+",
+                to="catalog.category",
+            ),
+        ),
+        migrations.AddField(
+            model_name="sellerrollup",
+            name="seller",
+            field=models.ForeignKey(
+                db_index=False,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="+",
+                to=settings.AUTH_USER_MODEL,
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="sellerrollup",
+            constraint=models.UniqueConstraint(
+                fields=("seller", "category", "status"),
+                name="listings_sellerrollup_unique_group",
+                nulls_distinct=False,
+            ),
+        ),
+        migrations.RunPython(backfill_seller_rollup, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 6.0.1 on 2026-10-17 08:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("listings", "0013_seller_rollup"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="listing",
+            name="primary_image_derivatives",
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
@@ -1,6 +1,10 @@
 import uuid
 from django.conf import settings
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
 from catalog.models import Category
 from django.db.models import Prefetch
 
@@ -8,6 +12,17 @@ from mediahub.models import ImageAsset, VideoUpload, Keyframe
 from django.conf import settings
 from django.utils import timezone
 from django.utils.text import slugify
+
+from .services.cities import adjust_city_count, normalize_city
+from .services.facets import adjust_facet_count, facet_key
+from .services.feed_cache import invalidate_shared_feed
+from .services.geo import grid_cell, locate_postal_code
+from .services.storefront import adjust_seller_count, seller_group
+from .services.search import (
+    SEARCH_SOURCE_FIELDS,
+    listing_search_vector,
+    refresh_search_vectors,
+)
 
 
 class Listing(models.Model):
@@ -48,10 +63,9 @@ class Listing(models.Model):
         choices=Condition.choices,
         default=Condition.GOOD,
         blank=True,
-        db_index=True,
     )
 
-    price_cents = models.PositiveIntegerField(null=True, blank=True, db_index=True)
+    price_cents = models.PositiveIntegerField(null=True, blank=True)
     currency = models.CharField(max_length=3, default="EUR")
 
     status = models.CharField(
@@ -60,7 +74,13 @@ class Listing(models.Model):
 
     postal_code = models.CharField(max_length=20, blank=True, db_index=True)
     city = models.CharField(max_length=80, blank=True, db_index=True)
+    # normalize_city(city), the value the feed filter and CityStat use
+    city_key = models.CharField(max_length=80, blank=True, editable=False)
     country_code = models.CharField(max_length=2, default="FR")
+    # postal code centroid (PostalCode), filled in by save()
+    latitude = models.FloatField(null=True, blank=True, editable=False)
+    longitude = models.FloatField(null=True, blank=True, editable=False)
+    geo_cell = models.IntegerField(null=True, blank=True, editable=False)
 
     source_type = models.CharField(max_length=12, default="images")  # images|video
     source_video = models.ForeignKey(
@@ -72,6 +92,20 @@ class Listing(models.Model):
     )
     ai_summary = models.JSONField(default=dict, blank=True)
 
+    # denormalized from ListingImage so cards render without extra queries,
+    # maintained by refresh_primary_image()
+    primary_image = models.ForeignKey(
+        ImageAsset,
+        null=True,
+        blank=True,
+        on_delete=models.SET_NULL,
+        related_name="primary_for_listings",
+    )
+    primary_image_url = models.CharField(max_length=500, blank=True)
+    primary_image_width = models.PositiveIntegerField(null=True, blank=True)
+    primary_image_height = models.PositiveIntegerField(null=True, blank=True)
+    primary_image_derivatives = models.JSONField(default=dict, blank=True, editable=False)
+
     shipping_enabled = models.BooleanField(default=True, db_index=True)
     in_person_enabled = models.BooleanField(default=True, db_index=True)
 
@@ -86,6 +120,18 @@ class Listing(models.Model):
     )
     moderated_at = models.DateTimeField(null=True, blank=True)
 
+    # weighted title/category/city/description tsvector, see services/search.py
+    search_vector = SearchVectorField(null=True, blank=True, editable=False)
+    # flushed from the Redis view counters, see services/view_counts.py;
+    # popularity is a log2 score of unique viewers decayed by age
+    view_count = models.PositiveIntegerField(default=0, editable=False)
+    unique_viewers = models.PositiveIntegerField(default=0, editable=False)
+    popularity = models.FloatField(default=0, editable=False)
+    # kept in step by ListingFavoriteToggleView, so cards need no COUNT
+    favorite_count = models.PositiveIntegerField(default=0, editable=False)
+    # last SimilarListing computation; null queues a newly published listing
+    similar_refreshed_at = models.DateTimeField(null=True, blank=True, editable=False)
+
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -93,22 +139,87 @@ class Listing(models.Model):
         indexes = [
             models.Index(fields=["status", "created_at"]),
             models.Index(fields=["category", "status", "created_at"]),
-            models.Index(fields=["city", "status", "created_at"]),
+            models.Index(fields=["city_key", "status", "created_at"]),
             models.Index(fields=["postal_code", "status", "created_at"]),
+            models.Index(fields=["seller", "status", "created_at"]),
+            GinIndex(fields=["search_vector"]),
+            # covering, so the distance check reads no heap
+            models.Index(
+                fields=["geo_cell", "created_at"],
+                include=["latitude", "longitude"],
+                name="listings_published_geo_idx",
+                condition=models.Q(status="published"),
+            ),
+            # feed price range, price sorts and condition filter; only
+            # published rows are ever read this way
+            models.Index(
+                fields=["price_cents", "created_at"],
+                name="listings_published_price_idx",
+                condition=models.Q(status="published"),
+            ),
+            models.Index(
+                fields=["condition", "created_at"],
+                name="listings_published_cond_idx",
+                condition=models.Q(status="published"),
+            ),
+            models.Index(
+                fields=["condition", "price_cents"],
+                name="listings_pub_cond_price_idx",
+                condition=models.Q(status="published"),
+            ),
+            models.Index(
+                fields=["popularity", "created_at"],
+                name="listings_published_trend_idx",
+                condition=models.Q(status="published"),
+            ),
+            models.Index(
+                fields=["created_at"],
+                name="listings_similar_pending_idx",
+                condition=models.Q(status="published", similar_refreshed_at__isnull=True),
+            ),
         ]
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self._initial_status = self.status
+        self._initial_city_key = self.city_key
+        self._initial_facet_key = facet_key(self)
+        self._initial_location = (self.country_code, self.postal_code)
+        self._initial_seller_group = seller_group(self)
 
     def __str__(self):
         return self.title
 
     def get_primary_image(self):
-        primary = self.images.filter(is_primary=True).select_related("image_asset").first()
-        if primary:
-            return primary
-        return self.images.select_related("image_asset").order_by("sort_order").first()
+        if "images" in getattr(self, "_prefetched_objects_cache", {}):
+            images = sorted(
+                self.images.all(), key=lambda image: (not image.is_primary, image.sort_order)
+            )
+            return images[0] if images else None
+        return (
+            self.images.select_related("image_asset")
+            .order_by("-is_primary", "sort_order")
+            .first()
+        )
+
+    def refresh_primary_image(self):
+        primary = self.get_primary_image()
+        asset = primary.image_asset if primary else None
+        width, height = _read_image_dimensions(asset)
+        self.primary_image = asset
+        self.primary_image_url = asset.image.url if asset and asset.image else ""
+        self.primary_image_width = width
+        self.primary_image_height = height
+        self.primary_image_derivatives = asset.derivatives if asset else {}
+        self.updated_at = timezone.now()
+        Listing.objects.filter(pk=self.pk).update(
+            primary_image=self.primary_image,
+            primary_image_url=self.primary_image_url,
+            primary_image_width=width,
+            primary_image_height=height,
+            primary_image_derivatives=self.primary_image_derivatives,
+            updated_at=self.updated_at,
+        )
 
     def cancel_active_reservation(self):
         now = timezone.now()
@@ -119,11 +230,91 @@ class Listing(models.Model):
     def save(self, *args, **kwargs):
         if not self.slug and self.title:
             self.slug = slugify(self.title)[:160]
-        prev_status = self._initial_status
+        self.city_key = normalize_city(self.city)
+        location_changed = (self.country_code, self.postal_code) != self._initial_location
+        if location_changed or (self._state.adding and self.latitude is None):
+            self.latitude, self.longitude = locate_postal_code(
+                self.postal_code, self.country_code
+            ) or (None, None)
+        self.geo_cell = grid_cell(self.latitude, self.longitude)
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and "city" in update_fields:
+            kwargs["update_fields"] = update_fields = {*update_fields, "city_key"}
+        if update_fields is not None and {"postal_code", "country_code"} & set(update_fields):
+            kwargs["update_fields"] = update_fields = {
+                *update_fields,
+                "latitude",
+                "longitude",
+                "geo_cell",
+            }
+        prev_status = None if self._state.adding else self._initial_status
+        if self.status == self.Status.PUBLISHED and prev_status not in (
+            self.Status.PUBLISHED,
+            self.Status.RESERVED,
+        ):
+            # queued for the similar listings refresh, see services/similar.py
+            self.similar_refreshed_at = None
+            if update_fields is not None:
+                kwargs["update_fields"] = update_fields = {
+                    *update_fields,
+                    "similar_refreshed_at",
+                }
         super().save(*args, **kwargs)
+        if (prev_status == self.Status.PUBLISHED) != (self.status == self.Status.PUBLISHED):
+            invalidate_shared_feed()
+        self._sync_published_rollups(prev_status)
+        if prev_status is None or seller_group(self) != self._initial_seller_group:
+            if prev_status is not None:
+                adjust_seller_count(self._initial_seller_group, -1)
+            adjust_seller_count(seller_group(self), 1)
+        if update_fields is None or SEARCH_SOURCE_FIELDS.intersection(update_fields):
+            refresh_search_vectors(Listing.objects.filter(pk=self.pk))
         if prev_status == self.Status.RESERVED and self.status == self.Status.PUBLISHED:
             self.cancel_active_reservation()
         self._initial_status = self.status
+        self._initial_city_key = self.city_key
+        self._initial_facet_key = facet_key(self)
+        self._initial_location = (self.country_code, self.postal_code)
+        self._initial_seller_group = seller_group(self)
+
+    def _sync_published_rollups(self, prev_status):
+        # CityStat and FacetRollup only count published listings
+        was_published = prev_status == self.Status.PUBLISHED
+        is_published = self.status == self.Status.PUBLISHED
+        city_moved = self.city_key != self._initial_city_key
+        if was_published and (city_moved or not is_published):
+            adjust_city_count(self._initial_city_key, self.city, -1)
+        if is_published and (city_moved or not was_published):
+            adjust_city_count(self.city_key, self.city, 1)
+        new_facet_key = facet_key(self)
+        facets_moved = new_facet_key != self._initial_facet_key
+        if was_published and (facets_moved or not is_published):
+            adjust_facet_count(self._initial_facet_key, -1)
+        if is_published and (facets_moved or not was_published):
+            adjust_facet_count(new_facet_key, 1)
+
+    def get_active_reservation(self):
+        """Newest unexpired reservation, without writing anything.
+
+        Uses prefetched ``reservations`` when the view loaded them. Expired
+        reservations are cancelled by the periodic sweeper, not here.
+        """
+        prefetched = getattr(self, "_prefetched_objects_cache", {}).get("reservations")
+        if prefetched is not None:
+            active = [reservation for reservation in prefetched if reservation.is_active()]
+            return max(active, key=lambda reservation: reservation.reserved_at, default=None)
+        return (
+            self.reservations.active()
+            .select_related("buyer")
+            .order_by("-reserved_at")
+            .first()
+        )
+
+    def is_reservable(self, active_reservation):
+        # a RESERVED listing whose hold lapsed is available before the sweep
+        return self.status == self.Status.PUBLISHED or (
+            self.status == self.Status.RESERVED and active_reservation is None
+        )
 
     def refresh_reservation_state(self):
         now = timezone.now()
@@ -144,6 +335,121 @@ class Listing(models.Model):
             self.save(update_fields=["status"])
         return active
 
+
+def _read_image_dimensions(asset):
+    if not asset or not asset.image:
+        return None, None
+    try:
+        return asset.image.width, asset.image.height
+    except (OSError, ValueError):
+        return None, None
+
+
+@receiver(post_delete, sender=Listing)
+def invalidate_feed_on_listing_delete(sender, instance, **kwargs):
+    adjust_seller_count(seller_group(instance), -1)
+    if instance.status == Listing.Status.PUBLISHED:
+        invalidate_shared_feed()
+        adjust_city_count(instance.city_key, instance.city, -1)
+        adjust_facet_count(facet_key(instance), -1)
+
+
+@receiver(post_save, sender=Category)
+def refresh_category_search_vectors(sender, instance, created, **kwargs):
+    if not created:
+        # updated_at also rolls the cached listing cards showing the category
+        Listing.objects.filter(category=instance).update(
+            search_vector=listing_search_vector(), updated_at=timezone.now()
+        )
+
+
+class CityStat(models.Model):
+    """Published listing count per normalized city, for autocomplete and fuzzy filtering."""
+
+    key = models.CharField(max_length=80, unique=True)
+    name = models.CharField(max_length=80)
+    published_count = models.IntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            GinIndex(
+                fields=["key"],
+                name="listings_citystat_key_trgm",
+                opclasses=["gin_trgm_ops"],
+            ),
+            models.Index(fields=["-published_count"]),
+        ]
+
+    def __str__(self):
+        return self.name
+
+
+class PostalCode(models.Model):
+    """Postal code centroid, loaded with the load_postal_codes command."""
+
+    country_code = models.CharField(max_length=2)
+    postal_code = models.CharField(max_length=20)
+    place_name = models.CharField(max_length=180, blank=True)
+    latitude = models.FloatField()
+    longitude = models.FloatField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["country_code", "postal_code"],
+                name="listings_postalcode_unique_code",
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.postal_code} {self.place_name}"
+
+
+class FacetRollup(models.Model):
+    """Published listing count per facet combination, see services/facets.py."""
+
+    category = models.ForeignKey(
+        Category, null=True, blank=True, on_delete=models.CASCADE, related_name="+"
+    )
+    condition = models.CharField(max_length=16, blank=True)
+    city_key = models.CharField(max_length=80, blank=True)
+    price_bucket = models.PositiveSmallIntegerField(null=True, blank=True)
+    published_count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["category", "condition", "city_key", "price_bucket"],
+                name="listings_facetrollup_unique_dimensions",
+                nulls_distinct=False,
+            )
+        ]
+
+
+class SellerRollup(models.Model):
+    """Listing count per seller, category and status, see services/storefront.py."""
+
+    seller = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="+",
+        db_index=False,  # leads the unique (seller, category, status) index
+    )
+    category = models.ForeignKey(
+        Category, null=True, blank=True, on_delete=models.CASCADE, related_name="+"
+    )
+    status = models.CharField(max_length=20, choices=Listing.Status.choices)
+    listing_count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["seller", "category", "status"],
+                name="listings_sellerrollup_unique_group",
+                nulls_distinct=False,
+            )
+        ]
+
 
 class ListingImage(models.Model):
     listing = models.ForeignKey(
@@ -168,6 +474,33 @@ class ListingImage(models.Model):
         indexes = [models.Index(fields=["listing", "sort_order"])]
 
 
+@receiver(post_save, sender=ListingImage)
+@receiver(post_delete, sender=ListingImage)
+def refresh_listing_primary_image(sender, instance, **kwargs):
+    origin = kwargs.get("origin")
+    if isinstance(origin, Listing) or getattr(origin, "model", None) is Listing:
+        return  # the listing itself is being deleted
+    listing = Listing.objects.filter(pk=instance.listing_id).first()
+    if listing:
+        listing.refresh_primary_image()
+
+
+@receiver(post_save, sender=ImageAsset)
+def refresh_listings_on_asset_files(sender, instance, update_fields=None, **kwargs):
+    if not update_fields or not {"image", "derivatives"} & set(update_fields):
+        return
+    # updated_at rolls the cached cards and page ETags showing the asset
+    now = timezone.now()
+    Listing.objects.filter(primary_image=instance).update(
+        primary_image_url=instance.image.url if instance.image else "",
+        primary_image_derivatives=instance.derivatives,
+        updated_at=now,
+    )
+    Listing.objects.filter(images__image_asset=instance).exclude(
+        primary_image=instance
+    ).update(updated_at=now)
+
+
 class ReservationQuerySet(models.QuerySet):
     def active(self):
         now = timezone.now()
@@ -201,6 +534,22 @@ class Reservation(models.Model):
 
     class Meta:
         ordering = ["-reserved_at"]
+        constraints = [
+            # at most one open hold per listing, see reserve_listing()
+            models.UniqueConstraint(
+                fields=["listing"],
+                condition=models.Q(cancelled_at__isnull=True),
+                name="listings_one_open_reservation",
+            ),
+        ]
+        indexes = [
+            # the expiry sweeper only looks at open reservations
+            models.Index(
+                fields=["expires_at"],
+                name="listings_open_resa_expiry_idx",
+                condition=models.Q(cancelled_at__isnull=True),
+            ),
+        ]
 
     def is_active(self):
         return self.cancelled_at is None and self.expires_at > timezone.now()
@@ -222,6 +571,35 @@ class Favorite(models.Model):
 
     class Meta:
         unique_together = [("user", "listing")]
+        indexes = [
+            # the wishlist walks a user's favorites newest first
+            models.Index(
+                fields=["user", "created_at", "id"], name="listings_fav_user_recent_idx"
+            ),
+        ]
+
+
+class SimilarListing(models.Model):
+    """Precomputed neighbor shown on the listing page, see services/similar.py."""
+
+    listing = models.ForeignKey(
+        Listing,
+        on_delete=models.CASCADE,
+        related_name="similar_listings",
+        db_index=False,  # leads the unique (listing, rank) index
+    )
+    similar = models.ForeignKey(
+        Listing, on_delete=models.CASCADE, related_name="similar_to"
+    )
+    rank = models.PositiveSmallIntegerField()
+    score = models.FloatField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["listing", "rank"], name="listings_similar_rank_uniq"
+            )
+        ]
 
 
 class Report(models.Model):
@@ -0,0 +1,45 @@
+import hashlib
+
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+CARD_BODY_TEMPLATE = "components/listings/listing_card_body.html"
+CARD_CACHE_TIMEOUT = 60 * 60 * 24
+
+
+def seller_card_version(seller):
+    # Everything the card shows about the seller; a change yields a new key.
+    shown = f"{seller.trust_score}|{seller.get_full_name()}|{seller.email}"
+    return hashlib.md5(shown.encode()).hexdigest()[:12]
+
+
+def card_cache_key(listing):
+    return "listing-card:{}:{}:{}".format(
+        listing.pk,
+        listing.updated_at.timestamp(),
+        seller_card_version(listing.seller),
+    )
+
+
+def render_card_bodies(listings):
+    """Pair each listing with its user-independent card body HTML.
+
+    Bodies are fetched with one cache round-trip and only misses are rendered.
+    Keys embed ``updated_at`` and the seller version, so edits, image changes
+    and seller changes are picked up without explicit invalidation.
+    """
+    listings = list(listings)
+    keys = [card_cache_key(listing) for listing in listings]
+    cached = cache.get_many(keys)
+    rendered = {}
+    cards = []
+    for listing, key in zip(listings, keys):
+        body = cached.get(key)
+        if body is None:
+            body = render_to_string(CARD_BODY_TEMPLATE, {"listing": listing})
+            rendered[key] = body
+        cards.append((listing, mark_safe(body)))
+    if rendered:
+        cache.set_many(rendered, CARD_CACHE_TIMEOUT)
+    return cards
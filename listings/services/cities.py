@@ -0,0 +1,119 @@
+import re
+import unicodedata
+
+from django.apps import apps
+from django.contrib.postgres.search import TrigramWordSimilarity
+from django.db import connection, transaction
+from django.db.models import Q
+
+AUTOCOMPLETE_LIMIT = 8
+FUZZY_MATCH_LIMIT = 5
+
+_LIGATURES = str.maketrans({"œ": "oe", "æ": "ae", "ß": "ss"})
+_SEPARATORS = re.compile(r"[^a-z0-9]+")
+
+
+def normalize_city(name):
+    """Accent, case and punctuation insensitive key: "Saint-Étienne" -> "saint etienne"."""
+    decomposed = unicodedata.normalize(
+        "NFKD", (name or "").casefold().translate(_LIGATURES)
+    )
+    stripped = "".join(char for char in decomposed if not unicodedata.combining(char))
+    return _SEPARATORS.sub(" ", stripped).strip()
+
+
+def _city_stats():
+    return apps.get_model("listings", "CityStat").objects.all()
+
+
+def _fuzzy_matches(stats, key):
+    return (
+        stats.filter(published_count__gt=0)
+        .filter(Q(key__startswith=key) | Q(key__trigram_word_similar=key))
+        .annotate(similarity=TrigramWordSimilarity(key, "key"))
+        .order_by("-similarity", "-published_count")
+    )
+
+
+def matching_city_keys(query):
+    """City keys the feed should filter on for a user-typed city.
+
+    An exact key wins; otherwise the closest spellings are looked up in the
+    small CityStat table through its trigram index, so the listings table is
+    only ever probed with exact ``city_key`` values.
+    """
+    key = normalize_city(query)
+    if not key:
+        return []
+    stats = _city_stats()
+    if stats.filter(key=key, published_count__gt=0).exists():
+        return [key]
+    keys = list(
+        _fuzzy_matches(stats, key).values_list("key", flat=True)[:FUZZY_MATCH_LIMIT]
+    )
+    return keys or [key]
+
+
+def city_suggestions(query, limit=AUTOCOMPLETE_LIMIT):
+    key = normalize_city(query)
+    stats = _city_stats()
+    if key:
+        stats = _fuzzy_matches(stats, key)
+    else:
+        stats = stats.filter(published_count__gt=0).order_by("-published_count")
+    return list(stats.values("name", "published_count")[:limit])
+
+
+def adjust_city_count(key, name, delta):
+    if not key or not delta:
+        return
+    table = _city_stats().model._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {table} (key, name, published_count) VALUES (%s, %s, %s) "
+            f"ON CONFLICT (key) DO UPDATE "
+            f"SET published_count = {table}.published_count + EXCLUDED.published_count",
+            [key, name.strip()[:80], delta],
+        )
+
+
+def refresh_city_keys(queryset):
+    """Recompute ``city_key`` for rows written without ``Listing.save()``."""
+    cities = queryset.order_by().values_list("city", flat=True).distinct()
+    for city in list(cities):
+        queryset.filter(city=city).update(city_key=normalize_city(city))
+
+
+def rebuild_city_stats(keys=None):
+    """Recount published listings per city key, for all keys or only ``keys``.
+
+    The display name is the most common spelling sellers used for the key.
+    """
+    CityStat = apps.get_model("listings", "CityStat")
+    Listing = apps.get_model("listings", "Listing")
+    keys = None if keys is None else [key for key in set(keys) if key]
+    if keys == []:
+        return
+    key_filter = "" if keys is None else "AND city_key = ANY(%s)"
+    params = [Listing.Status.PUBLISHED] + ([] if keys is None else [keys])
+    with transaction.atomic():
+        stats = CityStat.objects.all()
+        if keys is not None:
+            stats = stats.filter(key__in=keys)
+        stats.delete()
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                INSERT INTO {CityStat._meta.db_table} (key, name, published_count)
+                SELECT DISTINCT ON (city_key)
+                    city_key, city, sum(spelling_count) OVER (PARTITION BY city_key)
+                FROM (
+                    SELECT city_key, trim(city) AS city, count(*) AS spelling_count
+                    FROM {Listing._meta.db_table}
+                    WHERE status = %s AND city_key <> '' {key_filter}
+                    GROUP BY city_key, trim(city)
+                ) AS spellings
+                ORDER BY city_key, spelling_count DESC, city
+                """,
+                params,
+            )
@@ -0,0 +1,208 @@
+import hashlib
+from dataclasses import dataclass
+
+from django.apps import apps
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.contrib.postgres.aggregates import ArrayAgg
+from django.db.models import Max, OuterRef, Subquery, Sum, TextField, Value
+from django.db.models.functions import Cast, Coalesce, Concat, Greatest, Least, Power
+from django.template.loader import render_to_string
+from django.utils import timezone
+from django.utils.safestring import mark_safe
+
+from .card_cache import seller_card_version
+from .favorites import favorite_ids
+
+DETAIL_CACHE_TIMEOUT = 60
+
+# The parts of the listing page that carry no CSRF token for anonymous
+# visitors; the layout around them is rendered for every request.
+DETAIL_FRAGMENTS = {
+    "body": "fragments/listings/detail_body.html",
+    "script": "fragments/listings/detail_script.html",
+}
+
+
+@dataclass(frozen=True)
+class DetailValidators:
+    etag: str
+    last_modified: int
+    anonymous: bool
+    seller_id: int
+
+
+def _validator_row(listing_id, slug):
+    Listing = apps.get_model("listings", "Listing")
+    Reservation = apps.get_model("listings", "Reservation")
+    SimilarListing = apps.get_model("listings", "SimilarListing")
+    now = timezone.now()
+    reservations = Reservation.objects.filter(listing=OuterRef("pk"))
+    shown_similar = SimilarListing.objects.filter(
+        listing=OuterRef("pk"), similar__status=Listing.Status.PUBLISHED
+    )
+    return (
+        Listing.objects.filter(
+            id=listing_id,
+            slug=slug,
+            status__in=[Listing.Status.PUBLISHED, Listing.Status.RESERVED],
+        )
+        .annotate(
+            active_reservation_id=Subquery(
+                reservations.filter(cancelled_at__isnull=True, expires_at__gt=now)
+                .order_by("-reserved_at")
+                .values("pk")[:1]
+            ),
+            # a hold that lapses changes the page without any write
+            reservation_changed_at=Subquery(
+                reservations.annotate(
+                    changed_at=Greatest(
+                        "reserved_at",
+                        Coalesce("cancelled_at", Least("expires_at", Value(now))),
+                    )
+                )
+                .order_by("-changed_at")
+                .values("changed_at")[:1]
+            ),
+            # which neighbors are shown, their last edit, their favorite
+            # counts (not an edit) and the last refresh
+            similar_version=Subquery(
+                shown_similar.order_by()
+                .values("listing")
+                .annotate(
+                    version=Concat(
+                        Cast(Sum(Power(2, "rank")), TextField()),
+                        Value(":"),
+                        Cast(Max("similar__updated_at"), TextField()),
+                        Value(":"),
+                        Cast(Sum("similar__favorite_count"), TextField()),
+                        Value(":"),
+                        Cast(Max("pk"), TextField()),
+                        output_field=TextField(),
+                    )
+                )
+                .values("version")
+            ),
+            similar_ids=Subquery(
+                shown_similar.order_by()
+                .values("listing")
+                .annotate(ids=ArrayAgg("similar_id"))
+                .values("ids")
+            ),
+        )
+        .values(
+            "pk",
+            "status",
+            "updated_at",
+            "active_reservation_id",
+            "reservation_changed_at",
+            "similar_version",
+            "similar_ids",
+            "seller_id",
+            "seller__trust_score",
+            "seller__first_name",
+            "seller__last_name",
+            "seller__email",
+            "seller__reputation__updated_at",
+        )
+        .first()
+    )
+
+
+def detail_validators(request, listing_id, slug):
+    """ETag and Last-Modified for one listing page, or None if it is not shown.
+
+    Built from a single narrow query: the listing's ``updated_at``, the
+    seller's card fields and stats version, the reservation state and the
+    similar listings panel. The ETag also carries the viewer's favorites
+    and ``can_reserve`` bit, so a favorite toggle on a listing the page shows
+    or a login yields a new tag. Memoized on the request.
+    """
+    if hasattr(request, "_listing_detail_validators"):
+        return request._listing_detail_validators
+    Listing = apps.get_model("listings", "Listing")
+    validators = None
+    row = _validator_row(listing_id, slug)
+    if row is not None:
+        # Listing instances read every field in __init__, hence plain values
+        seller = get_user_model()(
+            pk=row["seller_id"],
+            trust_score=row["seller__trust_score"],
+            first_name=row["seller__first_name"],
+            last_name=row["seller__last_name"],
+            email=row["seller__email"],
+        )
+        stats_updated_at = row["seller__reputation__updated_at"]
+        changes = [row["updated_at"], row["reservation_changed_at"], stats_updated_at]
+        user = request.user
+        if user.is_authenticated:
+            is_seller = user.pk == seller.pk
+            can_reserve = not is_seller and (
+                row["status"] == Listing.Status.PUBLISHED or row["active_reservation_id"] is None
+            )
+            # the similar listings panel flags favorites too; favorites on
+            # listings the page does not show leave the tag alone
+            shown_ids = {str(row["pk"])} | {str(pk) for pk in row["similar_ids"] or ()}
+            favorites = ",".join(sorted(shown_ids & favorite_ids(user)))
+            viewer = "{}:{}:{}:{}".format(
+                user.pk,
+                hashlib.md5(favorites.encode()).hexdigest(),
+                is_seller,
+                can_reserve,
+            )
+        else:
+            viewer = "anonymous"
+        shown = "|".join(
+            [
+                str(row["pk"]),
+                row["status"],
+                str(row["updated_at"].timestamp()),
+                seller_card_version(seller),
+                str(stats_updated_at.timestamp()) if stats_updated_at else "-",
+                str(row["active_reservation_id"] or "-"),
+                row["similar_version"] or "-",
+                viewer,
+            ]
+        )
+        validators = DetailValidators(
+            etag=hashlib.md5(shown.encode()).hexdigest(),
+            last_modified=int(max(change for change in changes if change).timestamp()),
+            anonymous=not user.is_authenticated,
+            seller_id=seller.pk,
+        )
+    request._listing_detail_validators = validators
+    return validators
+
+
+def _fragments_key(validators, full_path):
+    path_hash = hashlib.md5(full_path.encode()).hexdigest()[:12]
+    return f"listing-detail-fragments:{validators.etag}:{path_hash}"
+
+
+def detail_cache_timeout():
+    return getattr(settings, "LISTING_DETAIL_CACHE_TIMEOUT", DETAIL_CACHE_TIMEOUT)
+
+
+def render_detail_fragments(context, request):
+    return {
+        name: render_to_string(template, context, request)
+        for name, template in DETAIL_FRAGMENTS.items()
+    }
+
+
+def cached_anonymous_fragments(validators, full_path):
+    fragments = cache.get(_fragments_key(validators, full_path))
+    if fragments is None:
+        return None
+    return {name: mark_safe(html) for name, html in fragments.items()}
+
+
+def store_anonymous_fragments(validators, full_path, fragments):
+    """Keep the anonymous page fragments for a short while.
+
+    The key embeds the ETag, so any change to the listing, seller or
+    reservation state moves readers to a new key without invalidation.
+    The path is part of the key because the login links carry it.
+    """
+    cache.set(_fragments_key(validators, full_path), fragments, detail_cache_timeout())
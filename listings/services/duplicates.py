@@ -0,0 +1,32 @@
+from functools import reduce
+from operator import or_
+
+from django.apps import apps
+from django.db.models import Q
+
+from mediahub.services.perceptual import near_duplicates
+
+SIMILAR_PHOTO_LISTINGS = 6
+
+
+def listings_with_similar_photos(listing, limit=SIMILAR_PHOTO_LISTINGS):
+    """Other listings with a photo that looks like one of ``listing``'s."""
+    Listing = apps.get_model("listings", "Listing")
+    ImageAsset = apps.get_model("mediahub", "ImageAsset")
+    hashes = {
+        image.image_asset.perceptual_hash
+        for image in listing.images.all()
+        if image.image_asset.perceptual_hash is not None
+    }
+    if not hashes:
+        return []
+    matches = reduce(
+        or_, (Q(pk__in=near_duplicates(value).order_by().values("pk")) for value in hashes)
+    )
+    return list(
+        Listing.objects.filter(images__image_asset__in=ImageAsset.objects.filter(matches))
+        .exclude(pk=listing.pk)
+        .select_related("seller")
+        .distinct()
+        .order_by("-created_at")[:limit]
+    )
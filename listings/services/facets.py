@@ -0,0 +1,176 @@
+from collections import Counter
+from contextlib import contextmanager
+
+from django.apps import apps
+from django.db import connection, transaction
+from django.db.models import Case, Count, IntegerField, Min, Q, Sum, Value, When
+
+from .cities import adjust_city_count
+
+# (label, min_cents, max_cents); the bucket id is the position in this list
+PRICE_BUCKETS = [
+    ("Moins de 10 €", 0, 1_000),
+    ("10 à 50 €", 1_000, 5_000),
+    ("50 à 100 €", 5_000, 10_000),
+    ("100 à 500 €", 10_000, 50_000),
+    ("Plus de 500 €", 50_000, None),
+]
+CITY_FACET_LIMIT = 10
+
+FACET_DIMENSIONS = ("category_id", "condition", "city_key", "price_bucket")
+
+
+def price_bucket(price_cents):
+    if price_cents is None:
+        return None
+    for bucket, (_, _low, high) in enumerate(PRICE_BUCKETS):
+        if high is None or price_cents < high:
+            return bucket
+    return None
+
+
+def price_bucket_range(bucket):
+    _, low, high = PRICE_BUCKETS[bucket]
+    return low, high
+
+
+def price_bucket_expression():
+    return Case(
+        *(
+            When(price_cents__lt=high, then=Value(bucket))
+            for bucket, (_, _low, high) in enumerate(PRICE_BUCKETS)
+            if high is not None
+        ),
+        When(price_cents__isnull=False, then=Value(len(PRICE_BUCKETS) - 1)),
+        default=None,
+        output_field=IntegerField(),
+    )
+
+
+def facet_key(listing):
+    return (
+        listing.category_id,
+        listing.condition,
+        listing.city_key,
+        price_bucket(listing.price_cents),
+    )
+
+
+def _rollup_model():
+    return apps.get_model("listings", "FacetRollup")
+
+
+def adjust_facet_count(key, delta):
+    if not delta:
+        return
+    FacetRollup = _rollup_model()
+    table = FacetRollup._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {table} "
+            f"(category_id, condition, city_key, price_bucket, published_count) "
+            f"VALUES (%s, %s, %s, %s, %s) "
+            f"ON CONFLICT ON CONSTRAINT listings_facetrollup_unique_dimensions "
+            f"DO UPDATE SET published_count = {table}.published_count + EXCLUDED.published_count",
+            [*key, delta],
+        )
+
+
+def _published_groups(listing_ids):
+    Listing = apps.get_model("listings", "Listing")
+    rows = (
+        Listing.objects.filter(pk__in=listing_ids, status=Listing.Status.PUBLISHED)
+        .annotate(price_bucket=price_bucket_expression())
+        .values(*FACET_DIMENSIONS)
+        .annotate(total=Count("id"), city=Min("city"))
+        .order_by()
+    )
+    groups = Counter()
+    cities = {}
+    for row in rows:
+        groups[tuple(row[dimension] for dimension in FACET_DIMENSIONS)] += row["total"]
+        cities[row["city_key"]] = row["city"]
+    return groups, cities
+
+
+@contextmanager
+def tracking_published_rollups(queryset):
+    """Keep FacetRollup and CityStat in sync across a bulk ``update()``.
+
+    Queryset updates skip ``Listing.save()``, so the published rows of the
+    selection are grouped before and after and only the difference is applied.
+    """
+    listing_ids = list(queryset.order_by().values_list("pk", flat=True))
+    before, _ = _published_groups(listing_ids)
+    yield
+    after, cities = _published_groups(listing_ids)
+    city_deltas = Counter()
+    for key in before.keys() | after.keys():
+        delta = after[key] - before[key]
+        adjust_facet_count(key, delta)
+        city_deltas[key[2]] += delta
+    for city_key, delta in city_deltas.items():
+        adjust_city_count(city_key, cities.get(city_key, city_key), delta)
+
+
+def rebuild_facet_rollup():
+    FacetRollup = _rollup_model()
+    Listing = apps.get_model("listings", "Listing")
+    published = (
+        Listing.objects.filter(status=Listing.Status.PUBLISHED)
+        .annotate(price_bucket=price_bucket_expression())
+        .values(*FACET_DIMENSIONS)
+        .annotate(total=Count("id"))
+        .order_by()
+    )
+    sql, params = published.query.sql_with_params()
+    with transaction.atomic():
+        FacetRollup.objects.all().delete()
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {FacetRollup._meta.db_table} "
+                f"({', '.join(FACET_DIMENSIONS)}, published_count) {sql}",
+                params,
+            )
+
+
+def _dimension_filters(selected):
+    filters = {}
+    if selected.get("category"):
+        filters["category_id"] = Q(category__slug=selected["category"])
+    if selected.get("condition"):
+        filters["condition"] = Q(condition=selected["condition"])
+    if selected.get("city_keys") is not None:
+        filters["city_key"] = Q(city_key__in=selected["city_keys"])
+    if selected.get("price_bucket") is not None:
+        filters["price_bucket"] = Q(price_bucket=selected["price_bucket"])
+    return filters
+
+
+def facet_counts(selected):
+    """Published counts per value of each facet under the current filters.
+
+    Each dimension is counted with every filter except its own, so the
+    sidebar still offers the alternatives to the selected value. The
+    counts are summed from FacetRollup, never from the listings table.
+    """
+    filters = _dimension_filters(selected)
+    counts = {}
+    for dimension in FACET_DIMENSIONS:
+        rows = _rollup_model().objects.filter(published_count__gt=0)
+        for other, condition in filters.items():
+            if other != dimension:
+                rows = rows.filter(condition)
+        rows = rows.exclude(**{f"{dimension}__isnull": True})
+        if dimension in ("condition", "city_key"):
+            rows = rows.exclude(**{dimension: ""})
+        rows = (
+            rows.values(dimension)
+            .annotate(total=Sum("published_count"))
+            .order_by("-total", dimension)
+            .values_list(dimension, "total")
+        )
+        if dimension == "city_key":
+            rows = rows[:CITY_FACET_LIMIT]
+        counts[dimension] = list(rows)
+    return counts
@@ -0,0 +1,58 @@
+from django.apps import apps
+from django.core.cache import cache
+from django.db import transaction
+
+FAVORITES_CACHE_TIMEOUT = 60 * 60 * 24
+
+
+def _favorites_key(user_id):
+    return f"favorites:{user_id}"
+
+
+def _load_favorite_ids(user_id):
+    Favorite = apps.get_model("listings", "Favorite")
+    return {
+        str(listing_id)
+        for listing_id in Favorite.objects.filter(user_id=user_id).values_list(
+            "listing_id", flat=True
+        )
+    }
+
+
+def favorite_ids(user):
+    """Ids (as strings) of the listings ``user`` has favorited.
+
+    Read from the cache, and loaded from Favorite on a miss, so pages can
+    flag cards without joining Favorite into the listing query.
+    """
+    if not user.is_authenticated:
+        return set()
+    key = _favorites_key(user.pk)
+    ids = cache.get(key)
+    if ids is None:
+        ids = _load_favorite_ids(user.pk)
+        cache.set(key, ids, FAVORITES_CACHE_TIMEOUT)
+    return ids
+
+
+def mark_favorites(listings, user):
+    ids = favorite_ids(user)
+    for listing in listings:
+        listing.is_favorited = str(listing.pk) in ids
+
+
+def refresh_favorite_ids(user):
+    """Reload the cached set once the current transaction has committed.
+
+    Reloading from Favorite rather than patching the cached copy keeps two
+    toggles racing for the same user from writing back each other's stale
+    set.
+    """
+    user_id = user.pk
+
+    def reload():
+        cache.set(
+            _favorites_key(user_id), _load_favorite_ids(user_id), FAVORITES_CACHE_TIMEOUT
+        )
+
+    transaction.on_commit(reload)
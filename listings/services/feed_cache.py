@@ -0,0 +1,79 @@
+import hashlib
+import time
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+GENERATION_KEY = "feed:shared:generation"
+LOCK_TIMEOUT = 10
+LOCK_WAIT_SECONDS = 2.0
+LOCK_POLL_SECONDS = 0.05
+
+
+def feed_generation():
+    generation = cache.get(GENERATION_KEY)
+    if generation is None:
+        # Seed from the clock so a lost counter never revives old keys.
+        cache.add(GENERATION_KEY, time.time_ns(), None)
+        generation = cache.get(GENERATION_KEY)
+    return generation
+
+
+def _bump_generation():
+    try:
+        cache.incr(GENERATION_KEY)
+    except ValueError:
+        cache.add(GENERATION_KEY, time.time_ns(), None)
+
+
+def invalidate_shared_feed():
+    """Drop every cached shared feed page.
+
+    Called whenever a listing enters or leaves PUBLISHED. The generation is
+    bumped right away and again after commit, so a concurrent request cannot
+    refill the new generation with rows read before the transaction landed.
+    """
+    _bump_generation()
+    transaction.on_commit(_bump_generation)
+
+
+def shared_feed_key(params):
+    digest = hashlib.md5(urlencode(sorted(params.items())).encode()).hexdigest()
+    return f"feed:shared:{feed_generation()}:{digest}"
+
+
+def get_or_compute(key, compute):
+    """Stampede-protected cache read.
+
+    Only the request holding ``<key>:lock`` runs ``compute``. While it runs,
+    other requests serve the previous value if it is in its grace window, or
+    wait briefly for the new one on a cold key.
+    """
+    entry = cache.get(key)
+    if entry is not None and entry["fresh_until"] > time.time():
+        return entry["value"]
+
+    lock_key = f"{key}:lock"
+    if cache.add(lock_key, 1, LOCK_TIMEOUT):
+        try:
+            value = compute()
+            cache.set(
+                key,
+                {"value": value, "fresh_until": time.time() + settings.FEED_CACHE_TIMEOUT},
+                settings.FEED_CACHE_TIMEOUT + settings.FEED_CACHE_GRACE,
+            )
+        finally:
+            cache.delete(lock_key)
+        return value
+
+    if entry is not None:
+        return entry["value"]
+    deadline = time.monotonic() + LOCK_WAIT_SECONDS
+    while time.monotonic() < deadline:
+        time.sleep(LOCK_POLL_SECONDS)
+        entry = cache.get(key)
+        if entry is not None:
+            return entry["value"]
+    return compute()
@@ -0,0 +1,132 @@
+import math
+
+from django.apps import apps
+from django.db.models import F, FloatField, Value
+from django.db.models.functions import ASin, Cos, Power, Radians, Sin, Sqrt
+
+EARTH_RADIUS_KM = 6371.0
+RADIUS_CHOICES_KM = (5, 10, 20, 50, 100)
+DEFAULT_RADIUS_KM = 20
+
+# ~22 km cells: a 20 km radius touches about a dozen of them
+GRID_CELL_DEGREES = 0.2
+_GRID_COLUMNS = math.ceil(360 / GRID_CELL_DEGREES)
+
+
+def grid_cell(latitude, longitude):
+    if latitude is None or longitude is None:
+        return None
+    row = math.floor((latitude + 90) / GRID_CELL_DEGREES)
+    column = math.floor((longitude + 180) / GRID_CELL_DEGREES) % _GRID_COLUMNS
+    return row * _GRID_COLUMNS + column
+
+
+def cell_center(cell):
+    row, column = divmod(cell, _GRID_COLUMNS)
+    return (
+        (row + 0.5) * GRID_CELL_DEGREES - 90,
+        (column + 0.5) * GRID_CELL_DEGREES - 180,
+    )
+
+
+def bounding_box(latitude, longitude, radius_km):
+    lat_delta = math.degrees(radius_km / EARTH_RADIUS_KM)
+    cos_lat = max(math.cos(math.radians(latitude)), 0.01)
+    lon_delta = min(math.degrees(radius_km / (EARTH_RADIUS_KM * cos_lat)), 180)
+    return (
+        max(latitude - lat_delta, -90),
+        min(latitude + lat_delta, 90),
+        longitude - lon_delta,
+        longitude + lon_delta,
+    )
+
+
+def cells_covering(latitude, longitude, radius_km):
+    min_lat, max_lat, min_lon, max_lon = bounding_box(latitude, longitude, radius_km)
+    rows = range(
+        math.floor((min_lat + 90) / GRID_CELL_DEGREES),
+        math.floor((max_lat + 90) / GRID_CELL_DEGREES) + 1,
+    )
+    columns = {
+        math.floor((lon + 180) / GRID_CELL_DEGREES) % _GRID_COLUMNS
+        for lon in _steps(min_lon, max_lon)
+    }
+    return sorted(row * _GRID_COLUMNS + column for row in rows for column in columns)
+
+
+def _steps(start, stop):
+    value = start
+    while value < stop:
+        yield value
+        value += GRID_CELL_DEGREES
+    yield stop
+
+
+def distance_expression(latitude, longitude):
+    """Great-circle distance in km from a point to the listing coordinates."""
+    lat0 = Value(math.radians(latitude), output_field=FloatField())
+    lon0 = Value(math.radians(longitude), output_field=FloatField())
+    half_dlat = (Radians(F("latitude")) - lat0) / 2
+    half_dlon = (Radians(F("longitude")) - lon0) / 2
+    haversine = Power(Sin(half_dlat), 2) + Cos(lat0) * Cos(
+        Radians(F("latitude"))
+    ) * Power(Sin(half_dlon), 2)
+    return 2 * EARTH_RADIUS_KM * ASin(Sqrt(haversine))
+
+
+def within_radius(queryset, latitude, longitude, radius_km):
+    """Listings within ``radius_km``, annotated with ``distance_km``.
+
+    The grid cells covering the radius' bounding box are the prefilter,
+    matched through the ``geo_cell`` index; the exact distance is only
+    evaluated for rows of those cells. A separate latitude/longitude range
+    test would be redundant and skews the planner's row estimate down by
+    orders of magnitude, which makes it pick bitmap scans over index walks.
+    """
+    return (
+        queryset.filter(geo_cell__in=cells_covering(latitude, longitude, radius_km))
+        .annotate(distance_km=distance_expression(latitude, longitude))
+        .filter(distance_km__lte=radius_km)
+    )
+
+
+def locate_postal_code(postal_code, country_code="FR"):
+    """(latitude, longitude) of a postal code centroid, or None if unknown."""
+    postal_code = (postal_code or "").strip().upper()
+    if not postal_code:
+        return None
+    PostalCode = apps.get_model("listings", "PostalCode")
+    return (
+        PostalCode.objects.filter(
+            country_code=(country_code or "FR").upper(), postal_code=postal_code
+        )
+        .values_list("latitude", "longitude")
+        .first()
+    )
+
+
+def refresh_listing_locations(queryset):
+    """Recompute coordinates for rows written without ``Listing.save()``.
+
+    Runs one UPDATE per distinct postal code rather than per listing.
+    """
+    PostalCode = apps.get_model("listings", "PostalCode")
+    centroids = {
+        (country_code, postal_code): (latitude, longitude)
+        for country_code, postal_code, latitude, longitude in PostalCode.objects.values_list(
+            "country_code", "postal_code", "latitude", "longitude"
+        ).iterator()
+    }
+    locations = (
+        queryset.order_by().values_list("country_code", "postal_code").distinct()
+    )
+    for country_code, postal_code in list(locations):
+        latitude, longitude = centroids.get(
+            ((country_code or "").upper(), (postal_code or "").strip().upper()),
+            (None, None),
+        )
+        queryset.filter(country_code=country_code, postal_code=postal_code).update(
+            latitude=latitude,
+            longitude=longitude,
+            geo_cell=grid_cell(latitude, longitude),
+        )
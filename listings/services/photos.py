@@ -0,0 +1,36 @@
+from django.apps import apps
+from django.db.models import Max
+
+from mediahub.services.content_store import stored_images
+
+
+def add_listing_photos(listing, user, uploads, primary_index=None):
+    """Store ``uploads`` and append them to ``listing``'s photos, in order.
+
+    Sort order and the primary flag are set as the rows are inserted, all
+    in the transaction that stores the images, and the listing's primary
+    image is refreshed once. ``primary_index`` picks the new primary photo
+    among ``uploads``.
+    """
+    ListingImage = apps.get_model("listings", "ListingImage")
+    with stored_images(user, uploads) as assets:
+        last = listing.images.aggregate(last=Max("sort_order"))["last"]
+        start = 0 if last is None else last + 1
+        if primary_index is not None and not 0 <= primary_index < len(assets):
+            primary_index = None
+        if primary_index is not None:
+            listing.images.filter(is_primary=True).update(is_primary=False)
+        images = ListingImage.objects.bulk_create(
+            [
+                ListingImage(
+                    listing=listing,
+                    image_asset=asset,
+                    is_primary=index == primary_index,
+                    sort_order=start + index,
+                )
+                for index, asset in enumerate(assets)
+            ]
+        )
+        # bulk_create sends no post_save, see refresh_listing_primary_image
+        listing.refresh_primary_image()
+    return images
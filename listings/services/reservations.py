@@ -0,0 +1,140 @@
+from datetime import timedelta
+
+from django.apps import apps
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Exists, OuterRef, Q
+from django.utils import timezone
+
+from .cities import adjust_city_count
+from .facets import adjust_facet_count, facet_key, tracking_published_rollups
+from .feed_cache import invalidate_shared_feed
+from .storefront import adjust_seller_count, seller_group, tracking_seller_rollup
+
+SWEEP_BATCH_SIZE = 500
+
+
+def _expire_batch(now, batch_size):
+    Reservation = apps.get_model("listings", "Reservation")
+    with transaction.atomic():
+        stale = list(
+            Reservation.objects.filter(cancelled_at__isnull=True, expires_at__lte=now)
+            .select_for_update(skip_locked=True)
+            .order_by("expires_at")
+            .values_list("pk", "listing_id")[:batch_size]
+        )
+        if not stale:
+            return 0
+        Reservation.objects.filter(pk__in=[pk for pk, _ in stale]).update(
+            cancelled_at=now
+        )
+        _republish_released({listing_id for _, listing_id in stale})
+    return len(stale)
+
+
+def _republish_released(listing_ids):
+    Listing = apps.get_model("listings", "Listing")
+    Reservation = apps.get_model("listings", "Reservation")
+    # a listing reserved again in the meantime keeps its RESERVED status
+    released = Listing.objects.filter(
+        pk__in=listing_ids, status=Listing.Status.RESERVED
+    ).exclude(Exists(Reservation.objects.active().filter(listing=OuterRef("pk"))))
+    with tracking_published_rollups(released), tracking_seller_rollup(released):
+        republished = released.update(status=Listing.Status.PUBLISHED)
+    if republished:
+        invalidate_shared_feed()
+    return republished
+
+
+def expire_stale_reservations(batch_size=SWEEP_BATCH_SIZE):
+    """Cancel reservations past ``expires_at`` and republish their listings.
+
+    Runs in batches of ``batch_size`` reservations, each in its own short
+    transaction. Rows locked by a concurrent sweep are skipped rather than
+    waited on. Returns the number of reservations expired.
+    """
+    now = timezone.now()
+    expired = 0
+    while True:
+        count = _expire_batch(now, batch_size)
+        expired += count
+        if count < batch_size:
+            return expired
+
+
+def resolve_reservations(listings):
+    """Set ``active_reservation`` on each listing of a page, in bulk.
+
+    Reads the prefetched ``reservations`` when present. RESERVED listings
+    whose hold lapsed before the sweeper ran are released together: one
+    UPDATE cancels their holds and one republishes them, however many
+    there are on the page.
+    """
+    Listing = apps.get_model("listings", "Listing")
+    Reservation = apps.get_model("listings", "Reservation")
+    lapsed = []
+    for listing in listings:
+        listing.active_reservation = listing.get_active_reservation()
+        if listing.status == Listing.Status.RESERVED and listing.active_reservation is None:
+            lapsed.append(listing)
+    if not lapsed:
+        return
+    now = timezone.now()
+    listing_ids = [listing.pk for listing in lapsed]
+    with transaction.atomic():
+        Reservation.objects.filter(
+            listing_id__in=listing_ids, cancelled_at__isnull=True, expires_at__lte=now
+        ).update(cancelled_at=now)
+        _republish_released(listing_ids)
+    for listing in lapsed:
+        listing.status = Listing.Status.PUBLISHED
+        listing._initial_status = listing.status
+        listing._initial_seller_group = seller_group(listing)
+
+
+def reserve_listing(listing, buyer):
+    """Reserve ``listing`` for ``buyer``; the Reservation, or None if taken.
+
+    The listing row is claimed with a single conditional UPDATE, so of
+    concurrent buyers exactly one sees a matched row; the others get None
+    without waiting on a retry loop. The partial unique constraint on open
+    reservations is the backstop should two transactions still get past it.
+    """
+    Listing = apps.get_model("listings", "Listing")
+    Reservation = apps.get_model("listings", "Reservation")
+    now = timezone.now()
+    hold = timedelta(hours=getattr(settings, "RESERVATION_HOLD_HOURS", 24))
+    try:
+        with transaction.atomic():
+            # a lapsed hold the sweeper has not reached yet must not block
+            Reservation.objects.filter(
+                listing=listing, cancelled_at__isnull=True, expires_at__lte=now
+            ).update(cancelled_at=now)
+            claimable = Listing.objects.filter(pk=listing.pk)
+            was_published = bool(
+                claimable.filter(status=Listing.Status.PUBLISHED).update(
+                    status=Listing.Status.RESERVED
+                )
+            )
+            if not was_published and not claimable.filter(
+                Q(status=Listing.Status.RESERVED),
+                ~Exists(Reservation.objects.active().filter(listing=OuterRef("pk"))),
+            ).update(status=Listing.Status.RESERVED):
+                return None
+            reservation = Reservation.objects.create(
+                listing=listing, buyer=buyer, expires_at=now + hold
+            )
+            if was_published:
+                # what Listing.save() does when a listing leaves PUBLISHED
+                adjust_city_count(listing.city_key, listing.city, -1)
+                adjust_facet_count(facet_key(listing), -1)
+                group = (listing.seller_id, listing.category_id)
+                adjust_seller_count((*group, Listing.Status.PUBLISHED), -1)
+                adjust_seller_count((*group, Listing.Status.RESERVED), 1)
+                invalidate_shared_feed()
+    except IntegrityError:
+        return None
+    listing.status = Listing.Status.RESERVED
+    listing._initial_status = listing.status
+    listing._initial_seller_group = seller_group(listing)
+    return reservation
@@ -0,0 +1,33 @@
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+from django.db.models import F, OuterRef, Subquery
+
+from catalog.models import Category
+
+# Text search configuration created by listings/migrations/0002: the stock
+# `french` configuration with `unaccent` applied before stemming.
+SEARCH_CONFIG = "french_unaccent"
+
+SEARCH_SOURCE_FIELDS = frozenset({"title", "description", "city", "category"})
+
+
+def listing_search_vector():
+    category_name = Subquery(
+        Category.objects.filter(pk=OuterRef("category_id")).values("name")[:1]
+    )
+    return (
+        SearchVector("title", weight="A", config=SEARCH_CONFIG)
+        + SearchVector(category_name, weight="B", config=SEARCH_CONFIG)
+        + SearchVector("city", weight="C", config=SEARCH_CONFIG)
+        + SearchVector("description", weight="D", config=SEARCH_CONFIG)
+    )
+
+
+def refresh_search_vectors(queryset):
+    return queryset.update(search_vector=listing_search_vector())
+
+
+def search_listings(queryset, q):
+    query = SearchQuery(q, config=SEARCH_CONFIG, search_type="websearch")
+    return queryset.filter(search_vector=query).annotate(
+        search_rank=SearchRank(F("search_vector"), query)
+    )
@@ -0,0 +1,360 @@
+import math
+import re
+import time
+import unicodedata
+from collections import Counter, defaultdict
+
+import numpy as np
+from django.apps import apps
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .geo import (
+    DEFAULT_RADIUS_KM,
+    EARTH_RADIUS_KM,
+    GRID_CELL_DEGREES,
+    cell_center,
+    cells_covering,
+)
+
+SIMILAR_COUNT = 6
+SIMILAR_RADIUS_KM = DEFAULT_RADIUS_KM
+MIN_SIMILARITY = 0.15
+PENDING_BATCH_SIZE = 1000
+# under CELERY_TASK_SOFT_TIME_LIMIT; the next beat run takes up the rest
+PENDING_TIME_BUDGET_SECONDS = 20.0
+STORE_BATCH_SIZE = 5000
+STOP_WORDS = frozenset(
+    "aux avec ces dans des est les mais par pas pour que qui ses son sur tres une".split()
+)
+
+_WORD = re.compile(r"[a-z]{3,}")
+# no point of a grid cell is further than this from its centre
+_CELL_HALF_DIAGONAL_KM = math.radians(GRID_CELL_DEGREES) * EARTH_RADIUS_KM / math.sqrt(2)
+
+
+def tokenize(text):
+    folded = unicodedata.normalize("NFKD", (text or "").lower())
+    folded = folded.encode("ascii", "ignore").decode()
+    return [word for word in _WORD.findall(folded) if word not in STOP_WORDS]
+
+
+def _block(geo_cell, city_key):
+    # listings are compared within reach of each other: by grid cell when
+    # located, by city otherwise
+    if geo_cell is not None:
+        return ("cell", geo_cell)
+    if city_key:
+        return ("city", city_key)
+    return None
+
+
+def _pool_blocks(block):
+    """Blocks holding every listing a listing of ``block`` may be paired with."""
+    kind, value = block
+    if kind == "city":
+        return [block]
+    latitude, longitude = cell_center(value)
+    return [
+        ("cell", cell)
+        for cell in cells_covering(
+            latitude, longitude, SIMILAR_RADIUS_KM + _CELL_HALF_DIAGONAL_KM
+        )
+    ]
+
+
+def _ranges(starts, lengths):
+    # concatenated range(start, start + length), without a Python loop
+    ends = np.cumsum(lengths)
+    offsets = np.arange(ends[-1] if len(ends) else 0) - np.repeat(ends - lengths, lengths)
+    return np.repeat(starts, lengths) + offsets
+
+
+def _distance_km(latitude, longitude, latitudes, longitudes):
+    lat0, lon0 = math.radians(latitude), math.radians(longitude)
+    lats, lons = np.radians(latitudes), np.radians(longitudes)
+    haversine = (
+        np.sin((lats - lat0) / 2) ** 2
+        + math.cos(lat0) * np.cos(lats) * np.sin((lons - lon0) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(haversine))
+
+
+class _Corpus:
+    """Term counts of one category's listings as CSR arrays, grouped by block."""
+
+    def __init__(self, rows):
+        vocabulary = {}
+        self.ids, latitudes, longitudes = [], [], []
+        # listings out of reach of any other, see _block()
+        self.unplaced = []
+        indptr, indices, counts = [0], [], []
+        blocks = defaultdict(list)
+        for pk, title, description, latitude, longitude, geo_cell, city_key in rows:
+            block = _block(geo_cell, city_key)
+            if block is None:
+                self.unplaced.append(pk)
+                continue
+            blocks[block].append(len(self.ids))
+            self.ids.append(pk)
+            latitudes.append(latitude)
+            longitudes.append(longitude)
+            # the title says what the item is; it counts twice
+            terms = Counter(tokenize(title) * 2 + tokenize(description))
+            for term, count in terms.items():
+                indices.append(vocabulary.setdefault(term, len(vocabulary)))
+                counts.append(count)
+            indptr.append(len(indices))
+        self.vocabulary_size = len(vocabulary)
+        self.latitudes = np.array(latitudes, dtype=float)
+        self.longitudes = np.array(longitudes, dtype=float)
+        self.indptr = np.array(indptr, dtype=np.int64)
+        self.indices = np.array(indices, dtype=np.int64)
+        self.counts = np.array(counts, dtype=float)
+        self.blocks = {block: np.array(members) for block, members in blocks.items()}
+
+    def neighbors(self, block):
+        """Top SIMILAR_COUNT (id, score) pairs for each listing of ``block``."""
+        pool = _Pool(self, block)
+        return {
+            self.ids[member]: pool.matches(pool.scores(member), SIMILAR_COUNT)
+            for member in self.blocks[block]
+        }
+
+
+class _Pool:
+    """The listings one block is compared with, as TF-IDF postings.
+
+    Vectors are weighted over the pool and L2-normalised; a listing's
+    similarity to the whole pool is then one sparse vector product over
+    the postings of its terms, accumulated with ``bincount``.
+    """
+
+    def __init__(self, corpus, block):
+        self.corpus, self.block = corpus, block
+        self.members = np.concatenate(
+            [corpus.blocks[member] for member in _pool_blocks(block) if member in corpus.blocks]
+        )
+        size = len(self.members)
+        starts = corpus.indptr[self.members]
+        lengths = corpus.indptr[self.members + 1] - starts
+        positions = _ranges(starts, lengths)
+        terms = corpus.indices[positions]
+        rows = np.repeat(np.arange(size), lengths)
+        document_frequency = np.bincount(terms, minlength=corpus.vocabulary_size)
+        idf = np.log((1 + size) / (1 + document_frequency)) + 1
+        weights = (1 + np.log(corpus.counts[positions])) * idf[terms]
+        norms = np.sqrt(np.bincount(rows, weights=weights**2, minlength=size))
+        weights /= norms[rows]
+
+        order = np.argsort(terms, kind="stable")
+        self.posting_rows, self.posting_weights = rows[order], weights[order]
+        self.term_starts = np.concatenate(([0], np.cumsum(document_frequency)))
+        self.terms, self.weights = terms, weights
+        self.row_starts = np.concatenate(([0], np.cumsum(lengths)))
+        self.index = {member: index for index, member in enumerate(self.members)}
+        self.latitudes = corpus.latitudes[self.members]
+        self.longitudes = corpus.longitudes[self.members]
+
+    def scores(self, member):
+        """Similarity of corpus row ``member`` to each pool row, 0 out of reach."""
+        index = self.index[member]
+        own = slice(self.row_starts[index], self.row_starts[index + 1])
+        own_terms = self.terms[own]
+        hit_lengths = self.term_starts[own_terms + 1] - self.term_starts[own_terms]
+        hits = _ranges(self.term_starts[own_terms], hit_lengths)
+        scores = np.bincount(
+            self.posting_rows[hits],
+            weights=self.posting_weights[hits] * np.repeat(self.weights[own], hit_lengths),
+            minlength=len(self.members),
+        )
+        scores[index] = 0
+        if self.block[0] == "cell":
+            distances = _distance_km(
+                self.latitudes[index], self.longitudes[index], self.latitudes, self.longitudes
+            )
+            scores[distances > SIMILAR_RADIUS_KM] = 0
+        return scores
+
+    def matches(self, scores, limit=None):
+        """(id, score) of pool rows at or above MIN_SIMILARITY, best first."""
+        candidates = np.flatnonzero(scores >= MIN_SIMILARITY)
+        ranked = candidates[np.argsort(-scores[candidates], kind="stable")][:limit]
+        ids = self.corpus.ids
+        return [(ids[self.members[row]], float(scores[row])) for row in ranked]
+
+
+def _published():
+    Listing = apps.get_model("listings", "Listing")
+    return Listing.objects.filter(status=Listing.Status.PUBLISHED)
+
+
+def _corpus(queryset):
+    return _Corpus(
+        queryset.values_list(
+            "pk",
+            "title",
+            "description",
+            "latitude",
+            "longitude",
+            "geo_cell",
+            "city_key",
+        ).iterator(chunk_size=5000)
+    )
+
+
+def _store(found):
+    if not found:
+        return
+    Listing = apps.get_model("listings", "Listing")
+    SimilarListing = apps.get_model("listings", "SimilarListing")
+    rows = [
+        SimilarListing(listing_id=listing_id, similar_id=similar_id, rank=rank, score=score)
+        for listing_id, neighbors in found.items()
+        for rank, (similar_id, score) in enumerate(neighbors, start=1)
+    ]
+    with transaction.atomic():
+        SimilarListing.objects.filter(listing_id__in=list(found)).delete()
+        SimilarListing.objects.bulk_create(rows, batch_size=1000)
+        Listing.objects.filter(pk__in=list(found)).update(
+            similar_refreshed_at=timezone.now()
+        )
+
+
+def _clear(listing_ids):
+    """Empty the neighbor lists of listings that are not paired."""
+    for start in range(0, len(listing_ids), STORE_BATCH_SIZE):
+        _store(dict.fromkeys(listing_ids[start : start + STORE_BATCH_SIZE], []))
+
+
+def rebuild_similar_listings():
+    """Recompute the neighbor table for every published listing.
+
+    Works one category at a time, each block of listings against the pool
+    of blocks within SIMILAR_RADIUS_KM. Listings without a category, or
+    without a location or a city, get no neighbors. Yields
+    ``(category_id, listings)`` after each category.
+    """
+    category_ids = _published().order_by().values_list("category_id", flat=True).distinct()
+    for category_id in list(category_ids):
+        listings = _published().filter(category_id=category_id)
+        if category_id is None:
+            unplaced = list(listings.values_list("pk", flat=True))
+            _clear(unplaced)
+            yield category_id, len(unplaced)
+            continue
+        corpus = _corpus(listings)
+        found = {}
+        for block in corpus.blocks:
+            found.update(corpus.neighbors(block))
+            if len(found) >= STORE_BATCH_SIZE:
+                _store(found)
+                found = {}
+        _store(found)
+        _clear(corpus.unplaced)
+        yield category_id, len(corpus.ids) + len(corpus.unplaced)
+
+
+def _current_neighbors(listing_ids):
+    SimilarListing = apps.get_model("listings", "SimilarListing")
+    current = defaultdict(list)
+    rows = SimilarListing.objects.filter(listing_id__in=listing_ids).order_by("rank")
+    for listing_id, similar_id, score in rows.values_list(
+        "listing_id", "similar_id", "score"
+    ):
+        current[listing_id].append((similar_id, score))
+    return current
+
+
+def _refresh_block(category_id, block, new_ids):
+    pool_blocks = _pool_blocks(block)
+    cells = [value for kind, value in pool_blocks if kind == "cell"]
+    cities = [value for kind, value in pool_blocks if kind == "city"]
+    corpus = _corpus(
+        _published().filter(
+            Q(geo_cell__in=cells) | Q(geo_cell__isnull=True, city_key__in=cities),
+            category_id=category_id,
+        )
+    )
+    if block not in corpus.blocks:
+        # moved or withdrawn since they were queued
+        _clear(list(new_ids))
+        return
+    pool = _Pool(corpus, block)
+    matches = {
+        corpus.ids[member]: pool.matches(pool.scores(member))
+        for member in corpus.blocks[block]
+        if corpus.ids[member] in new_ids
+    }
+    found = dict.fromkeys(new_ids, [])
+    found.update((pk, pk_matches[:SIMILAR_COUNT]) for pk, pk_matches in matches.items())
+    # cosine similarity is symmetric: the new listing may outrank the
+    # current neighbors of its own matches
+    reverse = {
+        similar_id for pk in matches for similar_id, _ in matches[pk]
+    } - new_ids
+    current = _current_neighbors(reverse)
+    for pk, pk_matches in matches.items():
+        for similar_id, score in pk_matches:
+            if similar_id not in reverse:
+                continue
+            neighbors = current[similar_id]
+            if len(neighbors) < SIMILAR_COUNT or score > neighbors[-1][1]:
+                neighbors.append((pk, score))
+                neighbors.sort(key=lambda neighbor: -neighbor[1])
+                del neighbors[SIMILAR_COUNT:]
+                found[similar_id] = neighbors
+    _store(found)
+
+
+def refresh_pending_similar_listings(
+    batch_size=PENDING_BATCH_SIZE, time_budget=PENDING_TIME_BUDGET_SECONDS
+):
+    """Fold newly published listings into the neighbor table.
+
+    Each new listing is scored against its block's pool once: the best
+    matches become its neighbors, and it is inserted into the lists of the
+    matches it now outranks. Other lists are left as they are until the
+    next full rebuild. Pending listings are read ``batch_size`` at a time
+    and grouped by category and block, so each pool is loaded once for all
+    of its new listings. Batches follow each other until none is pending
+    or ``time_budget`` seconds have passed. Returns the number of new
+    listings handled.
+    """
+    deadline = time.monotonic() + time_budget
+    handled = 0
+    while True:
+        pending = list(
+            _published()
+            .filter(similar_refreshed_at__isnull=True)
+            .order_by("created_at")
+            .values_list("pk", "category_id", "geo_cell", "city_key")[:batch_size]
+        )
+        by_block = defaultdict(set)
+        unplaced = []
+        for pk, category_id, geo_cell, city_key in pending:
+            block = _block(geo_cell, city_key)
+            if category_id is None or block is None:
+                unplaced.append(pk)
+            else:
+                by_block[category_id, block].add(pk)
+        _clear(unplaced)
+        handled += len(unplaced)
+        for (category_id, block), new_ids in by_block.items():
+            _refresh_block(category_id, block, new_ids)
+            handled += len(new_ids)
+            if time.monotonic() >= deadline:
+                return handled
+        if len(pending) < batch_size or time.monotonic() >= deadline:
+            return handled
+
+
+def similar_listings(listing, limit=SIMILAR_COUNT):
+    """The listing's published neighbors, in one lookup on the neighbor table."""
+    return list(
+        _published()
+        .filter(similar_to__listing=listing)
+        .select_related("category", "seller")
+        .order_by("similar_to__rank")[:limit]
+    )
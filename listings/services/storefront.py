@@ -0,0 +1,121 @@
+from collections import Counter
+from contextlib import contextmanager
+
+from django.apps import apps
+from django.db import connection, transaction
+from django.db.models import Count
+
+from .pagination import keyset_page
+
+STOREFRONT_PAGE_SIZE = 24
+
+
+def _rollup_model():
+    return apps.get_model("listings", "SellerRollup")
+
+
+def seller_group(listing):
+    return (listing.seller_id, listing.category_id, listing.status)
+
+
+def adjust_seller_count(group, delta):
+    if not delta:
+        return
+    SellerRollup = _rollup_model()
+    table = SellerRollup._meta.db_table
+    with connection.cursor() as cursor:
+        if delta < 0:
+            # never inserts: the seller may be going away in the same cascade
+            cursor.execute(
+                f"UPDATE {table} SET listing_count = listing_count + %s "
+                f"WHERE seller_id = %s AND category_id IS NOT DISTINCT FROM %s "
+                f"AND status = %s",
+                [delta, *group],
+            )
+            return
+        cursor.execute(
+            f"INSERT INTO {table} (seller_id, category_id, status, listing_count) "
+            f"VALUES (%s, %s, %s, %s) "
+            f"ON CONFLICT ON CONSTRAINT listings_sellerrollup_unique_group "
+            f"DO UPDATE SET listing_count = {table}.listing_count + EXCLUDED.listing_count",
+            [*group, delta],
+        )
+
+
+def _seller_groups(listing_ids):
+    Listing = apps.get_model("listings", "Listing")
+    rows = (
+        Listing.objects.filter(pk__in=listing_ids)
+        .values("seller_id", "category_id", "status")
+        .annotate(total=Count("id"))
+        .order_by()
+    )
+    return Counter(
+        {(row["seller_id"], row["category_id"], row["status"]): row["total"] for row in rows}
+    )
+
+
+@contextmanager
+def tracking_seller_rollup(queryset):
+    """Keep SellerRollup in sync across a bulk ``update()`` of listings."""
+    listing_ids = list(queryset.order_by().values_list("pk", flat=True))
+    before = _seller_groups(listing_ids)
+    yield
+    after = _seller_groups(listing_ids)
+    for group in before.keys() | after.keys():
+        adjust_seller_count(group, after[group] - before[group])
+
+
+def rebuild_seller_rollup():
+    SellerRollup = _rollup_model()
+    Listing = apps.get_model("listings", "Listing")
+    groups = (
+        Listing.objects.values("seller_id", "category_id", "status")
+        .annotate(total=Count("id"))
+        .order_by()
+    )
+    sql, params = groups.query.sql_with_params()
+    with transaction.atomic():
+        SellerRollup.objects.all().delete()
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {SellerRollup._meta.db_table} "
+                f"(seller_id, category_id, status, listing_count) {sql}",
+                params,
+            )
+
+
+def storefront_summary(seller):
+    """Listing counts per status and published counts per category.
+
+    Read from the seller's SellerRollup rows, one indexed query however
+    large the catalogue.
+    """
+    Listing = apps.get_model("listings", "Listing")
+    rows = (
+        _rollup_model()
+        .objects.filter(seller=seller, listing_count__gt=0)
+        .select_related("category")
+    )
+    by_status = Counter()
+    categories = []
+    for row in rows:
+        by_status[row.status] += row.listing_count
+        if row.status == Listing.Status.PUBLISHED and row.category_id is not None:
+            categories.append((row.category, row.listing_count))
+    categories.sort(key=lambda item: (-item[1], item[0].name))
+    return {
+        "published_count": by_status[Listing.Status.PUBLISHED],
+        "reserved_count": by_status[Listing.Status.RESERVED],
+        "sold_count": by_status[Listing.Status.SOLD],
+        "categories": categories,
+    }
+
+
+def storefront_page(seller, cursor, page_size=STOREFRONT_PAGE_SIZE):
+    """One page of the seller's published listings, newest first."""
+    Listing = apps.get_model("listings", "Listing")
+    listings = Listing.objects.filter(
+        seller=seller, status=Listing.Status.PUBLISHED
+    ).select_related("category", "seller")
+    return keyset_page(listings, cursor, page_size)
@@ -0,0 +1,140 @@
+import hashlib
+import math
+from datetime import datetime, timezone as dt_timezone
+
+import redis
+from django.apps import apps
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+FLUSH_BATCH_SIZE = 1000
+# the viewer set of a listing nobody opens for this long is dropped
+UNIQUE_VIEWERS_TTL = 60 * 60 * 24 * 30
+POPULARITY_HALF_LIFE_HOURS = 24
+# scores are stored relative to a fixed instant, so decaying them all by
+# the same factor never changes their order and no row needs rewriting
+POPULARITY_EPOCH = datetime(2025, 1, 1, tzinfo=dt_timezone.utc)
+
+_clients = {}
+
+
+def _redis():
+    url = getattr(settings, "VIEW_COUNTER_REDIS_URL", "")
+    if not url:
+        return None
+    if url not in _clients:
+        _clients[url] = redis.Redis.from_url(url)
+    return _clients[url]
+
+
+def _key(*parts):
+    return ":".join([getattr(settings, "VIEW_COUNTER_KEY_PREFIX", "views"), *parts])
+
+
+def viewer_key(request):
+    if request.user.is_authenticated:
+        return f"user:{request.user.pk}"
+    seen = "{}|{}".format(
+        request.META.get("REMOTE_ADDR", ""), request.META.get("HTTP_USER_AGENT", "")
+    )
+    return "anon:" + hashlib.md5(seen.encode()).hexdigest()
+
+
+def record_view(listing_id, viewer):
+    """Count one view in Redis; the database only sees periodic flushes.
+
+    One round-trip: the pending counter for the listing and its
+    HyperLogLog of viewers, whose expiry each view pushes back by
+    ``UNIQUE_VIEWERS_TTL``. Sold or withdrawn listings stop being viewed,
+    so their sets expire instead of piling up. A listing that comes back
+    after that starts a new set, and ``unique_viewers`` only grows again
+    once the new set outgrows it. A Redis outage loses views, not the page.
+    """
+    client = _redis()
+    if client is None:
+        return
+    listing_id = str(listing_id)
+    try:
+        pipe = client.pipeline(transaction=False)
+        pipe.hincrby(_key("pending"), listing_id, 1)
+        pipe.pfadd(_key("unique", listing_id), viewer)
+        pipe.expire(_key("unique", listing_id), UNIQUE_VIEWERS_TTL)
+        pipe.execute()
+    except redis.RedisError:
+        pass
+
+
+def _log2_add(a, b):
+    # log2(2**a + 2**b) without leaving float range
+    high, low = max(a, b), min(a, b)
+    return high + math.log2(1 + 2 ** (low - high))
+
+
+def popularity_boost(now=None):
+    """log2 weight of one new viewer at ``now``: it doubles every half-life."""
+    elapsed = ((now or timezone.now()) - POPULARITY_EPOCH).total_seconds()
+    return elapsed / (POPULARITY_HALF_LIFE_HOURS * 3600)
+
+
+def flush_view_counts(batch_size=FLUSH_BATCH_SIZE):
+    """Move buffered views into Listing, ``batch_size`` listings per UPDATE.
+
+    The pending hash is renamed first, so views recorded meanwhile start a
+    new one. New unique viewers (HyperLogLog estimates) are added to the
+    log2 popularity score at today's weight. A flush that failed half way
+    is resumed from its renamed snapshot; the listings of the batch that
+    was in flight may be counted twice. Returns the listings updated.
+    """
+    client = _redis()
+    if client is None:
+        return 0
+    Listing = apps.get_model("listings", "Listing")
+    pending, flushing = _key("pending"), _key("flushing")
+    if not client.exists(flushing):
+        try:
+            client.rename(pending, flushing)
+        except redis.ResponseError:  # no views since the last flush
+            return 0
+    counts = {
+        listing_id.decode(): int(views)
+        for listing_id, views in client.hgetall(flushing).items()
+    }
+    listing_ids = list(counts)
+    boost = popularity_boost()
+    flushed = 0
+    for start in range(0, len(listing_ids), batch_size):
+        batch = listing_ids[start : start + batch_size]
+        pipe = client.pipeline(transaction=False)
+        for listing_id in batch:
+            pipe.pfcount(_key("unique", listing_id))
+        estimates = dict(zip(batch, pipe.execute()))
+        with transaction.atomic():
+            rows = (
+                Listing.objects.filter(pk__in=batch)
+                .select_for_update()
+                .values_list("pk", "view_count", "unique_viewers", "popularity")
+            )
+            updated = []
+            for pk, view_count, unique_viewers, popularity in rows:
+                listing_id = str(pk)
+                viewers = max(unique_viewers, estimates[listing_id])
+                if viewers > unique_viewers:
+                    popularity = _log2_add(
+                        popularity, math.log2(viewers - unique_viewers) + boost
+                    )
+                updated.append(
+                    Listing(
+                        pk=pk,
+                        view_count=view_count + counts[listing_id],
+                        unique_viewers=viewers,
+                        popularity=popularity,
+                    )
+                )
+            Listing.objects.bulk_update(
+                updated, ["view_count", "unique_viewers", "popularity"]
+            )
+        client.hdel(flushing, *batch)
+        flushed += len(updated)
+    client.delete(flushing)
+    return flushed
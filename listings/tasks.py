@@ -0,0 +1,20 @@
+from celery import shared_task
+
+from .services.reservations import expire_stale_reservations
+from .services.similar import refresh_pending_similar_listings
+from .services.view_counts import flush_view_counts
+
+
+@shared_task(name="listings.expire_reservations")
+def expire_reservations():
+    return expire_stale_reservations()
+
+
+@shared_task(name="listings.refresh_similar_listings")
+def refresh_similar_listings():
+    return refresh_pending_similar_listings()
+
+
+@shared_task(name="listings.flush_view_counts")
+def flush_views():
+    return flush_view_counts()
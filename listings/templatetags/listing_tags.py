@@ -0,0 +1,10 @@
+from django import template
+
+from ..services.card_cache import render_card_bodies
+
+register = template.Library()
+
+
+@register.simple_tag
+def listing_cards(listings):
+    return render_card_bodies(listings)
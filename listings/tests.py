@@ -1,14 +1,50 @@
+import hashlib
+import math
 import shutil
 import tempfile
+from collections import Counter
+from datetime import timedelta
+from io import BytesIO, StringIO
+from pathlib import Path
+from types import SimpleNamespace
 
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.paginator import EmptyPage
 from django.core.files.uploadedfile import SimpleUploadedFile
-from django.test import TestCase, override_settings
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
 
 from catalog.models import Category
-
-from .models import Favorite, Listing, Reservation
+from ingestion.tasks import analyze_batch
+from mediahub.models import BatchUpload, ImageAsset, MediaBlob
+from mediahub.tasks import generate_image_derivatives
+
+from .admin import approve_listings
+from .models import (
+    CityStat,
+    FacetRollup,
+    Favorite,
+    Listing,
+    ListingImage,
+    PostalCode,
+    Reservation,
+    SellerRollup,
+)
+from .services.cities import rebuild_city_stats
+from .services.facets import rebuild_facet_rollup, tracking_published_rollups
+from .services.feed_cache import shared_feed_key, get_or_compute
+from .services.geo import EARTH_RADIUS_KM, cells_covering, grid_cell
+from .services.pagination import CappedCountPaginator, capped_count
+from .services.reservations import expire_stale_reservations, reserve_listing
+from .services import view_counts
+from .services.similar import refresh_pending_similar_listings, similar_listings
+from .services.storefront import rebuild_seller_rollup
 
 
 PNG_BYTES = (
@@ -27,7 +63,19 @@ def get_listings_from_response(response):
     return list(getattr(listings, "object_list", listings))
 
 
-class FavoriteToggleTests(TestCase):
+LOCMEM_CACHES = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class FeedTestCase(TestCase):
+    """Feed tests start from an empty cache; rollbacks do not reach it."""
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+
+
+class FavoriteToggleTests(FeedTestCase):
     @classmethod
     def setUpTestData(cls):
         User = get_user_model()
@@ -36,6 +84,7 @@ class FavoriteToggleTests(TestCase):
         cls.listing = Listing.objects.create(
             seller=cls.seller,
             title="Vintage chair",
+            status=Listing.Status.PUBLISHED,
         )
 
     def test_toggle_creates_favorite(self):
@@ -80,8 +129,79 @@ class FavoriteToggleTests(TestCase):
         self.assertEqual(response["HX-Trigger"], "wishlist-updated")
         self.assertTrue(Favorite.objects.filter(user=self.buyer, listing=self.listing).exists())
 
+    def test_cached_favorite_set_follows_toggles(self):
+        self.client.force_login(self.buyer)
+        url = reverse("listing_favorite", kwargs={"listing_id": self.listing.id})
+        self.assertNotContains(self.client.get(reverse("home")), "favorite-button--active")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(url, data={"next": "/"})
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("home"))
+        self.assertContains(response, "favorite-button--active")
+        self.assertFalse(
+            any("listings_favorite" in query["sql"] for query in queries.captured_queries)
+        )
+        detail = self.client.get(
+            reverse(
+                "listing_detail",
+                kwargs={"slug": self.listing.slug, "uuid": self.listing.id},
+            )
+        )
+        self.assertContains(detail, "favorite-button--active")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(url, data={"next": "/"})
+        self.assertNotContains(self.client.get(reverse("home")), "favorite-button--active")
+
+    def test_toggles_keep_the_favorite_count(self):
+        User = get_user_model()
+        other = User.objects.create_user(email="other@example.com", password="password123")
+        url = reverse("listing_favorite", kwargs={"listing_id": self.listing.id})
+        for user in (self.buyer, other):
+            self.client.force_login(user)
+            self.client.post(url, data={"next": "/"})
+        self.listing.refresh_from_db()
+        self.assertEqual(self.listing.favorite_count, 2)
+        self.assertContains(self.client.get(reverse("home")), "2 personnes aiment")
+
+        self.client.post(url, data={"next": "/"})
+        self.listing.refresh_from_db()
+        self.assertEqual(self.listing.favorite_count, 1)
+        self.assertContains(self.client.get(reverse("home")), "1 personne aime")
+
+    def test_wishlist_walks_favorites_newest_first(self):
+        listings = [
+            Listing.objects.create(
+                seller=self.seller,
+                title=f"Lampe {index}",
+                status=Listing.Status.PUBLISHED,
+            )
+            for index in range(30)
+        ]
+        now = timezone.now()
+        for index, listing in enumerate(listings):
+            favorite = Favorite.objects.create(user=self.buyer, listing=listing)
+            # favorited in the reverse order of publication
+            Favorite.objects.filter(pk=favorite.pk).update(
+                created_at=now - timedelta(minutes=index)
+            )
+        self.client.force_login(self.buyer)
 
-class ListingViewTests(TestCase):
+        response = self.client.get(reverse("wishlist"))
+        first_page = response.context["listings"]
+        self.assertEqual(len(first_page), 24)
+        self.assertTrue(all(listing.is_favorited for listing in first_page))
+        next_page_url = response.context["next_page_url"]
+        self.assertTrue(next_page_url.startswith("?cursor="))
+
+        response = self.client.get(reverse("wishlist") + next_page_url, HTTP_HX_REQUEST="true")
+        self.assertTemplateUsed(response, "fragments/listings/feed_page.html")
+        self.assertIsNone(response.context["next_page_url"])
+        self.assertEqual(first_page + response.context["listings"], listings)
+
+
+class ListingViewTests(FeedTestCase):
     @classmethod
     def setUpTestData(cls):
         User = get_user_model()
@@ -131,6 +251,58 @@ class ListingViewTests(TestCase):
         self.assertIn(self.listing_other, listings)
         self.assertNotIn(self.listing_draft, listings)
 
+    def test_home_feed_search_ignores_accents_and_plurals(self):
+        shelf = Listing.objects.create(
+            seller=self.seller,
+            title="Étagère en chêne",
+            city="Nantes",
+            status=Listing.Status.PUBLISHED,
+            currency="EUR",
+        )
+
+        response = self.client.get(reverse("home"), {"q": "etageres"})
+
+        self.assertEqual(get_listings_from_response(response), [shelf])
+
+    def test_home_feed_search_ranks_title_matches_first(self):
+        described = Listing.objects.create(
+            seller=self.seller,
+            title="Console d'entrée",
+            description="Livrée avec un miroir assorti.",
+            status=Listing.Status.PUBLISHED,
+            currency="EUR",
+        )
+        titled = Listing.objects.create(
+            seller=self.seller,
+            title="Miroir doré",
+            status=Listing.Status.PUBLISHED,
+            currency="EUR",
+        )
+
+        response = self.client.get(reverse("home"), {"q": "miroir"})
+
+        self.assertEqual(get_listings_from_response(response), [titled, described])
+
+    def test_search_vector_follows_listing_and_category_changes(self):
+        self.listing_other.title = "Modern sconce"
+        self.listing_other.save()
+        response = self.client.get(reverse("home"), {"q": "sconce"})
+        self.assertEqual(get_listings_from_response(response), [self.listing_other])
+
+        self.category_other.name = "Luminaires"
+        self.category_other.save()
+        response = self.client.get(reverse("home"), {"q": "luminaire"})
+        self.assertEqual(get_listings_from_response(response), [self.listing_other])
+
+    def test_rollup_rebuild_restores_search_vectors_of_raw_rows(self):
+        # as loaddata leaves them
+        Listing.objects.update(search_vector=None)
+
+        call_command("rebuild_listing_rollups", stdout=StringIO())
+
+        response = self.client.get(reverse("home"), {"q": "vintage chair"})
+        self.assertEqual(get_listings_from_response(response), [self.listing_main])
+
     def test_listing_detail_requires_matching_slug(self):
         url = reverse(
             "listing_detail",
@@ -167,6 +339,827 @@ class ListingViewTests(TestCase):
         self.assertEqual(len(listings), 3)
 
 
+class CityFilterTests(FeedTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        cls.seller = User.objects.create_user(email="seller@example.com", password="password123")
+        cls.by_city = {
+            city: Listing.objects.create(
+                seller=cls.seller,
+                title=f"Chaise {index}",
+                city=city,
+                status=Listing.Status.PUBLISHED,
+                currency="EUR",
+            )
+            for index, city in enumerate(["Saint-Étienne", "saint etienne ", "Montpellier", "Paris"])
+        }
+
+    def get_cities(self, query):
+        response = self.client.get(reverse("home"), {"city": query})
+        return {listing.city for listing in get_listings_from_response(response)}
+
+    def test_city_filter_ignores_accents_case_and_typos(self):
+        self.assertEqual(self.get_cities("SAINT ETIENNE"), {"Saint-Étienne", "saint etienne "})
+        self.assertEqual(self.get_cities("Montpelier"), {"Montpellier"})
+        self.assertEqual(self.get_cities("Marseille"), set())
+
+    def test_city_stats_follow_status_and_city_changes(self):
+        def counts():
+            return dict(CityStat.objects.values_list("key", "published_count"))
+
+        self.assertEqual(
+            counts(), {"saint etienne": 2, "montpellier": 1, "paris": 1}
+        )
+        paris = self.by_city["Paris"]
+        paris.city = "Lyon"
+        paris.save()
+        self.assertEqual(counts()["paris"], 0)
+        self.assertEqual(counts()["lyon"], 1)
+
+        paris.status = Listing.Status.ARCHIVED
+        paris.save()
+        self.assertEqual(counts()["lyon"], 0)
+
+        self.by_city["Montpellier"].delete()
+        self.assertEqual(counts()["montpellier"], 0)
+
+        incremental = {key: count for key, count in counts().items() if count}
+        rebuild_city_stats()
+        self.assertEqual(counts(), incremental)
+        self.assertEqual(CityStat.objects.get(key="saint etienne").name, "Saint-Étienne")
+
+    def test_autocomplete_reads_only_the_city_table(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("city_autocomplete"), {"city": "saint eti"})
+
+        self.assertNotIn("listings_listing", " ".join(q["sql"] for q in queries))
+        self.assertContains(response, '<option value="Saint-Étienne">')
+        self.assertContains(response, "(2 annonces)")
+        self.assertNotContains(response, "Paris")
+
+        response = self.client.get(reverse("city_autocomplete"), {"city": "par"})
+        self.assertContains(response, "Paris (1 annonce)")
+
+
+class FeedFacetTests(FeedTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        cls.seller = User.objects.create_user(email="seller@example.com", password="password123")
+        cls.furniture = Category.objects.create(name="Mobilier", slug="mobilier")
+        cls.decor = Category.objects.create(name="Decoration", slug="decoration")
+        rows = [
+            (cls.furniture, Listing.Condition.GOOD, "Paris", 2_500),
+            (cls.furniture, Listing.Condition.GOOD, "Lyon", 7_500),
+            (cls.furniture, Listing.Condition.NEW, "Paris", 60_000),
+            (cls.decor, Listing.Condition.GOOD, "Paris", 900),
+        ]
+        cls.listings = [
+            Listing.objects.create(
+                seller=cls.seller,
+                title="Objet",
+                category=category,
+                condition=condition,
+                city=city,
+                price_cents=price_cents,
+                status=Listing.Status.PUBLISHED,
+                currency="EUR",
+            )
+            for category, condition, city, price_cents in rows
+        ]
+
+    def get_facets(self, **params):
+        facets = self.client.get(reverse("home"), params).context["facets"]
+        return {
+            name: {option["label"]: option["count"] for option in options}
+            for name, options in facets.items()
+            if name != "show_counts"
+        }
+
+    def rollup_rows(self):
+        return set(
+            FacetRollup.objects.filter(published_count__gt=0).values_list(
+                "category_id", "condition", "city_key", "price_bucket", "published_count"
+            )
+        )
+
+    def test_facets_count_each_dimension_under_the_other_filters(self):
+        facets = self.get_facets()
+        self.assertEqual(facets["category"], {"Mobilier": 3, "Decoration": 1})
+        self.assertEqual(facets["city"], {"Paris": 3, "Lyon": 1})
+        self.assertEqual(
+            facets["price"],
+            {"Moins de 10 €": 1, "10 à 50 €": 1, "50 à 100 €": 1, "Plus de 500 €": 1},
+        )
+
+        facets = self.get_facets(category="mobilier", condition="good")
+        self.assertEqual(facets["category"], {"Mobilier": 2, "Decoration": 1})
+        self.assertEqual(facets["condition"], {"Good": 2, "New": 1})
+        self.assertEqual(facets["city"], {"Paris": 1, "Lyon": 1})
+
+    def test_condition_and_price_filters_narrow_the_feed(self):
+        response = self.client.get(reverse("home"), {"condition": "new"})
+        self.assertEqual(get_listings_from_response(response), [self.listings[2]])
+
+        response = self.client.get(reverse("home"), {"price": "1", "city": "paris"})
+        self.assertEqual(get_listings_from_response(response), [self.listings[0]])
+
+    def test_rollup_follows_saves_deletes_and_bulk_updates(self):
+        first, second, third, fourth = self.listings
+        first.price_cents = 20_000
+        first.save()
+        second.status = Listing.Status.SOLD
+        second.save()
+        fourth.delete()
+        pending = Listing.objects.create(
+            seller=self.seller,
+            title="Objet",
+            category=self.decor,
+            city="Nantes",
+            status=Listing.Status.PENDING_REVIEW,
+            currency="EUR",
+        )
+        queryset = Listing.objects.filter(pk__in=[pending.pk, third.pk])
+        with tracking_published_rollups(queryset):
+            queryset.update(status=Listing.Status.PUBLISHED)
+
+        incremental = self.rollup_rows()
+        rebuild_facet_rollup()
+        self.assertEqual(self.rollup_rows(), incremental)
+        self.assertEqual(CityStat.objects.get(key="nantes").published_count, 1)
+
+
+class PriceFilterTests(FeedTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        cls.seller = User.objects.create_user(email="seller@example.com", password="password123")
+        rows = [
+            (Listing.Condition.GOOD, 1_500, Listing.Status.PUBLISHED),
+            (Listing.Condition.NEW, 4_000, Listing.Status.PUBLISHED),
+            (Listing.Condition.GOOD, 12_000, Listing.Status.PUBLISHED),
+            (Listing.Condition.GOOD, None, Listing.Status.PUBLISHED),
+            (Listing.Condition.GOOD, 2_000, Listing.Status.DRAFT),
+        ]
+        cls.listings = [
+            Listing.objects.create(
+                seller=cls.seller,
+                title="Objet",
+                condition=condition,
+                price_cents=price_cents,
+                status=status,
+                currency="EUR",
+            )
+            for condition, price_cents, status in rows
+        ]
+
+    def get_feed(self, **params):
+        return get_listings_from_response(self.client.get(reverse("home"), params))
+
+    def test_price_range_condition_and_price_sorts(self):
+        cheap, new, expensive, unpriced, _ = self.listings
+        self.assertEqual(self.get_feed(price_min="15", price_max="40,00"), [new, cheap])
+        self.assertEqual(self.get_feed(price_min="30.5"), [expensive, new])
+        self.assertEqual(self.get_feed(price_max="abc"), [unpriced, expensive, new, cheap])
+        self.assertEqual(self.get_feed(sort="price_asc"), [cheap, new, expensive])
+        self.assertEqual(self.get_feed(sort="price_desc"), [expensive, new, cheap])
+        self.assertEqual(
+            self.get_feed(sort="price_desc", condition="good", price_max="100"), [cheap]
+        )
+
+    def test_filter_and_sort_combinations_use_published_indexes(self):
+        # shaped like the live table: most rows are sold or archived, and
+        # prices and conditions spread over the published ones
+        statuses = [Listing.Status.PUBLISHED] + [Listing.Status.SOLD, Listing.Status.ARCHIVED] * 4
+        conditions = Listing.Condition.values
+        Listing.objects.bulk_create(
+            [
+                Listing(
+                    seller=self.seller,
+                    title="Objet",
+                    condition=conditions[index % len(conditions)],
+                    price_cents=(index * 7919) % 200_000,
+                    status=statuses[index % len(statuses)],
+                    currency="EUR",
+                )
+                for index in range(10_000)
+            ],
+            batch_size=2_000,
+        )
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE listings_listing")
+        published_indexes = (
+            "listings_published_price_idx",
+            "listings_published_cond_idx",
+            "listings_pub_cond_price_idx",
+        )
+        combinations = [
+            {"price_min": "10", "price_max": "50"},
+            {"sort": "price_asc"},
+            {"sort": "price_desc", "price_min": "10"},
+            {"condition": "good"},
+            {"condition": "good", "sort": "price_asc"},
+            {"condition": "new", "price_max": "50", "sort": "price_desc"},
+        ]
+        for params in combinations:
+            with self.subTest(**params):
+                view = self.client.get(reverse("home"), params).context["view"]
+                # as a page reads it
+                plan = view.object_list[: view.paginate_by].explain()
+                self.assertTrue(
+                    any(name in plan for name in published_indexes), plan
+                )
+
+
+class ProximityTests(FeedTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        cls.seller = User.objects.create_user(email="seller@example.com", password="password123")
+        for postal_code, name, latitude, longitude in [
+            ("75011", "Paris", 48.8589, 2.3799),
+            ("92100", "Boulogne-Billancourt", 48.8353, 2.2410),
+            ("69003", "Lyon", 45.7597, 4.8422),
+        ]:
+            PostalCode.objects.create(
+                country_code="FR",
+                postal_code=postal_code,
+                place_name=name,
+                latitude=latitude,
+                longitude=longitude,
+            )
+        cls.paris, cls.boulogne, cls.lyon = [
+            Listing.objects.create(
+                seller=cls.seller,
+                title=f"Chaise {postal_code}",
+                postal_code=postal_code,
+                status=Listing.Status.PUBLISHED,
+                currency="EUR",
+            )
+            for postal_code in ["75011", "92100", "69003"]
+        ]
+
+    def test_coordinates_follow_the_postal_code(self):
+        self.assertEqual((self.paris.latitude, self.paris.longitude), (48.8589, 2.3799))
+        self.assertEqual(self.paris.geo_cell, grid_cell(48.8589, 2.3799))
+
+        self.paris.postal_code = "69003"
+        self.paris.save(update_fields=["postal_code"])
+        self.paris.refresh_from_db()
+        self.assertEqual(self.paris.latitude, 45.7597)
+        self.assertEqual(self.paris.geo_cell, self.lyon.geo_cell)
+
+        self.paris.postal_code = "00000"
+        self.paris.save()
+        self.assertIsNone(self.paris.geo_cell)
+
+    def test_radius_filter_and_nearest_first_sort(self):
+        response = self.client.get(reverse("home"), {"near": "75011", "radius": "20"})
+        self.assertEqual(get_listings_from_response(response), [self.boulogne, self.paris])
+        self.assertContains(response, "a 10 km")
+
+        response = self.client.get(
+            reverse("home"), {"near": "75011", "radius": "20", "sort": "distance"}
+        )
+        self.assertEqual(get_listings_from_response(response), [self.paris, self.boulogne])
+
+        response = self.client.get(reverse("home"), {"near": "99999"})
+        self.assertEqual(len(get_listings_from_response(response)), 3)
+        self.assertTrue(response.context["filters"]["near_unknown"])
+
+    def test_rollup_rebuild_locates_raw_rows(self):
+        # as loaddata leaves them
+        Listing.objects.update(latitude=None, longitude=None, geo_cell=None)
+
+        call_command("rebuild_listing_rollups", stdout=StringIO())
+
+        response = self.client.get(reverse("home"), {"near": "75011", "radius": "20"})
+        self.assertEqual(get_listings_from_response(response), [self.boulogne, self.paris])
+        self.lyon.refresh_from_db()
+        self.assertEqual(self.lyon.geo_cell, grid_cell(45.7597, 4.8422))
+
+    def test_covering_cells_contain_every_point_in_radius(self):
+        for latitude, longitude in [(48.85, 2.35), (43.3, 5.4), (50.63, 3.06)]:
+            for radius_km in (5, 20, 100):
+                cells = set(cells_covering(latitude, longitude, radius_km))
+                for step in range(32):
+                    bearing = 2 * math.pi * step / 32
+                    distance = radius_km / EARTH_RADIUS_KM
+                    point_lat = latitude + math.degrees(distance * math.cos(bearing))
+                    point_lon = longitude + math.degrees(
+                        distance * math.sin(bearing) / math.cos(math.radians(latitude))
+                    )
+                    self.assertIn(grid_cell(point_lat, point_lon), cells)
+
+    def test_load_postal_codes_averages_places_and_updates_listings(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = Path(tmpdir) / "FR.txt"
+            path.write_text(
+                "FR\t69003\tLyon 3e\t\t\t\t\t\t\t45.76\t4.85\t5\n"
+                "FR\t69003\tLyon 3e Sud\t\t\t\t\t\t\t45.74\t4.87\t5\n"
+                "FR\t13006\tMarseille\t\t\t\t\t\t\t43.28\t5.38\t5\n",
+                encoding="utf-8",
+            )
+            call_command("load_postal_codes", str(path), stdout=open(tmpdir + "/out", "w"))
+
+        self.lyon.refresh_from_db()
+        self.assertAlmostEqual(self.lyon.latitude, 45.75)
+        self.assertAlmostEqual(self.lyon.longitude, 4.86)
+        self.assertEqual(self.lyon.geo_cell, grid_cell(45.75, 4.86))
+        self.assertTrue(PostalCode.objects.filter(postal_code="13006").exists())
+
+
+class HomeFeedPaginationTests(FeedTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        cls.seller = User.objects.create_user(email="seller@example.com", password="password123")
+        cls.listings = [
+            Listing.objects.create(
+                seller=cls.seller,
+                title=f"Chaise {index}",
+                status=Listing.Status.PUBLISHED,
+                currency="EUR",
+            )
+            for index in range(30)
+        ]
+
+    def test_feed_walks_cursor_pages_without_overlap(self):
+        response = self.client.get(reverse("home"))
+
+        first_page = get_listings_from_response(response)
+        self.assertEqual(len(first_page), 24)
+        self.assertIsNone(response.context["page_obj"])
+        self.assertEqual(response.context["results_count"], 30)
+        next_page_url = response.context["next_page_url"]
+        self.assertTrue(next_page_url.startswith("?cursor="))
+
+        response = self.client.get(reverse("home") + next_page_url, HTTP_HX_REQUEST="true")
+
+        self.assertTemplateUsed(response, "fragments/listings/feed_page.html")
+        second_page = get_listings_from_response(response)
+        self.assertEqual(len(second_page), 6)
+        self.assertIsNone(response.context["next_page_url"])
+        self.assertEqual(
+            [listing.pk for listing in first_page + second_page],
+            [listing.pk for listing in sorted(self.listings, key=lambda l: (l.created_at, l.pk), reverse=True)],
+        )
+
+    def test_next_page_url_keeps_filters(self):
+        response = self.client.get(reverse("home"), {"city": ""})
+
+        self.assertTrue(response.context["next_page_url"].startswith("?city=&cursor="))
+
+    def test_invalid_cursor_starts_from_first_page(self):
+        response = self.client.get(reverse("home"), {"cursor": "not-a-cursor"})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(get_listings_from_response(response)), 24)
+
+    def test_search_results_keep_page_numbers(self):
+        response = self.client.get(reverse("home"), {"q": "chaise"})
+
+        self.assertEqual(response.context["page_obj"].number, 1)
+        self.assertEqual(response.context["paginator"].count, 30)
+
+    def test_page_numbers_only_cover_counted_rows(self):
+        response = self.client.get(reverse("home"), {"q": "chaise", "page": 2})
+
+        self.assertEqual(len(get_listings_from_response(response)), 6)
+        self.assertEqual(response.context["paginator"].num_pages, 2)
+        self.assertEqual(response.context["results_count"], 30)
+        self.assertEqual(self.client.get(reverse("home"), {"q": "chaise", "page": 3}).status_code, 404)
+        self.assertEqual(capped_count(Listing.objects.all(), cap=10), 10)
+
+    def test_page_numbers_reach_past_the_counted_rows(self):
+        def paginator():
+            paginator = CappedCountPaginator(Listing.objects.order_by("created_at", "pk"), 4)
+            paginator.rows_ahead = 5
+            return paginator
+
+        first = paginator()
+        self.assertEqual(first.page(1).object_list[0], self.listings[0])
+        self.assertEqual((first.count, first.num_pages, first.partial), (9, 3, True))
+        self.assertGreaterEqual(first.estimated_count, 9)
+
+        last = paginator()
+        self.assertEqual(list(last.page(8).object_list), self.listings[28:])
+        self.assertEqual((last.count, last.estimated_count, last.partial), (30, 30, False))
+        self.assertFalse(last.page(8).has_next())
+        with self.assertRaises(EmptyPage):
+            paginator().page(9)
+
+
+class StorefrontTests(FeedTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        cls.seller = User.objects.create_user(email="seller@example.com", password="password123")
+        cls.buyer = User.objects.create_user(email="buyer@example.com", password="password123")
+        cls.furniture = Category.objects.create(name="Mobilier", slug="mobilier")
+        cls.decor = Category.objects.create(name="Decoration", slug="decoration")
+        cls.url = reverse("accounts:public_profile", kwargs={"pk": cls.seller.pk})
+
+    def create(self, count, category, status=Listing.Status.PUBLISHED):
+        return [
+            Listing.objects.create(
+                seller=self.seller,
+                title=f"Objet {index}",
+                category=category,
+                status=status,
+                currency="EUR",
+            )
+            for index in range(count)
+        ]
+
+    def rollup_rows(self):
+        return set(
+            SellerRollup.objects.filter(listing_count__gt=0).values_list(
+                "seller_id", "category_id", "status", "listing_count"
+            )
+        )
+
+    def test_rollup_follows_saves_deletes_and_reservations(self):
+        chair, table, lamp = self.create(3, self.furniture)
+        draft, = self.create(1, self.decor, status=Listing.Status.DRAFT)
+        draft.status = Listing.Status.PUBLISHED
+        draft.save()
+        table.category = self.decor
+        table.save()
+        lamp.delete()
+        reserve_listing(chair, self.buyer)
+        chair.save()  # the in-memory snapshot followed the reservation
+        Reservation.objects.filter(listing=chair).update(
+            expires_at=timezone.now() - timedelta(minutes=1)
+        )
+        expire_stale_reservations()
+        pending = self.create(2, self.furniture, status=Listing.Status.PENDING_REVIEW)
+        approve_listings(None, SimpleNamespace(user=self.buyer), Listing.objects.filter(pk=pending[0].pk))
+
+        incremental = self.rollup_rows()
+        rebuild_seller_rollup()
+        self.assertEqual(self.rollup_rows(), incremental)
+        self.assertEqual(
+            incremental,
+            {
+                (self.seller.pk, self.furniture.pk, Listing.Status.PUBLISHED, 2),
+                (self.seller.pk, self.furniture.pk, Listing.Status.PENDING_REVIEW, 1),
+                (self.seller.pk, self.decor.pk, Listing.Status.PUBLISHED, 2),
+            },
+        )
+
+    def test_storefront_pages_published_listings_with_rollup_counts(self):
+        furniture = self.create(20, self.furniture)
+        decor = self.create(10, self.decor)
+        self.create(2, self.decor, status=Listing.Status.SOLD)
+        self.create(1, self.furniture, status=Listing.Status.DRAFT)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url)
+        storefront = response.context["storefront"]
+        self.assertEqual(storefront["published_count"], 30)
+        self.assertEqual(storefront["sold_count"], 2)
+        self.assertEqual(
+            storefront["categories"], [(self.furniture, 20), (self.decor, 10)]
+        )
+        self.assertContains(response, "Mobilier · 20")
+        self.assertFalse(
+            any(
+                "COUNT(" in query["sql"] and "listings_listing" in query["sql"]
+                for query in queries.captured_queries
+            )
+        )
+        first_page = response.context["listings"]
+        self.assertEqual(len(first_page), 24)
+
+        response = self.client.get(
+            self.url + response.context["next_page_url"], HTTP_HX_REQUEST="true"
+        )
+        self.assertTemplateUsed(response, "fragments/listings/feed_page.html")
+        self.assertIsNone(response.context["next_page_url"])
+        self.assertEqual(
+            first_page + response.context["listings"],
+            sorted(furniture + decor, key=lambda l: (l.created_at, l.pk), reverse=True),
+        )
+
+
+class DetailConditionalGetTests(FeedTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        cls.seller = User.objects.create_user(email="seller@example.com", password="password123")
+        cls.buyer = User.objects.create_user(email="buyer@example.com", password="password123")
+        cls.listing = Listing.objects.create(
+            seller=cls.seller,
+            title="Lampe",
+            status=Listing.Status.PUBLISHED,
+            currency="EUR",
+        )
+        cls.url = reverse("listing_detail", kwargs={"slug": cls.listing.slug, "uuid": cls.listing.id})
+
+    def test_anonymous_revisits_get_304s_and_the_cached_page(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("private", response["Cache-Control"])
+        self.assertIn("Cookie", response["Vary"])
+        etag, last_modified = response["ETag"], response["Last-Modified"]
+
+        with self.assertNumQueries(1):
+            revalidated = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(revalidated.status_code, 304)
+        self.assertEqual(revalidated["ETag"], etag)
+        self.assertEqual(
+            self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=last_modified).status_code, 304
+        )
+        self.client.cookies.clear()
+        with self.assertNumQueries(1):
+            cached = self.client.get(self.url)
+        # only the page body comes from the cache; the layout and its CSRF
+        # token are rendered for this visitor
+        self.assertEqual(cached.context["detail_fragments"], response.context["detail_fragments"])
+        self.assertIn("csrftoken", cached.cookies)
+        self.assertIn("Cookie", cached["Vary"])
+        self.assertContains(cached, "Lampe")
+
+        self.listing.title = "Lampe de bureau"
+        self.listing.save()
+        edited = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(edited.status_code, 200)
+        self.assertNotEqual(edited["ETag"], etag)
+        self.assertContains(edited, "Lampe de bureau")
+
+    def test_etag_follows_reservation_state(self):
+        etag = self.client.get(self.url)["ETag"]
+        reservation = reserve_listing(self.listing, self.buyer)
+        reserved = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(reserved.status_code, 200)
+
+        # a hold lapsing before the sweep changes the page without a write
+        Reservation.objects.filter(pk=reservation.pk).update(
+            expires_at=timezone.now() - timedelta(minutes=1)
+        )
+        lapsed = self.client.get(self.url, HTTP_IF_NONE_MATCH=reserved["ETag"])
+        self.assertEqual(lapsed.status_code, 200)
+        self.assertNotEqual(lapsed["ETag"], etag)
+
+    def test_signed_in_etag_carries_favorite_and_reserve_bits(self):
+        anonymous_etag = self.client.get(self.url)["ETag"]
+        self.client.force_login(self.buyer)
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=anonymous_etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.context["can_reserve"])
+        self.assertIn("private", response["Cache-Control"])
+        self.assertNotIn("Last-Modified", response)
+        etag = response["ETag"]
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(
+                reverse("listing_favorite", kwargs={"listing_id": self.listing.id}),
+                data={"next": self.url},
+            )
+        favorited = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(favorited.status_code, 200)
+        self.assertTrue(favorited.context["listing"].is_favorited)
+
+        self.client.force_login(self.seller)
+        seller_view = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(seller_view.status_code, 200)
+        self.assertFalse(seller_view.context["can_reserve"])
+
+    def test_favorites_on_other_listings_keep_the_etag(self):
+        other = Listing.objects.create(
+            seller=self.seller, title="Tapis", status=Listing.Status.PUBLISHED, currency="EUR"
+        )
+        self.client.force_login(self.buyer)
+        etag = self.client.get(self.url)["ETag"]
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse("listing_favorite", kwargs={"listing_id": other.id}))
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    def test_unknown_listing_is_still_a_404(self):
+        url = reverse("listing_detail", kwargs={"slug": "autre", "uuid": self.listing.id})
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+
+class SimilarListingsTests(FeedTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        cls.seller = User.objects.create_user(email="seller@example.com", password="password123")
+        for postal_code, name, latitude, longitude in [
+            ("69003", "Lyon", 45.7597, 4.8422),
+            ("69100", "Villeurbanne", 45.7719, 4.8902),
+            ("75011", "Paris", 48.8589, 2.3799),
+        ]:
+            PostalCode.objects.create(
+                country_code="FR",
+                postal_code=postal_code,
+                place_name=name,
+                latitude=latitude,
+                longitude=longitude,
+            )
+        cls.sofas = Category.objects.create(name="Canapés", slug="canapes")
+        chairs = Category.objects.create(name="Chaises", slug="chaises")
+
+        def listing(title, postal_code, category, description=""):
+            return Listing.objects.create(
+                seller=cls.seller,
+                title=title,
+                description=description,
+                postal_code=postal_code,
+                category=category,
+                status=Listing.Status.PUBLISHED,
+                currency="EUR",
+            )
+
+        cls.sofa = listing("Canapé en cuir vintage", "69003", cls.sofas, "Cuir marron patiné")
+        cls.nearby_sofa = listing("Canapé cuir marron", "69100", cls.sofas)
+        cls.table = listing("Table basse en chêne", "69003", cls.sofas)
+        cls.far_sofa = listing("Canapé en cuir vintage", "75011", cls.sofas)
+        cls.chair = listing("Chaise en cuir vintage", "69003", chairs)
+
+    def neighbors(self, listing):
+        return [similar.pk for similar in similar_listings(listing)]
+
+    def test_rebuild_pairs_listings_by_text_category_and_distance(self):
+        call_command("rebuild_similar_listings", stdout=StringIO())
+
+        self.assertEqual(self.neighbors(self.sofa), [self.nearby_sofa.pk])
+        self.assertEqual(self.neighbors(self.nearby_sofa), [self.sofa.pk])
+        self.assertEqual(self.neighbors(self.far_sofa), [])
+        self.assertFalse(
+            Listing.objects.filter(status=Listing.Status.PUBLISHED, similar_refreshed_at=None).exists()
+        )
+        with self.assertNumQueries(1):
+            similar_listings(self.sofa)
+
+        url = reverse("listing_detail", kwargs={"slug": self.sofa.slug, "uuid": self.sofa.id})
+        response = self.client.get(url)
+        self.assertContains(response, "Annonces similaires")
+        self.assertEqual(response.context["similar_listings"], [self.nearby_sofa])
+
+        etag = response["ETag"]
+        Listing.objects.filter(pk=self.nearby_sofa.pk).update(status=Listing.Status.RESERVED)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotContains(response, "Annonces similaires")
+
+    def test_rebuild_leaves_unpaired_listings_without_neighbors(self):
+        call_command("rebuild_similar_listings", stdout=StringIO())
+        # moved away from anywhere known since the last rebuild
+        Listing.objects.filter(pk=self.sofa.pk).update(postal_code="", geo_cell=None, city_key="")
+        copies = [
+            Listing.objects.create(
+                seller=self.seller,
+                title="Canapé en cuir vintage",
+                postal_code="69003",
+                status=Listing.Status.PUBLISHED,
+                currency="EUR",
+            )
+            for _ in range(2)
+        ]
+
+        call_command("rebuild_similar_listings", stdout=StringIO())
+
+        self.assertEqual(self.neighbors(self.sofa), [])
+        self.assertEqual(self.neighbors(self.nearby_sofa), [])
+        self.assertEqual([self.neighbors(copy) for copy in copies], [[], []])
+        self.assertFalse(
+            Listing.objects.filter(status=Listing.Status.PUBLISHED, similar_refreshed_at=None).exists()
+        )
+
+    def test_newly_published_listing_joins_the_table_incrementally(self):
+        call_command("rebuild_similar_listings", stdout=StringIO())
+        newcomer = Listing.objects.create(
+            seller=self.seller,
+            title="Canapé vintage en cuir noir",
+            postal_code="69003",
+            category=self.sofas,
+            status=Listing.Status.DRAFT,
+            currency="EUR",
+        )
+        self.assertEqual(refresh_pending_similar_listings(), 0)
+        newcomer.status = Listing.Status.PUBLISHED
+        newcomer.save(update_fields=["status"])
+        newcomer.refresh_from_db()
+        self.assertIsNone(newcomer.similar_refreshed_at)
+
+        self.assertEqual(refresh_pending_similar_listings(), 1)
+        self.assertEqual(set(self.neighbors(newcomer)), {self.sofa.pk, self.nearby_sofa.pk})
+        self.assertIn(newcomer.pk, self.neighbors(self.sofa))
+        self.assertEqual(self.neighbors(self.far_sofa), [])
+        self.assertEqual(refresh_pending_similar_listings(), 0)
+
+    def test_pending_listings_are_drained_within_the_time_budget(self):
+        call_command("rebuild_similar_listings", stdout=StringIO())
+        newcomers = [
+            Listing.objects.create(
+                seller=self.seller,
+                title=f"Canapé cuir vintage {index}",
+                postal_code=postal_code,
+                category=self.sofas,
+                status=Listing.Status.PUBLISHED,
+                currency="EUR",
+            )
+            for index, postal_code in enumerate(["69003", "69100", "75011"])
+        ]
+
+        self.assertEqual(refresh_pending_similar_listings(batch_size=2, time_budget=0), 2)
+        self.assertEqual(refresh_pending_similar_listings(batch_size=2), 1)
+        self.assertIn(newcomers[1].pk, self.neighbors(newcomers[0]))
+        self.assertEqual(refresh_pending_similar_listings(), 0)
+
+    def test_admin_approval_queues_the_listing(self):
+        call_command("rebuild_similar_listings", stdout=StringIO())
+        Listing.objects.filter(pk=self.table.pk).update(status=Listing.Status.PENDING_REVIEW)
+        updated_at = Listing.objects.get(pk=self.table.pk).updated_at
+        selected = Listing.objects.filter(pk__in=[self.table.pk, self.sofa.pk])
+        approve_listings(None, SimpleNamespace(user=self.seller), selected)
+
+        self.assertGreater(Listing.objects.get(pk=self.table.pk).updated_at, updated_at)
+        self.assertEqual(refresh_pending_similar_listings(), 1)
+        self.assertEqual(self.neighbors(self.sofa), [self.nearby_sofa.pk])
+
+
+@override_settings(VIEW_COUNTER_KEY_PREFIX="test-views")
+class ViewCounterTests(FeedTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        cls.seller = User.objects.create_user(email="seller@example.com", password="password123")
+        cls.buyer = User.objects.create_user(email="buyer@example.com", password="password123")
+        cls.listing = Listing.objects.create(
+            seller=cls.seller,
+            title="Lampe",
+            status=Listing.Status.PUBLISHED,
+            currency="EUR",
+        )
+        cls.url = reverse("listing_detail", kwargs={"slug": cls.listing.slug, "uuid": cls.listing.id})
+
+    def setUp(self):
+        super().setUp()
+        self.addCleanup(self.clear_counters)
+        self.clear_counters()
+
+    def clear_counters(self):
+        client = view_counts._redis()
+        for key in client.scan_iter("test-views:*"):
+            client.delete(key)
+
+    def test_views_are_buffered_in_redis_and_flushed_in_bulk(self):
+        with CaptureQueriesContext(connection) as queries:
+            for _ in range(3):
+                self.client.get(self.url)
+            self.client.force_login(self.buyer)
+            self.client.get(self.url)
+            self.client.force_login(self.seller)
+            self.client.get(self.url)
+        for query in queries.captured_queries:
+            self.assertFalse(query["sql"].startswith('UPDATE "listings_listing"'), query["sql"])
+        self.listing.refresh_from_db()
+        self.assertEqual(self.listing.view_count, 0)
+
+        self.assertEqual(view_counts.flush_view_counts(), 1)
+        self.listing.refresh_from_db()
+        self.assertEqual((self.listing.view_count, self.listing.unique_viewers), (4, 2))
+        self.assertGreater(
+            view_counts._redis().ttl(f"test-views:unique:{self.listing.pk}"), 0
+        )
+        self.assertAlmostEqual(
+            self.listing.popularity, 1 + view_counts.popularity_boost(), places=2
+        )
+        self.assertEqual(view_counts.flush_view_counts(), 0)
+
+        self.client.logout()
+        self.client.get(self.url)
+        view_counts.flush_view_counts()
+        self.listing.refresh_from_db()
+        self.assertEqual((self.listing.view_count, self.listing.unique_viewers), (5, 2))
+
+    def test_trending_sort_prefers_recent_viewers(self):
+        now = timezone.now()
+        fading = Listing.objects.create(
+            seller=self.seller, title="Fauteuil", status=Listing.Status.PUBLISHED, currency="EUR"
+        )
+        # five viewers three days ago weigh less than two today
+        Listing.objects.filter(pk=fading.pk).update(
+            popularity=math.log2(5) + view_counts.popularity_boost(now - timedelta(days=3))
+        )
+        Listing.objects.filter(pk=self.listing.pk).update(
+            popularity=math.log2(2) + view_counts.popularity_boost(now)
+        )
+        unseen = Listing.objects.create(
+            seller=self.seller, title="Miroir", status=Listing.Status.PUBLISHED, currency="EUR"
+        )
+        response = self.client.get(reverse("home"), {"sort": "trending"})
+        self.assertEqual(
+            [listing.pk for listing in get_listings_from_response(response)],
+            [self.listing.pk, fading.pk, unseen.pk],
+        )
+
 class ListingWorkflowTests(TestCase):
     @classmethod
     def setUpClass(cls):
@@ -222,6 +1215,72 @@ class ListingWorkflowTests(TestCase):
         self.assertEqual(listing.images.count(), 1)
         self.assertEqual(response["Location"], reverse("listing_submit", kwargs={"pk": listing.id}))
 
+    def photos(self, count, prefix="photo"):
+        files = []
+        for index in range(count):
+            photo = BytesIO()
+            Image.new("RGB", (8, 8), (index * 40 % 256, 90, 200)).save(photo, "PNG")
+            files.append(SimpleUploadedFile(f"{prefix}{index}.png", photo.getvalue()))
+        return files
+
+    def test_listing_photos_are_stored_in_bulk(self):
+        self.client.force_login(self.seller)
+        query_counts = []
+        for count in (2, 6):
+            with CaptureQueriesContext(connection) as queries, self.captureOnCommitCallbacks():
+                self.client.post(
+                    reverse("listing_create"),
+                    {"images": self.photos(count, f"set{count}-"), "primary_index": "1"},
+                )
+            query_counts.append(len(queries))
+        self.assertEqual(query_counts[0], query_counts[1])
+
+        listing = Listing.objects.filter(seller=self.seller).latest("created_at")
+        with self.captureOnCommitCallbacks():
+            self.client.post(
+                reverse("listing_photos", kwargs={"pk": listing.pk}), {"images": self.photos(2, "more")}
+            )
+        images = list(listing.images.select_related("image_asset").order_by("sort_order"))
+        self.assertEqual([image.sort_order for image in images], list(range(8)))
+        self.assertEqual(
+            [image.image_asset.image.name for image in images[6:]],
+            [image.image_asset.image.name for image in images[:2]],
+        )
+        self.assertEqual([image.is_primary for image in images], [False, True] + [False] * 6)
+        listing.refresh_from_db()
+        self.assertEqual(listing.primary_image, images[1].image_asset)
+
+    def test_batch_upload_stores_files_in_bulk(self):
+        self.client.force_login(self.seller)
+        query_counts = []
+        for count in (2, 6):
+            files = self.photos(count)
+            files.append(SimpleUploadedFile("copie.png", files[0].read()))
+            files[0].seek(0)
+            with CaptureQueriesContext(connection) as queries:
+                with self.captureOnCommitCallbacks() as callbacks:
+                    response = self.client.post(reverse("ingestion:batch_upload"), {"media_files": files})
+            query_counts.append(len(queries))
+        self.assertEqual(query_counts[0], query_counts[1])
+
+        batch = BatchUpload.objects.latest("created_at")
+        self.assertRedirects(
+            response,
+            reverse("ingestion:batch_processing", kwargs={"batch_id": batch.id}),
+            fetch_redirect_response=False,
+        )
+        media = list(batch.media_assets.select_related("image_asset"))
+        self.assertEqual(
+            sorted(Counter(item.image_asset.image.name for item in media).values()), [1] * 5 + [2]
+        )
+        self.assertTrue(all(item.file_hash == item.image_asset.file_hash for item in media))
+        copied = Counter(item.file_hash for item in media).most_common(1)[0][0]
+        # twice in each batch
+        self.assertEqual(MediaBlob.objects.get(sha256=copied).ref_count, 4)
+        self.assertEqual(
+            [callback.func for callback in callbacks].count(analyze_batch.delay), 1
+        )
+
     def test_submit_for_review_sets_status(self):
         listing = Listing.objects.create(
             seller=self.seller,
@@ -289,6 +1348,298 @@ class ListingWorkflowTests(TestCase):
         self.assertEqual(response.status_code, 403)
 
 
+class PrimaryImageTests(FeedTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.media_root = tempfile.mkdtemp()
+        cls.media_override = override_settings(MEDIA_ROOT=cls.media_root)
+        cls.media_override.enable()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.media_override.disable()
+        shutil.rmtree(cls.media_root, ignore_errors=True)
+        super().tearDownClass()
+
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        cls.seller = User.objects.create_user(email="seller@example.com", password="password123")
+
+    def create_listing_with_images(self, count=2):
+        listing = Listing.objects.create(
+            seller=self.seller,
+            title="Lampe",
+            status=Listing.Status.PUBLISHED,
+            currency="EUR",
+        )
+        images = [
+            ListingImage.objects.create(
+                listing=listing,
+                image_asset=ImageAsset.objects.create(user=self.seller, image=make_image_file()),
+                sort_order=index,
+            )
+            for index in range(count)
+        ]
+        return listing, images
+
+    def test_primary_image_follows_listing_image_changes(self):
+        listing, (first, second) = self.create_listing_with_images()
+        listing.refresh_from_db()
+        self.assertEqual(listing.primary_image, first.image_asset)
+        self.assertEqual(listing.primary_image_url, first.image_asset.image.url)
+        self.assertEqual((listing.primary_image_width, listing.primary_image_height), (1, 1))
+
+        second.is_primary = True
+        second.save()
+        listing.refresh_from_db()
+        self.assertEqual(listing.primary_image, second.image_asset)
+
+        second.delete()
+        listing.refresh_from_db()
+        self.assertEqual(listing.primary_image, first.image_asset)
+
+        first.delete()
+        listing.refresh_from_db()
+        self.assertIsNone(listing.primary_image)
+        self.assertEqual(listing.primary_image_url, "")
+
+    def test_feed_query_count_does_not_grow_with_cards(self):
+        self.create_listing_with_images()
+        with CaptureQueriesContext(connection) as few_cards:
+            self.client.get(reverse("home"))
+
+        for _ in range(5):
+            self.create_listing_with_images()
+        with CaptureQueriesContext(connection) as more_cards:
+            response = self.client.get(reverse("home"))
+
+        self.assertEqual(len(get_listings_from_response(response)), 6)
+        self.assertEqual(len(more_cards), len(few_cards))
+
+    def test_cards_serve_derivatives_once_generated(self):
+        listing, (first, _) = self.create_listing_with_images()
+        photo = BytesIO()
+        Image.new("RGB", (2000, 1500), "teal").save(photo, "JPEG")
+        asset = first.image_asset
+        asset.image = SimpleUploadedFile("photo.jpg", photo.getvalue(), content_type="image/jpeg")
+        asset.save()
+        listing.refresh_from_db()
+        rendered_before = listing.updated_at
+
+        derivatives = generate_image_derivatives(str(asset.pk))
+
+        listing.refresh_from_db()
+        self.assertEqual(listing.primary_image_derivatives, derivatives)
+        self.assertGreater(listing.updated_at, rendered_before)
+        response = self.client.get(reverse("home"))
+        self.assertContains(response, 'type="image/webp"')
+        self.assertContains(response, f"/media/{derivatives['webp'][1][1]} 640w")
+        self.assertNotContains(response, asset.image.url)
+
+    def test_moderation_lists_listings_with_similar_photos(self):
+        staff = get_user_model().objects.create_user(
+            email="staff@example.com", password="password123", is_staff=True
+        )
+        # the copy is two bits away from the original, the other photo 64
+        hashes = {
+            "original": 0x0F0F_3C3C_5A5A_6969,
+            "copy": 0x0F0F_3C3C_5A5A_696C,
+            "other": ~0x0F0F_3C3C_5A5A_6969,
+        }
+        assets = {}
+        for key, perceptual_hash in hashes.items():
+            assets[key] = ImageAsset.objects.create(user=self.seller, image=make_image_file())
+            ImageAsset.objects.filter(pk=assets[key].pk).update(perceptual_hash=perceptual_hash)
+
+        pending = Listing.objects.create(
+            seller=self.seller, title="Lampe", status=Listing.Status.PENDING_REVIEW, currency="EUR"
+        )
+        ListingImage.objects.create(listing=pending, image_asset=assets["original"])
+        for key in ("copy", "other"):
+            ListingImage.objects.create(
+                listing=Listing.objects.create(seller=staff, title=key, currency="EUR"),
+                image_asset=assets[key],
+            )
+        self.client.force_login(staff)
+        response = self.client.get(reverse("review_listing", kwargs={"pk": pending.pk}))
+        self.assertEqual(
+            [listing.title for listing in response.context["similar_photo_listings"]], ["copy"]
+        )
+        self.assertContains(response, "Photos similaires")
+
+    def test_photo_uploads_still_check_csrf(self):
+        listing, _ = self.create_listing_with_images(count=0)
+        url = reverse("listing_photos", kwargs={"pk": listing.pk})
+        client = Client(enforce_csrf_checks=True)
+        client.force_login(self.seller)
+        self.assertEqual(client.post(url, {"images": make_image_file()}).status_code, 403)
+
+        token = client.get(url).context["csrf_token"]
+        with self.captureOnCommitCallbacks():
+            response = client.post(url, {"images": make_image_file(), "csrfmiddlewaretoken": token})
+        self.assertEqual(response.status_code, 302)
+
+    def test_listing_photos_are_cleaned_on_upload(self):
+        listing, _ = self.create_listing_with_images(count=0)
+        self.client.force_login(self.seller)
+        url = reverse("listing_photos", kwargs={"pk": listing.pk})
+        exif = Image.Exif()
+        exif[0x010F] = "PhoneMaker"
+        photo = BytesIO()
+        Image.new("RGB", (80, 60), "teal").save(photo, "JPEG", exif=exif)
+        with self.captureOnCommitCallbacks():
+            response = self.client.post(url, {"images": SimpleUploadedFile("IMG_1.JPEG", photo.getvalue())})
+        self.assertEqual(response.status_code, 302)
+
+        asset = listing.images.get().image_asset
+        stored = Path(self.media_root, asset.image.name).read_bytes()
+        self.assertEqual(asset.file_hash, hashlib.sha256(stored).hexdigest())
+        self.assertTrue(asset.image.name.endswith(".jpg"))
+        self.assertNotIn(b"PhoneMaker", stored)
+
+        response = self.client.post(
+            url, {"images": SimpleUploadedFile("notes.txt", b"pas une photo")}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "n&#x27;est pas une photo JPEG, PNG, WebP ou GIF")
+
+
+class ListingCardCacheTests(FeedTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        cls.seller = User.objects.create_user(
+            email="seller@example.com", password="password123", first_name="Paul"
+        )
+        cls.buyer = User.objects.create_user(email="buyer@example.com", password="password123")
+        cls.listing = Listing.objects.create(
+            seller=cls.seller,
+            title="Vintage chair",
+            status=Listing.Status.PUBLISHED,
+            currency="EUR",
+        )
+
+    def test_card_body_is_rendered_once_and_reused(self):
+        response = self.client.get(reverse("home"))
+        self.assertTemplateUsed(response, "components/listings/listing_card_body.html")
+
+        response = self.client.get(reverse("home"))
+        self.assertTemplateNotUsed(response, "components/listings/listing_card_body.html")
+        self.assertContains(response, "Vintage chair")
+
+    def test_favorite_state_is_not_shared_between_users(self):
+        Favorite.objects.create(user=self.buyer, listing=self.listing)
+        self.client.get(reverse("home"))
+
+        self.client.force_login(self.buyer)
+        response = self.client.get(reverse("home"))
+
+        self.assertTemplateNotUsed(response, "components/listings/listing_card_body.html")
+        self.assertContains(response, "favorite-button--active")
+        self.client.logout()
+        self.assertNotContains(self.client.get(reverse("home")), "favorite-button--active")
+
+    def test_listing_and_seller_changes_render_fresh_cards(self):
+        self.client.get(reverse("home"))
+
+        self.listing.title = "Vintage armchair"
+        self.listing.save()
+        self.assertContains(self.client.get(reverse("home")), "Vintage armchair")
+
+        self.seller.first_name = "Pauline"
+        self.seller.save()
+        self.assertContains(self.client.get(reverse("home")), "Pauline")
+
+
+# HomeFeedView._get_filter_params() for a request without filters
+DEFAULT_FEED_PARAMS = {
+    "q": "",
+    "city": "",
+    "category": "",
+    "condition": "",
+    "price": None,
+    "price_range": (None, None),
+    "near": None,
+    "radius": None,
+    "sort": "",
+}
+
+
+class SharedFeedCacheTests(FeedTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        cls.seller = User.objects.create_user(email="seller@example.com", password="password123")
+        cls.listing = Listing.objects.create(
+            seller=cls.seller,
+            title="Vintage chair",
+            status=Listing.Status.PUBLISHED,
+            currency="EUR",
+        )
+
+    def test_first_page_is_shared_through_the_cache(self):
+        with CaptureQueriesContext(connection) as cold:
+            self.client.get(reverse("home"))
+        with CaptureQueriesContext(connection) as warm:
+            response = self.client.get(reverse("home"))
+
+        self.assertLess(len(warm), len(cold))
+        self.assertEqual(get_listings_from_response(response), [self.listing])
+        self.assertEqual(response.context["results_count"], 1)
+
+    def test_publication_changes_invalidate_the_cached_feed(self):
+        self.client.get(reverse("home"))
+
+        fresh = Listing.objects.create(
+            seller=self.seller,
+            title="Modern lamp",
+            status=Listing.Status.PUBLISHED,
+            currency="EUR",
+        )
+        response = self.client.get(reverse("home"))
+        self.assertEqual(get_listings_from_response(response), [fresh, self.listing])
+
+        fresh.status = Listing.Status.ARCHIVED
+        fresh.save()
+        response = self.client.get(reverse("home"))
+        self.assertEqual(get_listings_from_response(response), [self.listing])
+
+    def test_cached_feed_still_shows_edited_cards(self):
+        self.client.get(reverse("home"))
+
+        self.listing.title = "Vintage armchair"
+        self.listing.save()
+
+        self.assertContains(self.client.get(reverse("home")), "Vintage armchair")
+
+    def test_logged_in_visitors_share_entries_and_filters_use_their_own(self):
+        self.client.force_login(self.seller)
+        self.client.get(reverse("home"), {"city": " Paris "})
+        params = dict(DEFAULT_FEED_PARAMS)
+        self.assertIsNone(cache.get(shared_feed_key(params)))
+        self.assertIsNotNone(cache.get(shared_feed_key({**params, "city": "paris"})))
+
+        self.client.logout()
+        self.client.get(reverse("home"))
+        self.assertIsNotNone(cache.get(shared_feed_key(params)))
+
+    def test_stale_entry_is_served_while_another_request_rebuilds(self):
+        key = shared_feed_key(DEFAULT_FEED_PARAMS)
+        cache.set(key, {"value": "stale", "fresh_until": 0})
+        cache.add(f"{key}:lock", 1)
+
+        def compute():
+            raise AssertionError("only the lock holder recomputes")
+
+        self.assertEqual(get_or_compute(key, compute), "stale")
+
+        cache.delete(f"{key}:lock")
+        self.assertEqual(get_or_compute(key, lambda: "fresh"), "fresh")
+        self.assertEqual(get_or_compute(key, compute), "fresh")
+
+
 class MarketplaceFlowTests(TestCase):
     def setUp(self):
         User = get_user_model()
@@ -338,3 +1689,129 @@ class MarketplaceFlowTests(TestCase):
 
         self.assertEqual(listing.status, Listing.Status.PUBLISHED)
         self.assertFalse(Reservation.objects.active().filter(listing=listing).exists())
+
+
+class ReservationSweepTests(FeedTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        cls.seller = User.objects.create_user(email="seller@example.com", password="password123")
+        cls.buyer = User.objects.create_user(email="buyer@example.com", password="password123")
+
+    def reserve(self, expires_in, title="Chaise", city="Lyon"):
+        listing = Listing.objects.create(
+            seller=self.seller,
+            title=title,
+            city=city,
+            status=Listing.Status.RESERVED,
+            currency="EUR",
+        )
+        Reservation.objects.create(
+            listing=listing,
+            buyer=self.buyer,
+            expires_at=timezone.now() + timedelta(hours=expires_in),
+        )
+        return listing
+
+    def test_listing_pages_do_not_write_for_lapsed_reservations(self):
+        lapsed = self.reserve(expires_in=-1)
+        held = self.reserve(expires_in=1, title="Lampe")
+        self.client.force_login(self.buyer)
+        detail_url = reverse("listing_detail", kwargs={"slug": lapsed.slug, "uuid": lapsed.id})
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(detail_url)
+        self.assertContains(response, reverse("listing_reserve", kwargs={"listing_id": lapsed.id}))
+        held_response = self.client.get(
+            reverse("listing_detail", kwargs={"slug": held.slug, "uuid": held.id})
+        )
+        self.assertEqual(held_response.context["active_reservation"].buyer, self.buyer)
+        self.assertFalse(held_response.context["can_reserve"])
+
+        for query in queries.captured_queries:
+            sql = query["sql"].lstrip().upper()
+            self.assertFalse(sql.startswith(("UPDATE", "INSERT", "DELETE")), sql)
+            self.assertNotIn("FOR UPDATE", sql)
+        lapsed.refresh_from_db()
+        self.assertEqual(lapsed.status, Listing.Status.RESERVED)
+
+    def test_seller_dashboard_resolves_a_page_in_constant_queries(self):
+        self.client.force_login(self.seller)
+        url = reverse("my_listings")
+        self.reserve(expires_in=-1)
+        self.reserve(expires_in=1)
+        with CaptureQueriesContext(connection) as small:
+            self.client.get(url)
+
+        lapsed = [self.reserve(expires_in=-1, title=f"Objet {index}") for index in range(8)]
+        held = [self.reserve(expires_in=1, title=f"Lampe {index}") for index in range(8)]
+        for index in range(10):
+            Listing.objects.create(
+                seller=self.seller, title=f"Brouillon {index}", currency="EUR"
+            )
+        with CaptureQueriesContext(connection) as large:
+            response = self.client.get(url)
+        self.assertEqual(len(large.captured_queries), len(small.captured_queries))
+        self.assertEqual(len(response.context["listings"]), 20)
+        self.assertEqual(response.context["paginator"].count, 28)
+
+        statuses = dict(Listing.objects.values_list("pk", "status"))
+        shown = {listing.pk: listing for listing in response.context["listings"]}
+        for listing in lapsed:
+            if listing.pk in shown:
+                self.assertIsNone(shown[listing.pk].active_reservation)
+                self.assertEqual(shown[listing.pk].status, Listing.Status.PUBLISHED)
+                self.assertEqual(statuses[listing.pk], Listing.Status.PUBLISHED)
+        for listing in held:
+            if listing.pk in shown:
+                self.assertEqual(shown[listing.pk].active_reservation.buyer, self.buyer)
+                self.assertEqual(statuses[listing.pk], Listing.Status.RESERVED)
+        self.assertEqual(
+            CityStat.objects.get(key="lyon").published_count,
+            sum(status == Listing.Status.PUBLISHED for status in statuses.values()),
+        )
+
+    def test_sweeper_expires_in_batches_and_republishes(self):
+        lapsed = [self.reserve(expires_in=-1, title=f"Objet {index}") for index in range(3)]
+        held = self.reserve(expires_in=1)
+        rebooked = lapsed[0]
+        self.assertIsNotNone(reserve_listing(rebooked, self.seller))
+        Reservation.objects.create(
+            listing=self.reserve(expires_in=-2, title="Tapis", city="Paris"),
+            buyer=self.buyer,
+            expires_at=timezone.now() - timedelta(hours=3),
+            cancelled_at=timezone.now() - timedelta(hours=3),
+        )
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(expire_stale_reservations(batch_size=2), 3)
+
+        statuses = dict(Listing.objects.values_list("pk", "status"))
+        self.assertEqual(statuses[rebooked.pk], Listing.Status.RESERVED)
+        self.assertEqual(statuses[held.pk], Listing.Status.RESERVED)
+        for listing in lapsed[1:]:
+            self.assertEqual(statuses[listing.pk], Listing.Status.PUBLISHED)
+        self.assertEqual(Reservation.objects.active().count(), 2)
+        self.assertEqual(CityStat.objects.get(key="lyon").published_count, 2)
+        self.assertEqual(expire_stale_reservations(), 0)
+
+    def test_reserving_a_taken_listing_fails_and_a_lapsed_one_succeeds(self):
+        listing = self.reserve(expires_in=1)
+        self.assertIsNone(reserve_listing(listing, self.seller))
+
+        lapsed = self.reserve(expires_in=-1, title="Lampe")
+        reservation = reserve_listing(lapsed, self.seller)
+        self.assertEqual(reservation.buyer, self.seller)
+        self.assertEqual(
+            Reservation.objects.filter(listing=lapsed, cancelled_at__isnull=True).get(),
+            reservation,
+        )
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class ConcurrentReservationTests(TransactionTestCase):
+    def test_exactly_one_of_many_concurrent_buyers_wins(self):
+        output = StringIO()
+        call_command("stress_reservations", buyers=60, workers=12, rounds=2, stdout=output)
+        self.assertEqual(output.getvalue().count(" 1 won, 1 open reservation(s)"), 2)
+        self.assertFalse(Listing.objects.exists())
@@ -1,6 +1,7 @@
 from django.urls import path
 
 from .views import (
+    CityAutocompleteView,
     HomeFeedView,
     ListingDetailView,
     ListingFavoriteToggleView,
@@ -17,6 +18,7 @@ from .views import (
 
 urlpatterns = [
     path("", HomeFeedView.as_view(), name="home"),
+    path("cities/autocomplete/", CityAutocompleteView.as_view(), name="city_autocomplete"),
     path("items/<uuid:listing_id>/favorite/", ListingFavoriteToggleView.as_view(), name="listing_favorite"),
     path("items/<uuid:listing_id>/reserve/", ReservationCreateView.as_view(), name="listing_reserve"),
     path("items/<uuid:listing_id>/cancel-reservation/", ReservationCancelView.as_view(), name="listing_cancel_reservation"),
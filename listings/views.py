@@ -1,13 +1,23 @@
-from datetime import timedelta
+from decimal import Decimal, InvalidOperation
 
 from django.conf import settings
 from django.contrib import messages as django_messages
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
-from django.db.models import Avg, BooleanField, Exists, OuterRef, Prefetch, Q, Value
+from django.db import transaction
+from django.db.models import F, Prefetch
+from django.db.models.functions import Greatest
+from django.core.paginator import Page
 from django.http import HttpResponseRedirect
 from django.shortcuts import get_object_or_404, redirect, render
 from django.urls import reverse
 from django.utils import timezone
+from django.utils.cache import (
+    get_conditional_response,
+    patch_cache_control,
+    patch_vary_headers,
+)
+from django.utils.functional import cached_property
+from django.utils.http import http_date, quote_etag
 from django.views import View
 from django.views.generic import (
     DetailView,
@@ -17,15 +27,52 @@ from django.views.generic import (
     UpdateView,
 )
 
-from mediahub.models import ImageAsset
-
 from catalog.models import Category
+from mediahub.uploadhandlers import StreamingImageUploadMixin
 
 from .forms import ListingForm, PhotoUploadForm
 from accounts.models import ReputationStats
-from commerce.models import Review
 from ingestion.models import DetectedItem
-from .models import Favorite, Listing, ListingImage, Reservation
+from .models import CityStat, Favorite, Listing, Reservation
+from .services.cities import city_suggestions, matching_city_keys, normalize_city
+from .services.detail_cache import (
+    cached_anonymous_fragments,
+    detail_cache_timeout,
+    detail_validators,
+    render_detail_fragments,
+    store_anonymous_fragments,
+)
+from .services.duplicates import listings_with_similar_photos
+from .services.facets import PRICE_BUCKETS, facet_counts, price_bucket_range
+from .services.favorites import mark_favorites, refresh_favorite_ids
+from .services.feed_cache import get_or_compute, shared_feed_key
+from .services.geo import (
+    DEFAULT_RADIUS_KM,
+    RADIUS_CHOICES_KM,
+    locate_postal_code,
+    within_radius,
+)
+from .services.pagination import (
+    ESTIMATED_COUNT_THRESHOLD,
+    CappedCountPaginator,
+    estimate_count,
+    keyset_page,
+)
+from .services.photos import add_listing_photos
+from .services.reservations import reserve_listing, resolve_reservations
+from .services.search import search_listings
+from .services.similar import similar_listings
+from .services.view_counts import record_view, viewer_key
+
+
+# sort param -> feed ordering; price sorts skip listings without a price
+FEED_SORTS = {
+    "price_asc": ("price_cents", "-created_at"),
+    "price_desc": ("-price_cents", "-created_at"),
+    # decayed unique viewers, flushed by services/view_counts.py
+    "trending": ("-popularity", "-created_at"),
+}
+PRICE_SORTS = {"price_asc", "price_desc"}
 
 
 def get_listing_detail_url(listing):
@@ -38,53 +85,296 @@ class HomeFeedView(ListView):
     template_name = "pages/home.html"
     context_object_name = "listings"
     paginate_by = 24
+    paginator_class = CappedCountPaginator
 
     def get_queryset(self):
         qs = Listing.objects.filter(status=Listing.Status.PUBLISHED)
-        q = self.request.GET.get("q", "").strip()
-        city = self.request.GET.get("city", "").strip()
+        q = self._get_search_query()
         category = self.request.GET.get("category", "").strip()
+        condition = self._get_condition()
+        price_bucket = self._get_price_bucket()
         if q:
-            qs = qs.filter(Q(title__icontains=q) | Q(description__icontains=q))
-        if city:
-            qs = qs.filter(city__icontains=city)
+            qs = search_listings(qs, q)
+        if self._city_keys:
+            qs = qs.filter(city_key__in=self._city_keys)
         if category:
             qs = qs.filter(category__slug=category)
-        image_qs = ListingImage.objects.select_related("image_asset").order_by(
-            "-is_primary", "sort_order"
-        )
-        if self.request.user.is_authenticated:
-            qs = qs.annotate(
-                is_favorited=Exists(
-                    Favorite.objects.filter(
-                        user=self.request.user, listing=OuterRef("pk")
-                    )
-                )
+        if condition:
+            qs = qs.filter(condition=condition)
+        if price_bucket is not None:
+            low, high = price_bucket_range(price_bucket)
+            qs = qs.filter(price_cents__gte=low)
+            if high is not None:
+                qs = qs.filter(price_cents__lt=high)
+        price_min, price_max = self._get_price_range()
+        if price_min is not None:
+            qs = qs.filter(price_cents__gte=price_min)
+        if price_max is not None:
+            qs = qs.filter(price_cents__lte=price_max)
+        if self._origin:
+            qs = within_radius(qs, *self._origin, self._get_radius())
+        sort = self._get_sort()
+        if sort == "distance":
+            ordering = ("distance_km", "-created_at")
+        elif sort in FEED_SORTS:
+            if sort in PRICE_SORTS:
+                qs = qs.filter(price_cents__isnull=False)
+            ordering = FEED_SORTS[sort]
+        elif q:
+            ordering = ("-search_rank", "-created_at")
+        else:
+            ordering = ("-created_at",)
+        return qs.select_related("category", "seller").order_by(*ordering)
+
+    def paginate_queryset(self, queryset, page_size):
+        # The query is the same for every visitor, so the first page only
+        # depends on the filters and its ids and count are shared through
+        # the cache. Favorite flags are set per user on the page afterwards.
+        if self._is_shared_first_page():
+            snapshot = get_or_compute(
+                shared_feed_key(self._get_filter_params()),
+                lambda: self._snapshot_first_page(queryset, page_size),
+            )
+            paginator, page, listings, is_paginated = self._restore_first_page(
+                queryset, page_size, snapshot
             )
         else:
-            qs = qs.annotate(is_favorited=Value(False, output_field=BooleanField()))
-        return (
-            qs.select_related("category", "seller")
-            .prefetch_related(Prefetch("images", queryset=image_qs))
-            .order_by("-created_at")
+            paginator, page, listings, is_paginated = self._paginate(queryset, page_size)
+        listings = list(listings)
+        if page is not None:
+            page.object_list = listings
+        mark_favorites(listings, self.request.user)
+        return paginator, page, listings, is_paginated
+
+    def _paginate(self, queryset, page_size):
+        # Ranked search results keep page numbers; the chronological feed
+        # walks (created_at, id) cursors so deep pages never OFFSET.
+        if self._uses_page_numbers():
+            return super().paginate_queryset(queryset, page_size)
+        listings, self.next_cursor = keyset_page(
+            queryset, self.request.GET.get("cursor", ""), page_size
         )
+        return (None, None, listings, self.next_cursor is not None)
+
+    def _snapshot_first_page(self, queryset, page_size):
+        paginator, _, listings, _ = self._paginate(queryset, page_size)
+        return {
+            "ids": [listing.pk for listing in listings],
+            "next_cursor": getattr(self, "next_cursor", None),
+            "results_count": self._count_results(paginator),
+            "page_rows": paginator.count if paginator else None,
+        }
+
+    def _restore_first_page(self, queryset, page_size, snapshot):
+        self.next_cursor = snapshot["next_cursor"]
+        self.results_count = snapshot["results_count"]
+        by_id = queryset.in_bulk(snapshot["ids"])
+        listings = [by_id[pk] for pk in snapshot["ids"] if pk in by_id]
+        if not self._uses_page_numbers():
+            return (None, None, listings, self.next_cursor is not None)
+        paginator = self.get_paginator(
+            queryset,
+            page_size,
+            count=snapshot.get("page_rows"),
+            estimated_count=self.results_count,
+        )
+        paginator.validate_number(1)
+        return (paginator, Page(listings, 1, paginator), listings, paginator.num_pages > 1)
+
+    def _count_results(self, paginator):
+        if paginator:
+            return paginator.estimated_count
+        return estimate_count(self.object_list)
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context["categories"] = Category.objects.all()
+        querystring = self._get_filter_querystring()
+        context["next_page_url"] = self._build_next_page_url(querystring)
         context["filters"] = {
             "q": self.request.GET.get("q", ""),
             "city": self.request.GET.get("city", ""),
             "category": self.request.GET.get("category", ""),
-            "querystring": self._get_filter_querystring(),
+            "condition": self._get_condition(),
+            "price": self.request.GET.get("price", ""),
+            "price_min": self.request.GET.get("price_min", "").strip(),
+            "price_max": self.request.GET.get("price_max", "").strip(),
+            "near": self.request.GET.get("near", ""),
+            "radius": self._get_radius(),
+            "radius_choices": RADIUS_CHOICES_KM,
+            "sort": self._get_sort(),
+            "near_unknown": bool(self.request.GET.get("near", "").strip()) and not self._origin,
+            "querystring": querystring,
         }
+        if self.request.headers.get("HX-Request"):
+            return context
+        if not hasattr(self, "results_count"):
+            self.results_count = self._count_results(context["paginator"])
+        context["results_count"] = self.results_count
+        context["results_count_is_estimate"] = (
+            self.results_count >= ESTIMATED_COUNT_THRESHOLD
+        )
+        context["facets"] = self._build_facets()
         return context
 
+    def _build_facets(self):
+        counts = facet_counts(
+            {
+                "category": self.request.GET.get("category", "").strip(),
+                "condition": self._get_condition(),
+                "city_keys": self._city_keys,
+                "price_bucket": self._get_price_bucket(),
+            }
+        )
+        categories = Category.objects.in_bulk([pk for pk, _ in counts["category_id"]])
+        city_names = dict(
+            CityStat.objects.filter(
+                key__in=[key for key, _ in counts["city_key"]]
+            ).values_list("key", "name")
+        )
+        facets = {
+            "category": [
+                self._facet_option("category", categories[pk].slug, categories[pk].name, total)
+                for pk, total in counts["category_id"]
+                if pk in categories
+            ],
+            "condition": [
+                self._facet_option("condition", value, Listing.Condition(value).label, total)
+                for value, total in counts["condition"]
+                if value in Listing.Condition.values
+            ],
+            "city": [
+                self._facet_option("city", city_names.get(key, key), city_names.get(key, key), total)
+                for key, total in counts["city_key"]
+            ],
+            "price": [
+                self._facet_option("price", str(bucket), PRICE_BUCKETS[bucket][0], total)
+                for bucket, total in sorted(counts["price_bucket"])
+            ],
+        }
+        # The rollup cannot apply a full-text query, a radius or an arbitrary
+        # price range, so counts would be wrong.
+        facets["show_counts"] = not (
+            self._get_search_query()
+            or self._origin
+            or self._get_price_range() != (None, None)
+        )
+        return facets
+
+    def _facet_option(self, param, value, label, count):
+        params = self.request.GET.copy()
+        params.pop("page", None)
+        params.pop("cursor", None)
+        if param == "city":
+            selected = normalize_city(params.get(param, "")) == normalize_city(value)
+        else:
+            selected = params.get(param, "") == value
+        if selected:
+            params.pop(param)
+        else:
+            params[param] = value
+        return {
+            "value": value,
+            "label": label,
+            "count": count,
+            "selected": selected,
+            "url": f"?{params.urlencode()}",
+        }
+
+    def render_to_response(self, context, **response_kwargs):
+        if self.request.headers.get("HX-Request"):
+            template_name = (
+                "fragments/listings/feed_page.html"
+                if self.request.GET.get("cursor")
+                else "fragments/listings/feed_results.html"
+            )
+            return render(self.request, template_name, context)
+        return super().render_to_response(context, **response_kwargs)
+
+    def _get_search_query(self):
+        return self.request.GET.get("q", "").strip()
+
+    def _get_condition(self):
+        condition = self.request.GET.get("condition", "").strip()
+        return condition if condition in Listing.Condition.values else ""
+
+    def _get_price_bucket(self):
+        price = self.request.GET.get("price", "").strip()
+        if price.isdigit() and int(price) < len(PRICE_BUCKETS):
+            return int(price)
+        return None
+
+    def _get_price_range(self):
+        return (
+            self._parse_price_cents(self.request.GET.get("price_min", "")),
+            self._parse_price_cents(self.request.GET.get("price_max", "")),
+        )
+
+    def _parse_price_cents(self, value):
+        # euros as typed by buyers: "15", "15,50", "15.5"
+        try:
+            amount = Decimal(value.strip().replace(",", "."))
+        except InvalidOperation:
+            return None
+        if not amount.is_finite() or amount < 0:
+            return None
+        return int(amount * 100)
+
+    @cached_property
+    def _origin(self):
+        return locate_postal_code(self.request.GET.get("near", ""))
+
+    def _get_radius(self):
+        radius = self.request.GET.get("radius", "")
+        if radius.isdigit() and int(radius) in RADIUS_CHOICES_KM:
+            return int(radius)
+        return DEFAULT_RADIUS_KM
+
+    def _get_sort(self):
+        sort = self.request.GET.get("sort", "")
+        if sort in FEED_SORTS or (sort == "distance" and self._origin):
+            return sort
+        return ""
+
+    def _uses_page_numbers(self):
+        return bool(self._get_search_query() or self._get_sort())
+
+    @cached_property
+    def _city_keys(self):
+        return matching_city_keys(self.request.GET.get("city", "")) or None
+
+    def _get_filter_params(self):
+        return {
+            "q": self._get_search_query().lower(),
+            "city": normalize_city(self.request.GET.get("city", "")),
+            "category": self.request.GET.get("category", "").strip(),
+            "condition": self._get_condition(),
+            "price": self._get_price_bucket(),
+            "price_range": self._get_price_range(),
+            "near": self._origin,
+            "radius": self._get_radius() if self._origin else None,
+            "sort": self._get_sort(),
+        }
+
+    def _is_shared_first_page(self):
+        return (
+            not self.request.GET.get("cursor")
+            and self.request.GET.get("page", "1") == "1"
+        )
+
     def _get_filter_querystring(self):
         params = self.request.GET.copy()
         params.pop("page", None)
+        params.pop("cursor", None)
         return params.urlencode()
 
+    def _build_next_page_url(self, querystring):
+        next_cursor = getattr(self, "next_cursor", None)
+        if not next_cursor:
+            return None
+        if querystring:
+            return f"?{querystring}&cursor={next_cursor}"
+        return f"?cursor={next_cursor}"
+
 
 class ListingDetailView(DetailView):
     model = Listing
@@ -92,29 +382,69 @@ class ListingDetailView(DetailView):
     context_object_name = "listing"
 
     def get_queryset(self):
-        qs = (
+        return (
             Listing.objects.filter(
                 status__in=[Listing.Status.PUBLISHED, Listing.Status.RESERVED]
             )
-            .select_related("category", "seller")
-            .prefetch_related("images__image_asset")
-        )
-        if self.request.user.is_authenticated:
-            qs = qs.annotate(
-                is_favorited=Exists(
-                    Favorite.objects.filter(
-                        user=self.request.user, listing=OuterRef("pk")
-                    )
-                )
+            .select_related("category", "seller__reputation")
+            .prefetch_related(
+                "images__image_asset",
+                Prefetch(
+                    "reservations",
+                    queryset=Reservation.objects.active().select_related("buyer"),
+                ),
             )
+        )
+
+    def get(self, request, *args, **kwargs):
+        validators = detail_validators(request, kwargs["uuid"], kwargs["slug"])
+        # counted before the conditional check on purpose: a 304 is still
+        # the visitor opening the page, and repeat visits only add to
+        # view_count, not to the unique viewers
+        if validators is not None and request.user.pk != validators.seller_id:
+            record_view(kwargs["uuid"], viewer_key(request))
+        # flash messages must be rendered, not answered with a 304 or a
+        # cached copy that would leave them queued
+        if validators is None or django_messages.get_messages(request):
+            return super().get(request, *args, **kwargs)
+        last_modified = validators.last_modified if validators.anonymous else None
+        response = get_conditional_response(
+            request, etag=quote_etag(validators.etag), last_modified=last_modified
+        )
+        if response is None:
+            response = self._render_page(request, validators, *args, **kwargs)
+        response.headers.setdefault("ETag", quote_etag(validators.etag))
+        if last_modified is not None:
+            response.headers.setdefault("Last-Modified", http_date(last_modified))
+        if validators.anonymous:
+            # the layout carries a CSRF token, so no shared cache may keep it
+            patch_cache_control(response, private=True, max_age=detail_cache_timeout())
+            patch_vary_headers(response, ("Cookie",))
         else:
-            qs = qs.annotate(is_favorited=Value(False, output_field=BooleanField()))
-        return qs
+            patch_cache_control(response, private=True, no_cache=True)
+        return response
+
+    def _render_page(self, request, validators, *args, **kwargs):
+        if not validators.anonymous:
+            return super().get(request, *args, **kwargs)
+        full_path = request.get_full_path()
+        fragments = cached_anonymous_fragments(validators, full_path)
+        if fragments is None:
+            self.object = self.get_object()
+            fragments = render_detail_fragments(
+                self.get_context_data(object=self.object), request
+            )
+            store_anonymous_fragments(validators, full_path, fragments)
+        return self.response_class(
+            request, self.get_template_names(), {"detail_fragments": fragments}
+        )
 
     def get_object(self, queryset=None):
         slug = self.kwargs["slug"]
         listing_id = self.kwargs["uuid"]
-        return get_object_or_404(self.get_queryset(), id=listing_id, slug=slug)
+        listing = get_object_or_404(self.get_queryset(), id=listing_id, slug=slug)
+        mark_favorites([listing], self.request.user)
+        return listing
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -125,11 +455,14 @@ class ListingDetailView(DetailView):
         photo_gallery = (
             [primary_image] + secondary_images if primary_image else secondary_images
         )
-        active_reservation = listing.refresh_reservation_state()
-        stats = getattr(listing.seller, "reputation", None)
-        if not stats:
-            stats = ReputationStats.for_user(listing.seller)
-        review_stats = self._build_seller_review_stats(listing.seller)
+        active_reservation = listing.get_active_reservation()
+        similar = similar_listings(listing)
+        mark_favorites(similar, self.request.user)
+        # kept current by the Review signals; sellers created before the
+        # stats table existed get a live computation instead
+        review_stats = getattr(
+            listing.seller, "reputation", None
+        ) or ReputationStats.from_reviews(listing.seller)
         context.update(
             {
                 "primary_image": primary_image,
@@ -147,6 +480,7 @@ class ListingDetailView(DetailView):
                     "messages:start", kwargs={"listing_id": listing.id}
                 ),
                 "active_reservation": active_reservation,
+                "similar_listings": similar,
                 "reservation_expiration_hours": getattr(
                     settings, "RESERVATION_HOLD_HOURS", 24
                 ),
@@ -156,7 +490,7 @@ class ListingDetailView(DetailView):
                 "cancel_reservation_url": reverse(
                     "listing_cancel_reservation", kwargs={"listing_id": listing.id}
                 ),
-                "can_reserve": listing.status == Listing.Status.PUBLISHED
+                "can_reserve": listing.is_reservable(active_reservation)
                 and self.request.user.is_authenticated
                 and self.request.user != listing.seller,
             }
@@ -185,54 +519,41 @@ class ListingDetailView(DetailView):
             )
         return modes
 
-    def _build_seller_review_stats(self, seller):
-        seller_reviews = seller.reviews_received.filter(
-            role=Review.Role.BUYER_TO_SELLER
-        )
-        buyer_reviews = seller.reviews_received.filter(
-            role=Review.Role.SELLER_TO_BUYER
-        )
-        seller_avg = seller_reviews.aggregate(avg=Avg("rating"))["avg"]
-        buyer_avg = buyer_reviews.aggregate(avg=Avg("rating"))["avg"]
-        return {
-            "seller_rating_avg": seller_avg or 0,
-            "seller_rating_count": seller_reviews.count(),
-            "items_sold_count": seller_reviews.count(),
-            "buyer_rating_avg": buyer_avg or 0,
-            "buyer_rating_count": buyer_reviews.count(),
-        }
-
-
 class WishlistView(LoginRequiredMixin, TemplateView):
     template_name = "pages/wishlist.html"
+    paginate_by = 24
 
-    def get_listings(self):
-        return (
-            Listing.objects.filter(
-                favorited_by__user=self.request.user,
-                status__in=[Listing.Status.PUBLISHED, Listing.Status.RESERVED],
-            )
-            .select_related("category", "seller")
-            .prefetch_related("images__image_asset")
-            .order_by("-favorited_by__created_at", "-created_at")
-        )
+    def get_favorites(self):
+        return Favorite.objects.filter(
+            user=self.request.user,
+            listing__status__in=[Listing.Status.PUBLISHED, Listing.Status.RESERVED],
+        ).select_related("listing__category", "listing__seller")
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        listings = self.get_listings()
+        # walks the (user, created_at, id) index of Favorite, never OFFSET
+        favorites, next_cursor = keyset_page(
+            self.get_favorites(),
+            self.request.GET.get("cursor", ""),
+            self.paginate_by,
+            pk_type=int,
+        )
+        listings = [favorite.listing for favorite in favorites]
         for listing in listings:
             listing.is_favorited = True
         context["listings"] = listings
+        context["next_page_url"] = f"?cursor={next_cursor}" if next_cursor else None
         context["wishlist_url"] = reverse("wishlist")
         return context
 
     def render_to_response(self, context, **response_kwargs):
         if self.request.headers.get("HX-Request"):
-            return render(
-                self.request,
-                "fragments/listings/wishlist_panel.html",
-                context,
+            template_name = (
+                "fragments/listings/feed_page.html"
+                if self.request.GET.get("cursor")
+                else "fragments/listings/wishlist_panel.html"
             )
+            return render(self.request, template_name, context)
         return super().render_to_response(context, **response_kwargs)
 
 
@@ -240,29 +561,35 @@ class MyListingsView(LoginRequiredMixin, ListView):
     model = Listing
     template_name = "sell/my_listings.html"
     context_object_name = "listings"
+    paginate_by = 20
 
     def get_queryset(self):
         reservation_qs = Reservation.objects.active().select_related("buyer")
         return (
             Listing.objects.filter(seller=self.request.user)
             .select_related("category")
-            .prefetch_related(
-                "images__image_asset", Prefetch("reservations", queryset=reservation_qs)
-            )
+            .prefetch_related(Prefetch("reservations", queryset=reservation_qs))
             .order_by("-updated_at")
         )
 
+    def paginate_queryset(self, queryset, page_size):
+        paginator, page, object_list, is_paginated = super().paginate_queryset(
+            queryset, page_size
+        )
+        # only the page's listings are resolved, against their prefetch
+        page.object_list = list(page.object_list)
+        resolve_reservations(page.object_list)
+        return paginator, page, page.object_list, is_paginated
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        for listing in context["listings"]:
-            listing.active_reservation = listing.refresh_reservation_state()
         context["reservation_expiration_hours"] = getattr(
             settings, "RESERVATION_HOLD_HOURS", 24
         )
         return context
 
 
-class ListingStartView(LoginRequiredMixin, FormView):
+class ListingStartView(StreamingImageUploadMixin, LoginRequiredMixin, FormView):
     template_name = "sell/upload_photos.html"
     form_class = PhotoUploadForm
 
@@ -278,25 +605,13 @@ class ListingStartView(LoginRequiredMixin, FormView):
             primary_index = int(primary_index)
         except (TypeError, ValueError):
             primary_index = 0
-        for image in images:
-            asset = ImageAsset.objects.create(user=self.request.user, image=image)
-            ListingImage.objects.create(
-                listing=listing,
-                image_asset=asset,
-                is_primary=False,
-                sort_order=0,
-            )
-        listing_images = list(listing.images.all())
-        for idx, listing_image in enumerate(listing_images):
-            listing_image.sort_order = idx
-            listing_image.is_primary = idx == primary_index
-            listing_image.save(update_fields=["sort_order", "is_primary"])
+        add_listing_photos(listing, self.request.user, images, primary_index=primary_index)
         return HttpResponseRedirect(
             reverse("listing_submit", kwargs={"pk": listing.id})
         )
 
 
-class PhotoUploadView(LoginRequiredMixin, FormView):
+class PhotoUploadView(StreamingImageUploadMixin, LoginRequiredMixin, FormView):
     template_name = "sell/upload_photos.html"
     form_class = PhotoUploadForm
 
@@ -306,9 +621,7 @@ class PhotoUploadView(LoginRequiredMixin, FormView):
 
     def form_valid(self, form):
         images = self.request.FILES.getlist("images")
-        for image in images:
-            asset = ImageAsset.objects.create(user=self.request.user, image=image)
-            ListingImage.objects.create(listing=self.listing, image_asset=asset)
+        add_listing_photos(self.listing, self.request.user, images)
         return HttpResponseRedirect(self.get_success_url())
 
     def get_success_url(self):
@@ -372,20 +685,11 @@ class ReservationCreateView(LoginRequiredMixin, View):
                 request, "Vous ne pouvez pas réserver votre propre annonce."
             )
             return redirect(detail_url)
-        active_reservation = listing.refresh_reservation_state()
-        if listing.status != Listing.Status.PUBLISHED or active_reservation:
+        if not reserve_listing(listing, request.user):
             django_messages.error(
                 request, "Cette annonce n’est pas disponible à la réservation."
             )
             return redirect(detail_url)
-        expires_at = timezone.now() + timedelta(
-            hours=getattr(settings, "RESERVATION_HOLD_HOURS", 24)
-        )
-        Reservation.objects.create(
-            listing=listing, buyer=request.user, expires_at=expires_at
-        )
-        listing.status = Listing.Status.RESERVED
-        listing.save(update_fields=["status"])
         django_messages.success(request, "L’annonce a bien été réservée.")
         return redirect(detail_url)
 
@@ -423,6 +727,11 @@ class ListingModerationDetailView(UserPassesTestMixin, DetailView):
             .prefetch_related("images__image_asset")
         )
 
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context["similar_photo_listings"] = listings_with_similar_photos(self.object)
+        return context
+
     def post(self, request, *args, **kwargs):
         listing = self.get_object()
         action = request.POST.get("action")
@@ -441,15 +750,36 @@ class ListingModerationDetailView(UserPassesTestMixin, DetailView):
         return HttpResponseRedirect(reverse("review_queue"))
 
 
+class CityAutocompleteView(View):
+    def get(self, request, *args, **kwargs):
+        response = render(
+            request,
+            "fragments/listings/city_suggestions.html",
+            {"cities": city_suggestions(request.GET.get("city", ""))},
+        )
+        response["Cache-Control"] = "public, max-age=60"
+        return response
+
+
 class ListingFavoriteToggleView(LoginRequiredMixin, View):
     def post(self, request, *args, **kwargs):
         listing = get_object_or_404(Listing, id=kwargs["listing_id"])
-        favorite, created = Favorite.objects.get_or_create(
-            user=request.user,
-            listing=listing,
-        )
-        if not created:
-            favorite.delete()
+        with transaction.atomic():
+            favorite, created = Favorite.objects.get_or_create(
+                user=request.user,
+                listing=listing,
+            )
+            if created:
+                change = 1
+            else:
+                # a concurrent toggle may have removed it already
+                change = -Favorite.objects.filter(pk=favorite.pk).delete()[0]
+            if change:
+                Listing.objects.filter(pk=listing.pk).update(
+                    favorite_count=Greatest(F("favorite_count") + change, 0)
+                )
+                listing.favorite_count = max(listing.favorite_count + change, 0)
+        refresh_favorite_ids(request.user)
         listing.is_favorited = created
         if request.headers.get("HX-Request"):
             next_url = (
@@ -1,7 +1,8 @@
 from django.contrib import admin
 from django.utils.html import format_html
 
-from .models import BatchUpload, ImageAsset, Keyframe, MediaAsset, VideoUpload
+from .models import BatchUpload, ImageAsset, Keyframe, MediaAsset, MediaBlob, VideoUpload
+from .services.derivatives import derivative_url
 
 
 @admin.register(ImageAsset)
@@ -15,13 +16,20 @@ class ImageAssetAdmin(admin.ModelAdmin):
         if obj.image:
             return format_html(
                 '<img src="{}" style="width:80px;height:auto;border-radius:8px;" />',
-                obj.image.url,
+                derivative_url(obj.derivatives, 160) or obj.image.url,
             )
         return "-"
 
     preview.short_description = "Preview"
 
 
+@admin.register(MediaBlob)
+class MediaBlobAdmin(admin.ModelAdmin):
+    list_display = ("sha256", "name", "size", "ref_count", "created_at")
+    search_fields = ("sha256",)
+    readonly_fields = ("sha256", "name", "size", "ref_count", "created_at")
+
+
 @admin.register(VideoUpload)
 class VideoUploadAdmin(admin.ModelAdmin):
     list_display = ("user", "status", "created_at")
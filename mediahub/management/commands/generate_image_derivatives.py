@@ -0,0 +1,37 @@
+import time
+
+from django.core.management import BaseCommand
+from django.db.models import Q
+
+from mediahub.models import ImageAsset
+from mediahub.services.derivatives import generate_derivatives
+
+
+class Command(BaseCommand):
+    help = "Generate the WebP/JPEG sizes and perceptual hash of image assets missing them."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--all", action="store_true", help="Regenerate assets that already have them."
+        )
+
+    def handle(self, *args, **options):
+        assets = ImageAsset.objects.exclude(image="").order_by("created_at")
+        if not options["all"]:
+            assets = assets.filter(Q(derivatives={}) | Q(perceptual_hash__isnull=True))
+        started = time.perf_counter()
+        done = failed = 0
+        for asset in assets.iterator(chunk_size=200):
+            try:
+                generate_derivatives(asset, force=options["all"])
+            except OSError as exc:  # missing or unreadable original
+                failed += 1
+                self.stderr.write(f"  {asset.pk}: {exc}")
+                continue
+            done += 1
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Generated derivatives for {done} assets ({failed} failed) "
+                f"in {time.perf_counter() - started:.1f} s."
+            )
+        )
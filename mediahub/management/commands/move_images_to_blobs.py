@@ -0,0 +1,29 @@
+import time
+
+from django.core.management import BaseCommand
+
+from mediahub.models import ImageAsset
+from mediahub.services.content_store import move_to_blob
+
+
+class Command(BaseCommand):
+    help = "Store image assets uploaded before content addressing under their SHA-256."
+
+    def handle(self, *args, **options):
+        assets = ImageAsset.objects.filter(file_hash="").exclude(image="").order_by("created_at")
+        started = time.perf_counter()
+        moved = duplicates = failed = 0
+        for asset in assets.iterator(chunk_size=200):
+            try:
+                duplicates += move_to_blob(asset)
+            except OSError as exc:  # missing or unreadable original
+                failed += 1
+                self.stderr.write(f"  {asset.pk}: {exc}")
+                continue
+            moved += 1
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Moved {moved} assets, {duplicates} of them duplicates of a stored "
+                f"file ({failed} failed) in {time.perf_counter() - started:.1f} s."
+            )
+        )
@@ -0,0 +1,20 @@
+# Generated by Django 6.0.1 on 2026-10-17 08:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        (
+            "mediahub",
+            "0003_rename_mediahub_ba_owner_status_c_2258a1_idx_mediahub_ba_owner_i_cf00dd_idx_and_more",
+        ),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="imageasset",
+            name="derivatives",
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
@@ -0,0 +1,66 @@
+# Generated by Django 6.0.1 on 2026-10-17 09:01
+
+import django.db.models.expressions
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("mediahub", "0005_content_store"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="imageasset",
+            name="perceptual_hash",
+            field=models.BigIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name="imageasset",
+            index=models.Index(
+                django.db.models.expressions.CombinedExpression(
+                    models.F("perceptual_hash"), "&", models.Value(65535)
+                ),
+                name="mediahub_img_phash_band0_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="imageasset",
+            index=models.Index(
+                django.db.models.expressions.CombinedExpression(
+                    django.db.models.expressions.CombinedExpression(
+                        models.F("perceptual_hash"), ">>", models.Value(16)
+                    ),
+                    "&",
+                    models.Value(65535),
+                ),
+                name="mediahub_img_phash_band1_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="imageasset",
+            index=models.Index(
+                django.db.models.expressions.CombinedExpression(
+                    django.db.models.expressions.CombinedExpression(
+                        models.F("perceptual_hash"), ">>", models.Value(32)
+                    ),
+                    "&",
+                    models.Value(65535),
+                ),
+                name="mediahub_img_phash_band2_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="imageasset",
+            index=models.Index(
+                django.db.models.expressions.CombinedExpression(
+                    django.db.models.expressions.CombinedExpression(
+                        models.F("perceptual_hash"), ">>", models.Value(48)
+                    ),
+                    "&",
+                    models.Value(65535),
+                ),
+                name="mediahub_img_phash_band3_idx",
+            ),
+        ),
+    ]
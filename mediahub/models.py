@@ -1,7 +1,13 @@
 import uuid
+from functools import partial
+
 from django.conf import settings
-from django.db import models
+from django.db import models, transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
 from django.utils import timezone
+
+from .services.perceptual import BANDS, band_expression
 
 
 
@@ -60,8 +66,62 @@ class ImageAsset(models.Model):
     )
     image = models.ImageField(upload_to="images/%Y/%m/%d/")
     source = models.CharField(max_length=20, default="upload")  # upload|keyframe|other
+    # SHA-256 of the file for uploads stored through services/content_store.py,
+    # blank for files saved straight onto the field
+    file_hash = models.CharField(max_length=64, blank=True, db_index=True, editable=False)
+    # resized WebP/JPEG copies, see services/derivatives.py; empty until
+    # the generate_derivatives task has run
+    derivatives = models.JSONField(default=dict, blank=True, editable=False)
+    # 64-bit dHash, set alongside the derivatives; see services/perceptual.py
+    perceptual_hash = models.BigIntegerField(null=True, blank=True, editable=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(band_expression(band), name=f"mediahub_img_phash_band{band}_idx")
+            for band in range(BANDS)
+        ]
+
+
+@receiver(post_save, sender=ImageAsset)
+def queue_image_derivatives(sender, instance, created, **kwargs):
+    # identical bytes uploaded before come with their derivatives
+    if created and instance.image and not instance.derivatives:
+        from .tasks import generate_image_derivatives
+
+        transaction.on_commit(partial(generate_image_derivatives.delay, str(instance.pk)))
+
+
+@receiver(post_delete, sender=ImageAsset)
+def release_image_blob(sender, instance, **kwargs):
+    from .services.content_store import release_blob
+
+    release_blob(instance.file_hash)
+
+
+class MediaBlob(models.Model):
+    """A stored file shared by every ImageAsset with the same content."""
+
+    sha256 = models.CharField(max_length=64, unique=True)
+    name = models.CharField(max_length=255)
+    size = models.PositiveBigIntegerField(default=0)
+    # ImageAssets pointing at the file; at zero collect_unused_blobs()
+    # deletes it along with its derivatives
+    ref_count = models.PositiveIntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["created_at"],
+                name="mediahub_blob_unused_idx",
+                condition=models.Q(ref_count=0),
+            ),
+        ]
+
+    def __str__(self):
+        return self.sha256
+
 
 class MediaAsset(models.Model):
     class Source(models.TextChoices):
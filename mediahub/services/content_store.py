@@ -0,0 +1,285 @@
+import os
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from functools import partial
+
+from django.apps import apps
+from django.db import connection, transaction
+from django.db.models import F
+
+from ..uploadhandlers import FORMAT_EXTENSIONS, prepare_upload
+
+# hashing, resizing and writes release the GIL, and remote storages wait
+# on the network
+STORAGE_THREADS = 8
+BLOB_PREFIX = "blobs"
+
+
+def _blob_model():
+    return apps.get_model("mediahub", "MediaBlob")
+
+
+def _image_storage():
+    return apps.get_model("mediahub", "ImageAsset")._meta.get_field("image").storage
+
+
+def blob_name(digest, filename, image_format=None):
+    if image_format in FORMAT_EXTENSIONS:
+        extension = f".{FORMAT_EXTENSIONS[image_format]}"
+    else:
+        extension = os.path.splitext(filename or "")[1].lower()[:10]
+    return f"{BLOB_PREFIX}/{digest[:2]}/{digest[2:4]}/{digest}{extension}"
+
+
+def _claim_blobs(claims):
+    """Take references on blobs, creating the missing ones, in one statement.
+
+    ``claims`` maps each digest to ``(name, size, references)``. Returns the
+    name each digest is stored under, which is the one of the first upload
+    when the blob already exists, and its reference count afterwards. The
+    rows stay locked until the caller's transaction ends.
+    """
+    table = _blob_model()._meta.db_table
+    # sorted so that concurrent claims lock shared rows in the same order
+    rows = [(digest, *claims[digest]) for digest in sorted(claims)]
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {table} (sha256, name, size, ref_count, created_at) "
+            f"VALUES {', '.join(['(%s, %s, %s, %s, NOW())'] * len(rows))} "
+            f"ON CONFLICT (sha256) DO UPDATE "
+            f"SET ref_count = {table}.ref_count + EXCLUDED.ref_count "
+            f"RETURNING sha256, name, ref_count",
+            [value for row in rows for value in row],
+        )
+        return {digest: (name, ref_count) for digest, name, ref_count in cursor}
+
+
+def _save_blob(storage, digest, upload):
+    name = blob_name(digest, upload.name, getattr(upload, "image_format", None))
+    # the storage picks another name when this one is taken
+    return storage.save(name, upload)
+
+
+@contextmanager
+def _claimed_blobs(uploads, references):
+    """Store each of ``uploads``, keyed by digest, and take ``references``
+    on its blob, in a transaction lasting the block. Yields the name each
+    digest is stored under.
+
+    Contents without a stored file are written before the transaction
+    opens, and the files written here that end up unused, because the
+    block raised or a concurrent upload stored the same bytes first, are
+    deleted again.
+    """
+    MediaBlob = _blob_model()
+    storage = _image_storage()
+    digests = list(uploads)
+    known = dict(
+        MediaBlob.objects.filter(sha256__in=digests).values_list("sha256", "name")
+    )
+    present = _run(lambda digest: digest in known and storage.exists(known[digest]), digests)
+    missing = [digest for digest, exists in zip(digests, present) if not exists]
+    written = {}
+
+    def write(digest):
+        written[digest] = _save_blob(storage, digest, uploads[digest])
+
+    try:
+        _run(write, missing)
+        with transaction.atomic():
+            claims = {
+                digest: (
+                    written.get(digest) or known[digest],
+                    uploads[digest].size,
+                    references[digest],
+                )
+                for digest in digests
+            }
+            names = {}
+            for digest, (name, ref_count) in _claim_blobs(claims).items():
+                # a blob nothing referenced may have been collected since the
+                # check above; the row lock keeps collect_unused_blobs() off it now
+                if (
+                    name != written.get(digest)
+                    and ref_count == references[digest]
+                    and not storage.exists(name)
+                ):
+                    if digest not in written:
+                        write(digest)
+                    name = written[digest]
+                    MediaBlob.objects.filter(sha256=digest).update(name=name)
+                names[digest] = name
+            yield names
+    except BaseException:
+        referenced = set(
+            MediaBlob.objects.filter(name__in=written.values()).values_list("name", flat=True)
+        )
+        _run(storage.delete, [name for name in written.values() if name not in referenced])
+        raise
+    _run(storage.delete, [name for digest, name in written.items() if names[digest] != name])
+
+
+def processed_twin(digest, exclude=None):
+    """Derivatives and perceptual hash already made for the same bytes, if any."""
+    if not digest:
+        return {}
+    assets = apps.get_model("mediahub", "ImageAsset").objects.filter(file_hash=digest)
+    if exclude is not None:
+        assets = assets.exclude(pk=exclude)
+    return (
+        assets.exclude(derivatives={})
+        .filter(perceptual_hash__isnull=False)
+        .values("derivatives", "perceptual_hash")
+        .first()
+    ) or {}
+
+
+def _processed_twins(digests):
+    rows = (
+        apps.get_model("mediahub", "ImageAsset")
+        .objects.filter(file_hash__in=digests, perceptual_hash__isnull=False)
+        .exclude(derivatives={})
+        .values("file_hash", "derivatives", "perceptual_hash")
+    )
+    return {row.pop("file_hash"): row for row in rows}
+
+
+def _run(function, items):
+    """``function`` over ``items``, on a thread pool when there are several."""
+    if len(items) < 2:
+        return [function(item) for item in items]
+    with ThreadPoolExecutor(max_workers=min(STORAGE_THREADS, len(items))) as pool:
+        return list(pool.map(function, items))
+
+
+def store_images(user, uploads, source="upload"):
+    """Create the ImageAssets for ``uploads``, in order, in one transaction.
+
+    Each distinct content is written once, under ``blobs/<sha256>``, and
+    shared with earlier identical uploads; MediaBlob counts the assets
+    pointing at each file. Files are prepared (see prepare_upload()) and
+    written on a thread pool and the rows go in with one INSERT per table.
+    To insert more rows in the same transaction, use stored_images().
+    """
+    with stored_images(user, uploads, source) as assets:
+        return assets
+
+
+def store_image(user, upload, source="upload"):
+    """Create an ImageAsset for ``upload``, see store_images()."""
+    return store_images(user, [upload], source)[0]
+
+
+@contextmanager
+def stored_images(user, uploads, source="upload"):
+    """store_images() as a context manager, for callers with rows of their own.
+
+    The files are written first; the block then runs inside the transaction
+    holding the blob references and the new assets, so the caller's rows
+    commit or roll back together with them.
+    """
+    uploads = list(uploads)
+    if not uploads:
+        with transaction.atomic():
+            yield []
+        return
+    prepared = _run(prepare_upload, uploads)
+    try:
+        with _stored(user, prepared, source) as assets:
+            yield assets
+    finally:
+        # the files prepare_upload() made; the request closes its own
+        for upload, original in zip(prepared, uploads):
+            if upload is not original:
+                upload.close()
+
+
+@contextmanager
+def _stored(user, uploads, source):
+    ImageAsset = apps.get_model("mediahub", "ImageAsset")
+    digests = [upload.sha256 for upload in uploads]
+    first_uploads = dict(zip(reversed(digests), reversed(uploads)))
+    with _claimed_blobs(first_uploads, Counter(digests)) as names:
+        twins = _processed_twins(list(names))
+        assets = ImageAsset.objects.bulk_create(
+            [
+                ImageAsset(
+                    user=user,
+                    image=names[digest],
+                    source=source,
+                    file_hash=digest,
+                    **twins.get(digest, {}),
+                )
+                for digest in digests
+            ]
+        )
+        # bulk_create sends no post_save, see queue_image_derivatives; one
+        # task per content, it fills in the other assets of the same bytes
+        from ..tasks import generate_image_derivatives
+
+        queued = set()
+        for asset in assets:
+            if not asset.derivatives and asset.file_hash not in queued:
+                queued.add(asset.file_hash)
+                transaction.on_commit(partial(generate_image_derivatives.delay, str(asset.pk)))
+        yield assets
+
+
+def move_to_blob(asset):
+    """Move an asset saved before content addressing into the blob store.
+
+    The file is cleaned like a new upload first, so it shares its blob
+    with later uploads of the same photo.
+
+    Returns True when its file was a copy of one already stored, and so
+    freed disk space.
+    """
+    storage = _image_storage()
+    old_name = asset.image.name
+    with asset.image.open("rb") as source:
+        upload = prepare_upload(source)
+    digest = upload.sha256
+    with upload, _claimed_blobs({digest: upload}, {digest: 1}) as names:
+        duplicate = (
+            _blob_model().objects.filter(sha256=digest, ref_count__gt=1).exists()
+        )
+        asset.image = names[digest]
+        asset.file_hash = digest
+        asset.save(update_fields=["image", "file_hash"])
+    transaction.on_commit(partial(storage.delete, old_name))
+    return duplicate
+
+
+def release_blob(digest):
+    if digest:
+        _blob_model().objects.filter(sha256=digest, ref_count__gt=0).update(
+            ref_count=F("ref_count") - 1
+        )
+
+
+def _delete_derivatives(storage, digest):
+    directory = f"derivatives/{digest}"
+    try:
+        _, files = storage.listdir(directory)
+    except FileNotFoundError:
+        return
+    for filename in files:
+        storage.delete(f"{directory}/{filename}")
+
+
+def collect_unused_blobs(batch_size=500):
+    """Delete the files no asset references any more. Returns how many went."""
+    MediaBlob = _blob_model()
+    storage = _image_storage()
+    with transaction.atomic():
+        blobs = list(
+            MediaBlob.objects.filter(ref_count=0)
+            .select_for_update(skip_locked=True)
+            .order_by("created_at")[:batch_size]
+        )
+        for blob in blobs:
+            storage.delete(blob.name)
+            _delete_derivatives(storage, blob.sha256)
+        MediaBlob.objects.filter(pk__in=[blob.pk for blob in blobs]).delete()
+    return len(blobs)
@@ -0,0 +1,114 @@
+import io
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+
+from .content_store import processed_twin
+from .perceptual import dhash
+
+# widest first: each size is resampled from the previous one
+DERIVATIVE_WIDTHS = (1280, 640, 320)
+DERIVATIVE_FORMATS = {
+    "webp": ("WEBP", "webp", {"quality": 80, "method": 4}),
+    "jpeg": ("JPEG", "jpg", {"quality": 82, "optimize": True, "progressive": True}),
+}
+
+
+def derivative_name(asset, width, fmt):
+    # by content when known, so identical uploads share one set
+    key = asset.file_hash or asset.pk
+    return f"derivatives/{key}/{width}w.{DERIVATIVE_FORMATS[fmt][1]}"
+
+
+def _target_widths(width):
+    widths = [target for target in DERIVATIVE_WIDTHS if target < width]
+    if width <= DERIVATIVE_WIDTHS[0]:
+        # narrower than the largest size: one copy at its own width, re-encoded
+        widths.insert(0, width)
+    return widths
+
+
+def _load(asset):
+    with asset.image.open("rb") as source:
+        image = Image.open(source)
+        # JPEGs decode at 1/2, 1/4 or 1/8 scale when that still covers the
+        # largest size, which is most of the work for phone photos
+        image.draft("RGB", (DERIVATIVE_WIDTHS[0], DERIVATIVE_WIDTHS[0]))
+        image = ImageOps.exif_transpose(image)
+        has_alpha = image.mode in ("RGBA", "LA", "PA") or "transparency" in image.info
+        return image.convert("RGBA" if has_alpha else "RGB")
+
+
+def _flatten(image):
+    if image.mode != "RGBA":
+        return image
+    background = Image.new("RGB", image.size, "white")
+    background.paste(image, mask=image.getchannel("A"))
+    return background
+
+
+def generate_derivatives(asset, force=False):
+    """Write the WebP and JPEG sizes of ``asset`` and record them on it.
+
+    Sizes are DERIVATIVE_WIDTHS no wider than the original, stored under
+    ``derivatives/<file hash or asset id>/``. ``asset.derivatives`` maps each
+    format to ``[width, name]`` pairs, widest first. The perceptual hash is
+    taken from the same decode. Unless ``force``, what was already made for
+    the same bytes is reused instead, and the other assets of those bytes
+    still waiting for theirs get the result as well.
+    """
+    twin = {} if force else processed_twin(asset.file_hash, exclude=asset.pk)
+    if twin:
+        asset.derivatives = twin["derivatives"]
+        asset.perceptual_hash = twin["perceptual_hash"]
+        asset.save(update_fields=["derivatives", "perceptual_hash"])
+        return asset.derivatives
+    storage = asset.image.storage
+    image = _load(asset)
+    asset.perceptual_hash = dhash(image)
+    derivatives = {fmt: [] for fmt in DERIVATIVE_FORMATS}
+    for width in _target_widths(image.width):
+        height = max(1, round(image.height * width / image.width))
+        if image.size != (width, height):
+            image = image.resize((width, height), Image.Resampling.LANCZOS, reducing_gap=3.0)
+        for fmt, (pil_format, _, options) in DERIVATIVE_FORMATS.items():
+            frame = image if fmt == "webp" else _flatten(image)
+            buffer = io.BytesIO()
+            frame.save(buffer, pil_format, **options)
+            name = derivative_name(asset, width, fmt)
+            if force:
+                storage.delete(name)
+            elif storage.exists(name):
+                # written by a task for the same bytes
+                derivatives[fmt].append([width, name])
+                continue
+            saved = storage.save(name, ContentFile(buffer.getvalue()))
+            if saved != name:
+                # a task for the same bytes wrote it meanwhile; keep one copy
+                storage.delete(saved)
+            derivatives[fmt].append([width, name])
+    asset.derivatives = derivatives
+    asset.save(update_fields=["derivatives", "perceptual_hash"])
+    if asset.file_hash:
+        type(asset).objects.filter(file_hash=asset.file_hash, derivatives={}).update(
+            derivatives=derivatives, perceptual_hash=asset.perceptual_hash
+        )
+    return derivatives
+
+
+def srcset(derivatives, fmt):
+    return ", ".join(
+        f"{default_storage.url(name)} {width}w"
+        for width, name in (derivatives or {}).get(fmt, [])
+    )
+
+
+def derivative_url(derivatives, width, fmt="jpeg"):
+    """URL of the narrowest size at least ``width`` wide, else the widest."""
+    sizes = (derivatives or {}).get(fmt, [])
+    if not sizes:
+        return ""
+    fitting = [size for size in sizes if size[0] >= width]
+    _, name = min(fitting) if fitting else sizes[0]
+    return default_storage.url(name)
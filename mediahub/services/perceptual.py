@@ -0,0 +1,102 @@
+from functools import reduce
+from itertools import combinations
+from operator import or_
+
+from django.apps import apps
+from django.db.models import F, Func, IntegerField, Q, Value
+from django.db.models.functions import Cast
+from PIL import Image, ImageOps
+
+HASH_BITS = 64
+# the hash is split into BANDS slices of BAND_BITS, each with its own index
+# (see ImageAsset.Meta): two hashes within 4r+3 bits of each other have at
+# least one slice within r bits, so probing every slice value up to r bits
+# away finds all of them without scanning the table
+BANDS = 4
+BAND_BITS = HASH_BITS // BANDS
+BAND_MASK = (1 << BAND_BITS) - 1
+# recompressed or resized copies land within a few bits, light crops and
+# colour edits a few more; 7 is the most one-bit probes per slice cover
+# (about 5 ms over a million random hashes, 45 ms at 8 with two-bit probes)
+NEAR_DUPLICATE_DISTANCE = 7
+# the hash only needs a 9x8 thumbnail, so JPEGs are decoded at 1/8 scale
+# when that still leaves this much
+HASH_DECODE_SIZE = 320
+
+
+def dhash(image):
+    """64-bit difference hash of a PIL image, as a signed int for BigIntegerField.
+
+    Each bit says whether a pixel of the 9x8 greyscale thumbnail is brighter
+    than its right neighbour, which survives rescaling and recompression.
+    """
+    thumbnail = image.convert("L").resize((9, 8), Image.Resampling.BOX, reducing_gap=2.0)
+    pixels = thumbnail.tobytes()
+    value = 0
+    for row in range(8):
+        for col in range(8):
+            left, right = pixels[row * 9 + col], pixels[row * 9 + col + 1]
+            value = (value << 1) | (left > right)
+    return value - (1 << HASH_BITS) if value >> (HASH_BITS - 1) else value
+
+
+def hash_asset(image_asset):
+    """dhash of an ImageAsset's photo, decoded no larger than needed."""
+    with image_asset.image.open("rb") as source:
+        image = Image.open(source)
+        image.draft("RGB", (HASH_DECODE_SIZE, HASH_DECODE_SIZE))
+        return dhash(ImageOps.exif_transpose(image))
+
+
+def hamming_distance(first, second):
+    return ((first ^ second) & ((1 << HASH_BITS) - 1)).bit_count()
+
+
+def band_expression(band):
+    expression = F("perceptual_hash")
+    if band:
+        expression = expression.bitrightshift(band * BAND_BITS)
+    return expression.bitand(BAND_MASK)
+
+
+def _band_values(value, radius):
+    flips = [0]
+    for bits in range(1, radius + 1):
+        flips += [sum(1 << bit for bit in chosen) for chosen in combinations(range(BAND_BITS), bits)]
+    return [value ^ flip for flip in flips]
+
+
+class _Bit64(IntegerField):
+    def db_type(self, connection):
+        return "bit(64)"
+
+
+class HammingDistance(Func):
+    function = "bit_count"
+    output_field = IntegerField()
+
+    def __init__(self, expression, value, **extra):
+        xor = F(expression).bitxor(Value(value))
+        super().__init__(Cast(xor, output_field=_Bit64()), **extra)
+
+
+def near_duplicates(perceptual_hash, max_distance=NEAR_DUPLICATE_DISTANCE):
+    """ImageAssets whose hash is within ``max_distance`` bits, closest first."""
+    ImageAsset = apps.get_model("mediahub", "ImageAsset")
+    unsigned = perceptual_hash & ((1 << HASH_BITS) - 1)
+    radius = max_distance // BANDS
+    aliases = {f"band{band}": band_expression(band) for band in range(BANDS)}
+    probes = reduce(
+        or_,
+        (
+            Q(**{f"band{band}__in": _band_values((unsigned >> (band * BAND_BITS)) & BAND_MASK, radius)})
+            for band in range(BANDS)
+        ),
+    )
+    return (
+        ImageAsset.objects.alias(**aliases)
+        .filter(probes)
+        .annotate(distance=HammingDistance("perceptual_hash", perceptual_hash))
+        .filter(distance__lte=max_distance)
+        .order_by("distance", "-created_at")
+    )
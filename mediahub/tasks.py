@@ -0,0 +1,20 @@
+from celery import shared_task
+
+from .models import ImageAsset
+from .services.content_store import collect_unused_blobs
+from .services.derivatives import generate_derivatives
+
+
+@shared_task(name="mediahub.generate_derivatives", max_retries=1)
+def generate_image_derivatives(asset_id):
+    asset = ImageAsset.objects.filter(pk=asset_id).first()
+    if asset is None or not asset.image:
+        return None
+    if asset.derivatives and asset.perceptual_hash is not None:
+        return asset.derivatives  # already processed
+    return generate_derivatives(asset)
+
+
+@shared_task(name="mediahub.collect_unused_blobs")
+def collect_blobs():
+    return collect_unused_blobs()
@@ -0,0 +1,15 @@
+from django import template
+
+from ..services import derivatives
+
+register = template.Library()
+
+
+@register.filter
+def srcset(value, fmt="webp"):
+    return derivatives.srcset(value, fmt)
+
+
+@register.filter
+def derivative_url(value, width):
+    return derivatives.derivative_url(value, int(width))
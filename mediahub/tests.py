@@ -1,3 +1,288 @@
-from django.test import TestCase
+import hashlib
+import shutil
+import tempfile
+from io import BytesIO, StringIO
+from pathlib import Path
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import RequestFactory, TestCase, override_settings
+from PIL import Image
+
+from .models import ImageAsset, MediaBlob
+from .services.content_store import (
+    blob_name,
+    collect_unused_blobs,
+    move_to_blob,
+    store_image,
+    store_images,
+    stored_images,
+)
+from .services.perceptual import hamming_distance, near_duplicates
+from .tasks import generate_image_derivatives
+from .uploadhandlers import JpegMetadataStripper, StreamingImageUploadHandler, prepare_upload
+
+
+def make_photo(size=(40, 30), fmt="PNG", color="teal"):
+    photo = BytesIO()
+    Image.new("RGB", size, color).save(photo, fmt)
+    return photo.getvalue()
+
+
+def make_jpeg(size, orientation):
+    exif = Image.Exif()
+    exif[0x010F] = "PhoneMaker"
+    exif[0x0112] = orientation
+    photo = BytesIO()
+    Image.new("RGB", size, "teal").save(photo, "JPEG", exif=exif, comment=b"GPS 48.85 2.35")
+    return photo.getvalue()
+
+
+def receive_uploads(*files):
+    """``files`` as a photo view gets them, through the upload handler."""
+    request = RequestFactory().post("/", {"images": list(files)})
+    request.upload_handlers = [StreamingImageUploadHandler(request)]
+    return request.FILES.getlist("images")
+
+
+class MediaTestCase(TestCase):
+    """Stored files go to a temporary MEDIA_ROOT, a fresh one for each test."""
+
+    def setUp(self):
+        super().setUp()
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        media_override = override_settings(MEDIA_ROOT=self.media_root)
+        media_override.enable()
+        self.addCleanup(media_override.disable)
+
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        cls.user = User.objects.create_user(email="seller@example.com", password="password123")
+
+
+class DerivativeTests(MediaTestCase):
+    def test_upload_queues_derivatives_for_after_commit(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            asset = ImageAsset.objects.create(
+                user=self.user, image=SimpleUploadedFile("photo.png", make_photo())
+            )
+        self.assertEqual(len(callbacks), 1)
+        self.assertEqual(callbacks[0].func, generate_image_derivatives.delay)
+        self.assertEqual(callbacks[0].args, (str(asset.pk),))
+
+    def test_derivatives_are_written_in_every_width_and_format(self):
+        with self.captureOnCommitCallbacks():
+            asset = ImageAsset.objects.create(
+                user=self.user,
+                image=SimpleUploadedFile("photo.jpg", make_photo((2000, 1500), "JPEG")),
+            )
+
+        derivatives = generate_image_derivatives(str(asset.pk))
+
+        self.assertEqual([width for width, _ in derivatives["webp"]], [1280, 640, 320])
+        for fmt, extension in (("webp", "WEBP"), ("jpeg", "JPEG")):
+            for width, name in derivatives[fmt]:
+                with Image.open(Path(self.media_root) / name) as derivative:
+                    self.assertEqual(derivative.format, extension)
+                    self.assertEqual(derivative.size, (width, width * 3 // 4))
+        asset.refresh_from_db()
+        self.assertEqual(asset.derivatives, derivatives)
+        self.assertIsNotNone(asset.perceptual_hash)
+        self.assertEqual(generate_image_derivatives(str(asset.pk)), derivatives)
+
+
+class ContentStoreTests(MediaTestCase):
+    def test_identical_uploads_share_one_stored_file(self):
+        photo = make_photo()
+        with self.captureOnCommitCallbacks():
+            first, second = [
+                store_image(self.user, SimpleUploadedFile(filename, photo))
+                for filename in ("IMG_0001.PNG", "copie.png")
+            ]
+
+        blob = MediaBlob.objects.get()
+        self.assertEqual(first.file_hash, hashlib.sha256(photo).hexdigest())
+        self.assertEqual((first.file_hash, first.image.name), (second.file_hash, second.image.name))
+        self.assertEqual((blob.sha256, blob.name, blob.ref_count), (first.file_hash, first.image.name, 2))
+        self.assertEqual(blob.name, f"blobs/{blob.sha256[:2]}/{blob.sha256[2:4]}/{blob.sha256}.png")
+        self.assertEqual(len(list(Path(self.media_root, "blobs").rglob("*.png"))), 1)
+
+        # the sizes made for the first copy serve every later one
+        derivatives = generate_image_derivatives(str(first.pk))
+        self.assertEqual(generate_image_derivatives(str(second.pk)), derivatives)
+        with self.captureOnCommitCallbacks() as callbacks:
+            third = store_image(self.user, SimpleUploadedFile("encore.png", photo))
+        self.assertEqual(third.derivatives, derivatives)
+        self.assertEqual(callbacks, [])
+
+    def test_identical_uploads_share_one_derivatives_task(self):
+        photo = make_photo((800, 600))
+        with self.captureOnCommitCallbacks() as callbacks:
+            first, second = store_images(
+                self.user, [SimpleUploadedFile(name, photo) for name in ("a.png", "b.png")]
+            )
+        self.assertEqual([callback.args for callback in callbacks], [(str(first.pk),)])
+
+        derivatives = generate_image_derivatives(str(first.pk))
+        second.refresh_from_db()
+        self.assertEqual(second.derivatives, derivatives)
+
+        # a task that started before the first one finished
+        ImageAsset.objects.update(derivatives={}, perceptual_hash=None)
+        self.assertEqual(generate_image_derivatives(str(second.pk)), derivatives)
+        directory = Path(self.media_root, "derivatives", first.file_hash)
+        self.assertEqual(len(list(directory.iterdir())), 2 * len(derivatives["webp"]))
+
+    def test_every_way_in_hashes_the_cleaned_bytes(self):
+        photo = make_jpeg((80, 60), 1)
+        (received,) = receive_uploads(SimpleUploadedFile("a.jpg", photo))
+        with received, self.captureOnCommitCallbacks():
+            posted = store_image(self.user, received)
+            direct = store_image(self.user, SimpleUploadedFile("b.jpg", photo))
+            legacy = ImageAsset.objects.create(user=self.user, image=SimpleUploadedFile("c.jpg", photo))
+        with self.captureOnCommitCallbacks(execute=True):
+            move_to_blob(legacy)
+
+        stored = Path(self.media_root, posted.image.name).read_bytes()
+        self.assertNotIn(b"PhoneMaker", stored)
+        self.assertEqual(posted.file_hash, hashlib.sha256(stored).hexdigest())
+        self.assertEqual({direct.file_hash, legacy.file_hash}, {posted.file_hash})
+        self.assertEqual(MediaBlob.objects.get().ref_count, 3)
+
+    def test_files_are_only_reused_through_their_blob(self):
+        photo = make_photo()
+        digest = hashlib.sha256(photo).hexdigest()
+        # left by an upload rolled back before blobs were written up front
+        stray = Path(self.media_root, blob_name(digest, "photo.png"))
+        stray.parent.mkdir(parents=True)
+        stray.write_bytes(b"not this photo")
+
+        with self.captureOnCommitCallbacks():
+            asset = store_image(self.user, SimpleUploadedFile("photo.png", photo))
+
+        self.assertNotEqual(asset.image.name, blob_name(digest, "photo.png"))
+        self.assertEqual(MediaBlob.objects.get().name, asset.image.name)
+        self.assertEqual(Path(self.media_root, asset.image.name).read_bytes(), photo)
+
+    def test_rolled_back_uploads_leave_no_file(self):
+        with self.assertRaises(ZeroDivisionError), self.captureOnCommitCallbacks():
+            photos = [SimpleUploadedFile("photo.png", make_photo())]
+            with stored_images(self.user, photos):
+                1 / 0
+
+        self.assertFalse(ImageAsset.objects.exists())
+        self.assertFalse(MediaBlob.objects.exists())
+        self.assertEqual(list(Path(self.media_root, "blobs").rglob("*.png")), [])
+
+    def test_unused_stored_files_are_collected(self):
+        photo = make_photo()
+        with self.captureOnCommitCallbacks():
+            first, second = [
+                store_image(self.user, SimpleUploadedFile("photo.png", photo)) for _ in range(2)
+            ]
+        generate_image_derivatives(str(first.pk))
+        stored = Path(self.media_root, first.image.name)
+        derivatives = Path(self.media_root, "derivatives", first.file_hash)
+
+        first.delete()
+        self.assertEqual(MediaBlob.objects.get().ref_count, 1)
+        self.assertEqual(collect_unused_blobs(), 0)
+        self.assertTrue(stored.exists())
+
+        second.delete()
+        self.assertEqual(collect_unused_blobs(), 1)
+        self.assertFalse(MediaBlob.objects.exists())
+        self.assertFalse(stored.exists())
+        self.assertEqual(list(derivatives.iterdir()), [])
+
+    def test_earlier_uploads_are_moved_into_the_store(self):
+        photo = make_photo()
+        with self.captureOnCommitCallbacks():
+            legacy = [
+                ImageAsset.objects.create(user=self.user, image=SimpleUploadedFile(f"old{index}.png", photo))
+                for index in range(2)
+            ]
+            stored = store_image(self.user, SimpleUploadedFile("new.png", photo))
+        originals = [Path(self.media_root, asset.image.name) for asset in legacy]
+
+        out = StringIO()
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command("move_images_to_blobs", stdout=out)
+
+        for asset in legacy:
+            asset.refresh_from_db()
+            self.assertEqual((asset.file_hash, asset.image.name), (stored.file_hash, stored.image.name))
+        self.assertEqual(MediaBlob.objects.get().ref_count, 3)
+        self.assertFalse(any(original.exists() for original in originals))
+        self.assertIn("Moved 2 assets, 2 of them duplicates", out.getvalue())
+
+
+class PerceptualHashTests(MediaTestCase):
+    def test_recompressed_copies_are_found_as_near_duplicates(self):
+        scene = Image.linear_gradient("L").resize((800, 600)).convert("RGB")
+        scene.paste((200, 40, 40), (100, 80, 360, 300))
+        scene.paste((30, 30, 160), (450, 350, 700, 560))
+        versions = {}
+        for key, image, size, fmt in (
+            ("original", scene, (800, 600), "PNG"),
+            ("copy", scene, (400, 300), "JPEG"),
+            ("other", Image.radial_gradient("L").convert("RGB"), (256, 256), "JPEG"),
+        ):
+            photo = BytesIO()
+            image.resize(size).save(photo, fmt, quality=40)
+            with self.captureOnCommitCallbacks():
+                versions[key] = store_image(self.user, SimpleUploadedFile(f"{key}.img", photo.getvalue()))
+            generate_image_derivatives(str(versions[key].pk))
+            versions[key].refresh_from_db()
+
+        matches = near_duplicates(versions["original"].perceptual_hash)
+        self.assertEqual(
+            set(matches.values_list("pk", flat=True)), {versions["original"].pk, versions["copy"].pk}
+        )
+        self.assertLessEqual(
+            hamming_distance(versions["original"].perceptual_hash, versions["copy"].perceptual_hash), 7
+        )
+
+
+class UploadHandlerTests(MediaTestCase):
+    def test_uploads_are_hashed_and_cleaned(self):
+        small, large, text = receive_uploads(
+            SimpleUploadedFile("IMG_1.JPEG", make_jpeg((800, 600), 6)),
+            SimpleUploadedFile("IMG_2.JPEG", make_jpeg((6000, 2000), 6)),
+            SimpleUploadedFile("notes.txt", b"pas une photo"),
+        )
+
+        self.assertEqual(large.image_error, "")
+        large = prepare_upload(large)
+        for upload in (small, large):
+            received = upload.read()
+            self.assertEqual(upload.sha256, hashlib.sha256(received).hexdigest())
+            self.assertEqual((upload.image_format, upload.image_error), ("jpeg", ""))
+            self.assertNotIn(b"PhoneMaker", received)
+            self.assertNotIn(b"GPS", received)
+            upload.seek(0)
+        with Image.open(small) as image:
+            # only the orientation is left, the pixels are as sent
+            self.assertEqual(dict(image.getexif()), {0x0112: 6})
+            self.assertEqual(image.size, (800, 600))
+        with Image.open(large) as image:
+            # scaled down and turned upright, with no metadata left
+            self.assertEqual(image.size, (1000, 3000))
+            self.assertEqual(dict(image.getexif()), {})
+        self.assertIsNone(text.image_format)
+        self.assertEqual(text.image_error, "n'est pas une photo JPEG, PNG, WebP ou GIF")
+
+    def test_jpeg_metadata_is_stripped_across_chunk_boundaries(self):
+        photo = make_jpeg((64, 48), 3)
+        whole = JpegMetadataStripper()
+        expected = whole.feed(photo) + whole.finish()
+        stripper = JpegMetadataStripper()
+        pieces = [stripper.feed(photo[start : start + 7]) for start in range(0, len(photo), 7)]
+        self.assertEqual(b"".join(pieces) + stripper.finish(), expected)
+        self.assertLess(len(expected), len(photo))
+        with Image.open(BytesIO(expected)) as image:
+            self.assertEqual(dict(image.getexif()), {0x0112: 3})
+            image.load()
@@ -0,0 +1,313 @@
+import hashlib
+import os
+import struct
+from functools import wraps
+
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from django.core.files.uploadhandler import StopFutureHandlers, TemporaryFileUploadHandler
+from django.views.decorators.csrf import csrf_exempt, csrf_protect
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+# photos wider or taller than this are scaled down before they are stored
+# (the largest derivative is 1280 px)
+MAX_IMAGE_SIDE = 4096
+# non-JPEG images are decoded at full size to scale them down, so larger
+# ones are refused on receipt rather than held in memory (JPEGs decode at
+# 1/2 to 1/8)
+MAX_DECODE_PIXELS = 24_000_000
+# a JPEG whose header runs longer than this is stored as received
+MAX_JPEG_HEADER = 1024 * 1024
+
+FORMAT_EXTENSIONS = {"jpeg": "jpg", "png": "png", "webp": "webp", "gif": "gif"}
+_PIL_FORMATS = {"jpeg": "JPEG", "png": "PNG", "webp": "WEBP", "gif": "GIF"}
+_SAVE_OPTIONS = {
+    "jpeg": {"quality": 90, "optimize": True},
+    "png": {"optimize": True},
+    "webp": {"quality": 90},
+    "gif": {},
+}
+
+
+def sniff_format(header):
+    if header.startswith(b"\xff\xd8\xff"):
+        return "jpeg"
+    if header.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "png"
+    if header[:4] == b"RIFF" and header[8:12] == b"WEBP":
+        return "webp"
+    if header[:6] in (b"GIF87a", b"GIF89a"):
+        return "gif"
+    return None
+
+
+def _exif_orientation(payload):
+    """Orientation tag of an APP1 Exif payload, 1 when absent or unreadable."""
+    tiff = payload[6:]
+    order = {b"II": "<", b"MM": ">"}.get(tiff[:2])
+    if order is None or len(tiff) < 8:
+        return 1
+    (offset,) = struct.unpack(order + "I", tiff[4:8])
+    if len(tiff) < offset + 2:
+        return 1
+    (count,) = struct.unpack(order + "H", tiff[offset : offset + 2])
+    for index in range(count):
+        entry = tiff[offset + 2 + index * 12 : offset + 14 + index * 12]
+        if len(entry) < 12:
+            break
+        tag, kind, _, value = struct.unpack(order + "HHI4s", entry)
+        if tag == 0x0112 and kind == 3:
+            return struct.unpack(order + "H", value[:2])[0]
+    return 1
+
+
+def _orientation_segment(orientation):
+    """An APP1 Exif segment holding nothing but the orientation."""
+    tiff = b"II*\x00" + struct.pack("<IHHHIHHI", 8, 1, 0x0112, 3, 1, orientation, 0, 0)
+    payload = b"Exif\x00\x00" + tiff
+    return b"\xff\xe1" + struct.pack(">H", len(payload) + 2) + payload
+
+
+class JpegMetadataStripper:
+    """Drop Exif, XMP, IPTC and comment segments from a JPEG as it streams.
+
+    Only the segments before the scan data are looked at, one at a time, so
+    memory stays at one segment (64 KB at most). The orientation is kept in
+    a minimal Exif segment since browsers and Pillow still need it.
+    """
+
+    # APP1 (Exif, XMP), APP13 (IPTC), COM
+    DROPPED = {0xE1, 0xED, 0xFE}
+    STANDALONE = {0x01, *range(0xD0, 0xD9)}
+
+    def __init__(self):
+        self.buffer = b""
+        self.passthrough = False
+        self.header_size = 0
+
+    def feed(self, data):
+        if self.passthrough:
+            return data
+        self.buffer += data
+        output = []
+        while not self.passthrough:
+            segment = self._next_segment()
+            if segment is None:
+                break
+            output.append(segment)
+        if not self.passthrough and self.header_size + len(self.buffer) > MAX_JPEG_HEADER:
+            self.passthrough = True
+        if self.passthrough:
+            output.append(self.buffer)
+            self.buffer = b""
+        return b"".join(output)
+
+    def finish(self):
+        rest, self.buffer = self.buffer, b""
+        return rest
+
+    def _next_segment(self):
+        buffer = self.buffer
+        if self.header_size == 0:
+            if len(buffer) < 2:
+                return None
+            return self._consume(2, buffer[:2])  # SOI
+        if len(buffer) < 2:
+            return None
+        if buffer[0] != 0xFF:
+            self.passthrough = True  # not a marker: leave the rest alone
+            return b""
+        marker = buffer[1]
+        if marker == 0xFF:
+            return self._consume(1, b"")  # fill byte
+        if marker in self.STANDALONE:
+            return self._consume(2, buffer[:2])
+        if len(buffer) < 4:
+            return None
+        length = struct.unpack(">H", buffer[2:4])[0] + 2
+        if marker == 0xDA:  # start of scan: image data follows
+            self.passthrough = True
+            return b""
+        if len(buffer) < length:
+            return None
+        segment = buffer[:length]
+        if marker not in self.DROPPED:
+            return self._consume(length, segment)
+        kept = b""
+        if marker == 0xE1 and segment[4:10] == b"Exif\x00\x00":
+            orientation = _exif_orientation(segment[4:])
+            if orientation != 1:
+                kept = _orientation_segment(orientation)
+        return self._consume(length, kept)
+
+    def _consume(self, length, kept):
+        self.buffer = self.buffer[length:]
+        self.header_size += length
+        return kept
+
+
+class StreamingImageUploadHandler(TemporaryFileUploadHandler):
+    """Spool every upload to disk, hashing and cleaning photos on the way.
+
+    Uploaded files come out as TemporaryUploadedFile with:
+
+    - ``sha256``: hex digest of the bytes as stored, so the content store
+      does not read the file again;
+    - ``image_format``: "jpeg", "png", "webp" or "gif" from the first bytes,
+      None for anything else;
+    - ``image_error``: why the file cannot be taken as a photo, or "".
+
+    JPEG metadata is stripped while receiving (see JpegMetadataStripper)
+    and only the image header is read once complete, so parsing the body
+    never decodes a photo. Scaling down the ones over MAX_IMAGE_SIDE is
+    left to prepare_upload(). The memory a request needs does not grow
+    with the size or number of files.
+    """
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.digest = hashlib.sha256()
+        self.image_format = None
+        self.stripper = None
+        self.received = 0
+        # the default handlers after this one would spool a second copy
+        raise StopFutureHandlers()
+
+    def receive_data_chunk(self, raw_data, start):
+        if start == 0:
+            self.image_format = sniff_format(raw_data[:16])
+            if self.image_format == "jpeg":
+                self.stripper = JpegMetadataStripper()
+        if self.stripper is not None:
+            raw_data = self.stripper.feed(raw_data)
+        self._write(raw_data)
+
+    def file_complete(self, file_size):
+        if self.stripper is not None:
+            self._write(self.stripper.finish())
+        upload = self.file
+        upload.size = self.received
+        upload.sha256 = self.digest.hexdigest()
+        upload.image_format = self.image_format
+        upload.image_error = "" if self.image_format else "n'est pas une photo JPEG, PNG, WebP ou GIF"
+        if self.image_format:
+            upload.image_error = _dimension_error(upload)
+        upload.seek(0)
+        return upload
+
+    def _write(self, data):
+        if data:
+            self.file.write(data)
+            self.digest.update(data)
+            self.received += len(data)
+
+
+def _dimension_error(upload):
+    upload.seek(0)
+    try:
+        with Image.open(upload) as image:  # reads the header only
+            width, height = image.size
+            decoded_whole = image.format != "JPEG" and not getattr(image, "is_animated", False)
+    except (UnidentifiedImageError, OSError, Image.DecompressionBombError):
+        return "est une image illisible"
+    too_large = max(width, height) > MAX_IMAGE_SIDE and width * height > MAX_DECODE_PIXELS
+    if decoded_whole and too_large:
+        return "est trop grande (24 mégapixels au plus)"
+    return ""
+
+
+def receive_file(source):
+    """Run a file that did not come through the upload handler through it.
+
+    Files stored by commands or code rather than posted to a photo view
+    get the same cleaning and so the same ``sha256`` as an upload of the
+    same photo would.
+    """
+    handler = StreamingImageUploadHandler()
+    content_type = getattr(source, "content_type", None) or "application/octet-stream"
+    try:
+        handler.new_file("file", os.path.basename(source.name or ""), content_type, source.size)
+    except StopFutureHandlers:
+        pass
+    received = 0
+    for chunk in source.chunks(handler.chunk_size):
+        handler.receive_data_chunk(chunk, received)
+        received += len(chunk)
+    return handler.file_complete(received)
+
+
+def prepare_upload(upload):
+    """``upload`` as the content store keeps it, with its ``sha256``.
+
+    The digest is always the SHA-256 of the bytes stored: files are
+    received through StreamingImageUploadHandler first if they were not,
+    and photos over MAX_IMAGE_SIDE are scaled down and hashed again.
+
+    Scaling down is the one step that decodes a photo. JPEGs are decoded
+    at 1/2, 1/4 or 1/8 scale, to no less than half the target, so at most
+    about 4096 x 4096 pixels are held whatever the size sent; other
+    formats over MAX_DECODE_PIXELS were refused on receipt. It runs on the
+    content store's thread pool rather than while the body is parsed.
+    """
+    if getattr(upload, "sha256", None) is None:
+        upload = receive_file(upload)
+    if not upload.image_format or upload.image_error:
+        return upload
+    upload.seek(0)
+    try:
+        with Image.open(upload) as image:
+            if max(image.size) <= MAX_IMAGE_SIDE or getattr(image, "is_animated", False):
+                upload.seek(0)
+                return upload
+            resized = _downscale(upload, image)
+    except (OSError, Image.DecompressionBombError):
+        upload.seek(0)
+        return upload  # stored as received
+    upload.close()
+    return resized
+
+
+def _downscale(upload, image):
+    fmt = upload.image_format
+    ratio = MAX_IMAGE_SIDE / max(image.size)
+    # no-op for formats other than JPEG
+    image.draft("RGB", (int(image.width * ratio / 2), int(image.height * ratio / 2)))
+    image = ImageOps.exif_transpose(image)
+    image.thumbnail((MAX_IMAGE_SIDE, MAX_IMAGE_SIDE), Image.Resampling.LANCZOS, reducing_gap=3.0)
+    if fmt == "jpeg" and image.mode not in ("RGB", "L"):
+        image = image.convert("RGB")
+    resized = TemporaryUploadedFile(
+        upload.name, upload.content_type, 0, upload.charset, upload.content_type_extra
+    )
+    # saved without exif=, which drops the metadata of the other formats too
+    image.save(resized.file, _PIL_FORMATS[fmt], **_SAVE_OPTIONS[fmt])
+    resized.size = resized.file.tell()
+    resized.seek(0)
+    digest = hashlib.sha256()
+    for chunk in resized.chunks():
+        digest.update(chunk)
+    resized.seek(0)
+    resized.sha256 = digest.hexdigest()
+    resized.image_format = fmt
+    resized.image_error = ""
+    return resized
+
+
+class StreamingImageUploadMixin:
+    """Receive the photos posted to a view through StreamingImageUploadHandler.
+
+    Handlers can only be changed before ``request.POST`` is read, and
+    CsrfViewMiddleware reads it, so the view does its CSRF check itself,
+    once the handler is in place.
+    """
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        protected = csrf_protect(super().as_view(**initkwargs))
+
+        @csrf_exempt
+        @wraps(protected)
+        def view(request, *args, **kwargs):
+            request.upload_handlers.insert(0, StreamingImageUploadHandler(request))
+            return protected(request, *args, **kwargs)
+
+        return view
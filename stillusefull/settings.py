@@ -46,6 +46,7 @@ INSTALLED_APPS = [
     "django.contrib.sessions",
     "django.contrib.messages",
     "django.contrib.staticfiles",
+    "django.contrib.postgres",
     "pwa",
     "accounts",
     "catalog",
@@ -158,6 +159,57 @@ CELERY_RESULT_BACKEND = os.environ.get(
 )
 CELERY_TASK_ACKS_LATE = True
 CELERY_TASK_SOFT_TIME_LIMIT = 30
+CELERY_BEAT_SCHEDULE = {
+    # cancels reservations past expires_at and republishes their listings
+    "expire-reservations": {
+        "task": "listings.expire_reservations",
+        "schedule": 60.0,
+    },
+    # folds newly published listings into the similar listings table
+    "refresh-similar-listings": {
+        "task": "listings.refresh_similar_listings",
+        "schedule": 60.0,
+    },
+    # moves buffered listing views from Redis into the listings table
+    "flush-view-counts": {
+        "task": "listings.flush_view_counts",
+        "schedule": 60.0,
+    },
+    # deletes stored photos (and their derivatives) no asset uses any more
+    "collect-unused-blobs": {
+        "task": "mediahub.collect_unused_blobs",
+        "schedule": 3600.0,
+    },
+}
+
+# Cache (shared Redis, separate database from Celery). Set CACHE_URL to an
+# empty string to fall back to a per-process local memory cache.
+CACHE_URL = os.environ.get("CACHE_URL", "redis://redis:6379/2")
+if CACHE_URL:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": CACHE_URL,
+        }
+    }
+else:
+    CACHES = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+
+# Shared home feed first pages: served fresh for FEED_CACHE_TIMEOUT
+# seconds, then stale for up to FEED_CACHE_GRACE more while one request
+# refreshes them.
+FEED_CACHE_TIMEOUT = 300
+FEED_CACHE_GRACE = 60
+
+# Anonymous listing detail pages are kept this many seconds, and browsers
+# may reuse them as long; signed-in visitors revalidate with the ETag.
+LISTING_DETAIL_CACHE_TIMEOUT = 60
+
+# Listing view counters and unique-viewer HyperLogLogs, buffered in Redis
+# until the flush task writes them; an empty URL turns counting off.
+VIEW_COUNTER_REDIS_URL = os.environ.get(
+    "VIEW_COUNTER_REDIS_URL", "redis://redis:6379/3"
+)
 
 # Login redirects
 LOGIN_URL = "/accounts/login/"